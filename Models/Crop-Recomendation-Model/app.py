@@ -1,18 +1,141 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import joblib
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel, Field
+import asyncio
 import numpy as np
-from typing import Dict, Any
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Any, List, Optional
 import uvicorn
 
-# Load the trained model
-try:
-    model = joblib.load("Crop_Recommendation.joblib")
-except FileNotFoundError:
-    raise Exception("Model file 'Crop_Recommendation.joblib' not found. Please ensure the model is trained and saved.")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from serving.executor import WorkerPool
+from serving.memo import Memoizer
+from serving.metrics import Metrics
+from serving.readiness import LAZY_STARTUP, WARMUP, ModelState
+
+from flat_booster import FlatBooster
+from suitability_grid import SuitabilityGrid
+
+# Model files are read from MODEL_DIR: the working directory when the app is run on
+# its own, or the service directory that server.py sets before importing this module.
+MODEL_DIR = globals().get("MODEL_DIR") or os.getcwd()
+MODEL_PATH = os.path.join(MODEL_DIR, "Crop_Recommendation.joblib")
+
+# Probability backend, chosen at startup with INFERENCE_BACKEND:
+#   sklearn - LGBMClassifier.predict_proba (default)
+#   booster - the underlying lightgbm.Booster, skipping the sklearn wrapper's checks
+#   flat    - FlatBooster, NumPy evaluation of the exported trees (FLAT_MODEL_PATH
+#             may point at a pre-exported .npz); large batches go to the booster
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "sklearn")
+FLAT_MAX_ROWS = 64
+
+# Optional precomputed probability grid (suitability_grid.py --build). With
+# SUITABILITY_GRID set to the .npy, inputs inside its bounds are answered by a
+# memory-mapped table lookup (SUITABILITY_GRID_MODE: cell or linear); inputs outside
+# it, and requests with ?exact=true, go to the model. The X-Prediction-Source
+# response header says which answered. The grid's measured deviation from the
+# model is in /model-info; a grid built from another model file is not used.
+SUITABILITY_GRID_PATH = os.environ.get("SUITABILITY_GRID")
+SUITABILITY_GRID_MODE = os.environ.get("SUITABILITY_GRID_MODE", "cell")
+
+def _booster_predict_proba(features: np.ndarray) -> np.ndarray:
+    return model.booster_.predict(np.ascontiguousarray(features, dtype=np.float64))
+
+def _flat_predict_proba(features: np.ndarray) -> np.ndarray:
+    if features.shape[0] > FLAT_MAX_ROWS:
+        return _booster_predict_proba(features)
+    return flat_booster.predict_proba(features)
+
+# Single-row results of /predict and /predict-detailed, keyed on the input features
+# (optionally rounded, CROP_MEMO_DECIMALS e.g. "1" or "ph=1,rainfall=0") and the
+# model version. CROP_MEMO_SIZE bounds the LRU; 0 disables it.
+PREDICTION_MEMO = Memoizer.from_env("crop")
+
+suitability_grid = None
+grid_status = None
+
+def load_model():
+    global model, CLASSES, predict_proba, flat_booster, suitability_grid, grid_status
+    # joblib (and lightgbm, pulled in by unpickling) are imported here so that
+    # LAZY_STARTUP=1 can start serving /health before paying for them.
+    import joblib
+
+    # Load the trained model
+    try:
+        model = joblib.load(MODEL_PATH)
+    except FileNotFoundError:
+        raise Exception("Model file 'Crop_Recommendation.joblib' not found. Please ensure the model is trained and saved.")
+
+    CLASSES = np.asarray(model.classes_)
+
+    if INFERENCE_BACKEND == "sklearn":
+        predict_proba = model.predict_proba
+    elif INFERENCE_BACKEND == "booster":
+        predict_proba = _booster_predict_proba
+    elif INFERENCE_BACKEND == "flat":
+        flat_model_path = os.environ.get("FLAT_MODEL_PATH")
+        flat_booster = FlatBooster.load(flat_model_path) if flat_model_path else FlatBooster.from_lgbm(model)
+        predict_proba = _flat_predict_proba
+    else:
+        raise Exception(f"Unknown INFERENCE_BACKEND '{INFERENCE_BACKEND}', expected 'sklearn', 'booster' or 'flat'.")
+
+    suitability_grid = None
+    grid_status = "disabled"
+    if SUITABILITY_GRID_PATH:
+        if SUITABILITY_GRID_MODE not in ("cell", "linear"):
+            raise Exception(f"Unknown SUITABILITY_GRID_MODE '{SUITABILITY_GRID_MODE}', expected 'cell' or 'linear'.")
+        try:
+            grid = SuitabilityGrid.load(SUITABILITY_GRID_PATH)
+            grid.check_model(MODEL_PATH, CLASSES)
+            suitability_grid, grid_status = grid, "active"
+        except (OSError, ValueError) as e:
+            grid_status = f"not used: {e}"
+
+    if PREDICTION_MEMO is not None:
+        model_stat = os.stat(MODEL_PATH)
+        PREDICTION_MEMO.invalidate((model_stat.st_size, model_stat.st_mtime_ns, INFERENCE_BACKEND))
 
 app = FastAPI(title="Crop Recommendation API", description="API for crop recommendation based on soil and climate conditions")
 
+# Prometheus-style /metrics: request counts and latency per route, and per-stage
+# histograms (parse, features, inference_wait / inference_run, postprocess, serialize).
+METRICS = Metrics("crop")
+METRICS.instrument(app)
+
+FEATURE_NAMES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Upper bound on rows accepted by /predict-batch in a single request
+MAX_BATCH_ROWS = int(os.environ.get("MAX_BATCH_ROWS", 50000))
+
+# LightGBM releases the GIL while predicting, so model calls go to a bounded thread
+# pool instead of blocking the event loop; beyond workers + queue requests get a 429.
+# Override with INFERENCE_POOL_{KIND,WORKERS,QUEUE}.
+INFERENCE_POOL = WorkerPool.from_env("inference", kind="thread")
+
+# Loaded at import as before; with LAZY_STARTUP=1 in the background after startup,
+# /health reporting "loading" until then.
+MODEL_STATE = ModelState("crop-recommendation")
+METRICS.track_model(MODEL_STATE)
+if not LAZY_STARTUP:
+    load_model()
+
+async def _load_in_background():
+    if LAZY_STARTUP:
+        await asyncio.to_thread(load_model)
+
+async def warmup_model():
+    await INFERENCE_POOL.run(predict_core, np.zeros((1, len(FEATURE_NAMES))))
+
+@app.on_event("startup")
+async def start_model():
+    await MODEL_STATE.start(_load_in_background, warmup_model if WARMUP else None)
+
+@app.on_event("shutdown")
+def shutdown_pools():
+    if not INFERENCE_POOL.shared:
+        INFERENCE_POOL.shutdown()
+
 class CropPredictionInput(BaseModel):
     N: float
     P: float
@@ -27,34 +150,133 @@ class CropPredictionOutput(BaseModel):
     confidence: float
     input_features: Dict[str, float]
 
+# max_length makes validation reject an oversized batch (422) from the list length,
+# before any of its items are validated.
+class CropBatchColumns(BaseModel):
+    N: List[float] = Field(max_length=MAX_BATCH_ROWS)
+    P: List[float] = Field(max_length=MAX_BATCH_ROWS)
+    K: List[float] = Field(max_length=MAX_BATCH_ROWS)
+    temperature: List[float] = Field(max_length=MAX_BATCH_ROWS)
+    humidity: List[float] = Field(max_length=MAX_BATCH_ROWS)
+    ph: List[float] = Field(max_length=MAX_BATCH_ROWS)
+    rainfall: List[float] = Field(max_length=MAX_BATCH_ROWS)
+
+class CropBatchInput(BaseModel):
+    # Exactly one of `rows` (list of records) or `columns` (one array per feature)
+    rows: Optional[List[CropPredictionInput]] = Field(default=None, max_length=MAX_BATCH_ROWS)
+    columns: Optional[CropBatchColumns] = None
+    top_k: int = Field(default=3, ge=1)
+
+
+def top_k_predictions(prediction_proba: np.ndarray, k: int):
+    """Return (indices, probabilities) of the k most likely classes per row, best first."""
+    k = min(k, prediction_proba.shape[1])
+    top_idx = np.argpartition(-prediction_proba, k - 1, axis=1)[:, :k]
+    top_proba = np.take_along_axis(prediction_proba, top_idx, axis=1)
+    # Highest probability first; equal probabilities keep class order
+    order = np.lexsort((top_idx, -top_proba), axis=1)
+    return np.take_along_axis(top_idx, order, axis=1), np.take_along_axis(top_proba, order, axis=1)
+
+
+def predict_core(features: np.ndarray):
+    """Evaluate the booster once for a (n_rows, 7) matrix.
+
+    Returns (best_idx, prediction_proba): the argmax over ``model.classes_`` per
+    row, which is exactly what ``model.predict`` would return, and the full
+    probability matrix for confidence / top-k.
+    """
+    prediction_proba = predict_proba(features)
+    return prediction_proba.argmax(axis=1), prediction_proba
+
+
+def grid_lookup(features: np.ndarray, exact: bool):
+    """Grid probabilities for the rows of ``features`` inside the grid, as (mask, probabilities);
+    None when the grid is off, bypassed with exact=true or covers none of the rows."""
+    if suitability_grid is None or exact:
+        return None
+    inside = suitability_grid.contains(features)
+    if not inside.any():
+        return None
+    return inside, suitability_grid.lookup(features[inside], SUITABILITY_GRID_MODE)
+
+
+async def predict_single(input_data: CropPredictionInput, exact: bool = False):
+    """Return (best class index, probability row, source) for one input; the grid
+    answers when it covers the input, otherwise the model (memoized when enabled)."""
+    values = input_data.dict()
+    if suitability_grid is not None and not exact:
+        with METRICS.stage("grid"):
+            features = np.array([[values[name] for name in FEATURE_NAMES]], dtype=np.float64)
+            looked_up = grid_lookup(features, exact)
+        if looked_up is not None:
+            prediction_proba = looked_up[1][0]
+            return int(prediction_proba.argmax()), prediction_proba, "grid"
+
+    if PREDICTION_MEMO is not None:
+        values = PREDICTION_MEMO.canonical(values)
+        cached = PREDICTION_MEMO.get(values)
+        if cached is not None:
+            return cached + ("model",)
+
+    with METRICS.stage("features"):
+        features = np.array([[values[name] for name in FEATURE_NAMES]], dtype=np.float64)
+    best_idx, prediction_proba = await INFERENCE_POOL.run(predict_core, features)
+    result = int(best_idx[0]), prediction_proba[0]
+    if PREDICTION_MEMO is not None:
+        # Shared between requests from now on.
+        result[1].setflags(write=False)
+        PREDICTION_MEMO.put(values, result)
+    return result + ("model",)
+
+
+def batch_features(batch: CropBatchInput) -> np.ndarray:
+    if (batch.rows is None) == (batch.columns is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of 'rows' or 'columns'.")
+
+    if batch.rows is not None:
+        features = np.array(
+            [[row.N, row.P, row.K, row.temperature, row.humidity, row.ph, row.rainfall] for row in batch.rows],
+            dtype=np.float64,
+        ).reshape(-1, len(FEATURE_NAMES))
+    else:
+        columns = [getattr(batch.columns, name) for name in FEATURE_NAMES]
+        if len({len(col) for col in columns}) != 1:
+            raise HTTPException(status_code=422, detail="All feature columns must have the same length.")
+        features = np.empty((len(columns[0]), len(FEATURE_NAMES)), dtype=np.float64)
+        for j, col in enumerate(columns):
+            features[:, j] = col
+    return features
+
 @app.get("/")
 async def root():
     return {"message": "Crop Recommendation API", "status": "active"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "model_loaded": True}
+    return {
+        "status": "healthy",
+        "model_loaded": MODEL_STATE.ready,
+        "state": MODEL_STATE.state,
+        "readiness": MODEL_STATE.status(),
+        "suitability_grid": grid_status,
+        "pools": {INFERENCE_POOL.name: INFERENCE_POOL.stats()},
+    }
+
+@app.get("/ready")
+async def ready():
+    MODEL_STATE.require()
+    return {"state": MODEL_STATE.state}
 
 @app.post("/predict", response_model=CropPredictionOutput)
-async def predict_crop(input_data: CropPredictionInput):
+@METRICS.handler
+async def predict_crop(input_data: CropPredictionInput, response: Response, exact: bool = False):
+    MODEL_STATE.require()
     try:
-        # Convert input to numpy array
-        features = np.array([[
-            input_data.N,
-            input_data.P,
-            input_data.K,
-            input_data.temperature,
-            input_data.humidity,
-            input_data.ph,
-            input_data.rainfall
-        ]])
-        
-        # Make prediction
-        prediction = model.predict(features)[0]
-        
-        # Get prediction probabilities for confidence score
-        prediction_proba = model.predict_proba(features)
-        confidence = float(np.max(prediction_proba))
+        # Single booster pass (or memo hit / grid lookup): label is the argmax of the probabilities
+        best_idx, prediction_proba, source = await predict_single(input_data, exact)
+        response.headers["X-Prediction-Source"] = source
+        prediction = CLASSES[best_idx]
+        confidence = float(prediction_proba[best_idx])
         
         return CropPredictionOutput(
             predicted_crop=prediction,
@@ -70,39 +292,32 @@ async def predict_crop(input_data: CropPredictionInput):
             }
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
 @app.post("/predict-detailed")
-async def predict_crop_detailed(input_data: CropPredictionInput):
+@METRICS.handler
+async def predict_crop_detailed(input_data: CropPredictionInput, response: Response, exact: bool = False):
+    MODEL_STATE.require()
     try:
-        # Convert input to numpy array
-        features = np.array([[
-            input_data.N,
-            input_data.P,
-            input_data.K,
-            input_data.temperature,
-            input_data.humidity,
-            input_data.ph,
-            input_data.rainfall
-        ]])
-        
-        # Make prediction
-        prediction = model.predict(features)[0]
+        # Single booster pass (or memo hit / grid lookup) for the label and all class probabilities
+        best_idx, prediction_proba, source = await predict_single(input_data, exact)
+        response.headers["X-Prediction-Source"] = source
         
-        # Get prediction probabilities for all classes
-        prediction_proba = model.predict_proba(features)[0]
-        
-        # Get top 5 predictions with probabilities
-        classes = model.classes_
-        class_probabilities = dict(zip(classes, prediction_proba))
-        top_predictions = sorted(class_probabilities.items(), key=lambda x: x[1], reverse=True)[:5]
+        # Get top 5 predictions with probabilities (partial selection, no full sort)
+        with METRICS.stage("postprocess"):
+            top_idx, top_proba = top_k_predictions(prediction_proba[np.newaxis, :], 5)
         
         return {
-            "predicted_crop": prediction,
-            "confidence": float(np.max(prediction_proba)),
-            "top_5_predictions": [{"crop": crop, "probability": float(prob)} for crop, prob in top_predictions],
-            "all_probabilities": {crop: float(prob) for crop, prob in class_probabilities.items()},
+            "predicted_crop": CLASSES[best_idx],
+            "confidence": float(prediction_proba[best_idx]),
+            "top_5_predictions": [
+                {"crop": crop, "probability": prob}
+                for crop, prob in zip(CLASSES[top_idx[0]].tolist(), top_proba[0].tolist())
+            ],
+            "all_probabilities": dict(zip(CLASSES.tolist(), prediction_proba.tolist())),
             "input_features": {
                 "N": input_data.N,
                 "P": input_data.P,
@@ -114,11 +329,81 @@ async def predict_crop_detailed(input_data: CropPredictionInput):
             }
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+@app.post("/predict-batch")
+@METRICS.handler
+async def predict_crop_batch(batch: CropBatchInput, response: Response, exact: bool = False):
+    MODEL_STATE.require()
+    with METRICS.stage("features"):
+        features = batch_features(batch)
+    if features.shape[0] == 0:
+        return {"n_rows": 0, "predictions": []}
+
+    try:
+        # Grid lookups for the rows it covers, then one contiguous pass over the
+        # booster for the rest
+        looked_up = None
+        if suitability_grid is not None and not exact:
+            looked_up = await INFERENCE_POOL.run(grid_lookup, features, exact)
+        if looked_up is None:
+            _, prediction_proba = await INFERENCE_POOL.run(predict_core, features)
+            response.headers["X-Prediction-Source"] = "model"
+        else:
+            inside, grid_proba = looked_up
+            prediction_proba = np.empty((features.shape[0], len(CLASSES)))
+            prediction_proba[inside] = grid_proba
+            if not inside.all():
+                _, prediction_proba[~inside] = await INFERENCE_POOL.run(predict_core, features[~inside])
+            response.headers["X-Prediction-Source"] = "grid" if inside.all() else "grid+model"
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+    with METRICS.stage("postprocess"):
+        top_idx, top_proba = top_k_predictions(prediction_proba, batch.top_k)
+        top_crops = CLASSES[top_idx].tolist()
+        top_proba = top_proba.tolist()
+
+    return {
+        "n_rows": len(top_crops),
+        "predictions": [
+            {
+                "predicted_crop": crops[0],
+                "confidence": probs[0],
+                "top_k": [{"crop": crop, "probability": prob} for crop, prob in zip(crops, probs)],
+            }
+            for crops, probs in zip(top_crops, top_proba)
+        ],
+    }
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {"prediction_memo": PREDICTION_MEMO.stats() if PREDICTION_MEMO is not None else None}
+
+def grid_info():
+    if suitability_grid is None:
+        return {"status": grid_status}
+    meta = suitability_grid.meta
+    return {
+        "status": grid_status,
+        "mode": SUITABILITY_GRID_MODE,
+        "path": SUITABILITY_GRID_PATH,
+        "cells": suitability_grid.n_cells,
+        "shape": list(suitability_grid.shape),
+        "lower": suitability_grid.lower.tolist(),
+        "upper": suitability_grid.upper.tolist(),
+        "built_at": meta.get("built_at"),
+        "deviation": meta.get("deviation"),
+    }
+
 @app.get("/model-info")
 async def get_model_info():
+    MODEL_STATE.require()
     try:
         # Get feature names (assuming the order from training)
         feature_names = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
@@ -128,6 +413,8 @@ async def get_model_info():
         
         return {
             "model_type": "LightGBM Classifier",
+            "inference_backend": INFERENCE_BACKEND,
+            "suitability_grid": grid_info(),
             "features": feature_names,
             "n_features": len(feature_names),
             "n_classes": len(classes),
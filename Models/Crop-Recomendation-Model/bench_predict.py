@@ -0,0 +1,74 @@
+"""Per-request CPU time of the old two-pass prediction vs. the single-pass core.
+
+Run from this directory (it imports app.py, which loads Crop_Recommendation.joblib):
+
+    python bench_predict.py --rows 500
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from app import CLASSES, FEATURE_NAMES, model, predict_core, top_k_predictions
+
+
+def old_predict(features):
+    prediction = model.predict(features)[0]
+    confidence = float(np.max(model.predict_proba(features)))
+    return prediction, confidence
+
+
+def old_detailed(features):
+    prediction = model.predict(features)[0]
+    prediction_proba = model.predict_proba(features)[0]
+    class_probabilities = dict(zip(model.classes_, prediction_proba))
+    top_predictions = sorted(class_probabilities.items(), key=lambda x: x[1], reverse=True)[:5]
+    return prediction, top_predictions
+
+
+def new_predict(features):
+    best_idx, prediction_proba = predict_core(features)
+    return CLASSES[best_idx[0]], float(prediction_proba[0, best_idx[0]])
+
+
+def new_detailed(features):
+    best_idx, prediction_proba = predict_core(features)
+    top_idx, top_proba = top_k_predictions(prediction_proba, 5)
+    return CLASSES[best_idx[0]], list(zip(CLASSES[top_idx[0]], top_proba[0]))
+
+
+def cpu_time_per_call(fn, rows):
+    fn(rows[0])  # warm-up
+    start = time.process_time()
+    for features in rows:
+        fn(features)
+    return (time.process_time() - start) / len(rows) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="Crop_recommendation.csv")
+    parser.add_argument("--rows", type=int, default=500)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    df = pd.read_csv(args.csv).sample(n=args.rows, random_state=0, replace=True)
+    rows = [r.reshape(1, -1) for r in df[FEATURE_NAMES].to_numpy(dtype=np.float64)]
+
+    mismatches = 0
+    for features in rows:
+        old_label, old_top = old_detailed(features)
+        new_label, new_top = new_detailed(features)
+        mismatches += old_label != new_label or [c for c, _ in old_top] != [c for c, _ in new_top]
+    print(f"label/top-5 mismatches over {len(rows)} rows: {mismatches}")
+
+    print(f"{'endpoint':<18} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for name, old, new in (("/predict", old_predict, new_predict), ("/predict-detailed", old_detailed, new_detailed)):
+        before, after = cpu_time_per_call(old, rows), cpu_time_per_call(new, rows)
+        print(f"{name:<18} {before:>10.1f} {after:>10.1f} {before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Flat-array inference backend for the LightGBM crop recommender.
+
+The trained booster is exported (via ``booster_.dump_model()``) into a handful of
+NumPy arrays - one entry per node across all trees - and evaluated by walking
+every tree at once, one level per step, with vectorized gathers. Trees are stored
+deepest first so each step only touches the prefix of trees still descending.
+Evaluation needs nothing but NumPy, and skips the sklearn-wrapper overhead of
+``LGBMClassifier.predict_proba`` on tiny inputs.
+
+Parity check / latency comparison against the original model:
+
+    python flat_booster.py --check
+    python flat_booster.py --export Crop_Recommendation.flat.npz
+"""
+import argparse
+import time
+
+import numpy as np
+
+# LightGBM treats |x| <= kZeroThreshold as zero for missing_type == "Zero".
+_ZERO_THRESHOLD = 1e-35
+_MISSING_TYPES = {"None": 0, "Zero": 1, "NaN": 2}
+
+
+def _tree_depth(node) -> int:
+    if "leaf_value" in node:
+        return 0
+    return 1 + max(_tree_depth(node["left_child"]), _tree_depth(node["right_child"]))
+
+
+class FlatBooster:
+    _arrays = ("feature", "threshold", "children", "default_left", "missing_type", "leaf_value",
+               "roots", "level_counts", "tree_order", "classes")
+
+    def __init__(self, feature, threshold, children, default_left, missing_type, leaf_value,
+                 roots, level_counts, tree_order, classes):
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * node] is the right child, children[2 * node + 1] the left one,
+        # so the next node is children[2 * node + go_left].
+        self.children = children
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.leaf_value = leaf_value
+        # Trees sorted by depth (deepest first); level_counts[d] = trees deeper than d.
+        self.roots = roots
+        self.level_counts = level_counts
+        # tree_order[i] = original LightGBM index of the i-th stored tree.
+        self.tree_order = tree_order
+        self.classes = classes
+        self.n_classes = len(classes)
+        self._unsort = np.argsort(tree_order)
+        self._any_missing_rule = bool(np.any(missing_type != _MISSING_TYPES["None"]))
+
+    @classmethod
+    def from_lgbm(cls, model) -> "FlatBooster":
+        """Export a fitted multiclass ``LGBMClassifier`` into flat node arrays."""
+        booster = model.booster_
+        dump = booster.dump_model(num_iteration=booster.best_iteration or None)
+        if not dump["objective"].startswith("multiclass ") or dump.get("average_output"):
+            raise ValueError(f"Unsupported objective for the flat backend: '{dump['objective']}'")
+        # Trees are stored iteration-major: tree i contributes to class i % num_class.
+        if dump["num_tree_per_iteration"] != len(model.classes_):
+            raise ValueError("Expected one tree per class per boosting iteration.")
+
+        trees = [t["tree_structure"] for t in dump["tree_info"]]
+        depths = np.array([_tree_depth(t) for t in trees])
+        tree_order = np.argsort(-depths, kind="stable")
+
+        feature, threshold, default_left, missing_type, leaf_value = [], [], [], [], []
+        children, roots = [], []
+        for tree_idx in tree_order:
+            roots.append(len(feature))
+            # Depth-first flattening; leaves point to themselves so a finished walk is a fixed point.
+            stack = [(trees[tree_idx], None)]
+            while stack:
+                node, parent_slot = stack.pop()
+                idx = len(feature)
+                if parent_slot is not None:
+                    children[parent_slot] = idx
+                children.extend([idx, idx])
+                if "leaf_value" in node:
+                    feature.append(0)
+                    threshold.append(np.inf)
+                    default_left.append(True)
+                    missing_type.append(_MISSING_TYPES["None"])
+                    leaf_value.append(node["leaf_value"])
+                    continue
+                if node["decision_type"] != "<=":
+                    raise ValueError("Categorical splits are not supported by the flat backend.")
+                feature.append(node["split_feature"])
+                threshold.append(node["threshold"])
+                default_left.append(node["default_left"])
+                missing_type.append(_MISSING_TYPES[node["missing_type"]])
+                leaf_value.append(0.0)
+                stack.append((node["right_child"], 2 * idx))
+                stack.append((node["left_child"], 2 * idx + 1))
+
+        max_depth = int(depths.max()) if len(depths) else 0
+        return cls(
+            feature=np.asarray(feature, dtype=np.int32),
+            threshold=np.asarray(threshold, dtype=np.float64),
+            children=np.asarray(children, dtype=np.int32),
+            default_left=np.asarray(default_left, dtype=bool),
+            missing_type=np.asarray(missing_type, dtype=np.int8),
+            leaf_value=np.asarray(leaf_value, dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            level_counts=np.array([np.sum(depths > d) for d in range(max_depth)], dtype=np.int64),
+            tree_order=tree_order.astype(np.int64),
+            classes=np.asarray(model.classes_),
+        )
+
+    def save(self, path: str) -> None:
+        arrays = {name: getattr(self, name) for name in self._arrays}
+        # Stored as a unicode array so the file loads without pickle.
+        arrays["classes"] = self.classes.astype(str)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "FlatBooster":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in cls._arrays})
+
+    def raw_scores(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        check_missing = self._any_missing_rule or bool(np.isnan(flat_X).any())
+
+        # nodes[t, r] = current node of stored tree t for row r
+        nodes = np.repeat(self.roots[:, None], n_rows, axis=1)
+        row_offsets = np.arange(n_rows, dtype=np.int32) * n_features
+        for count in self.level_counts:
+            current = nodes[:count]
+            x = flat_X[self.feature[current] + row_offsets]
+            if check_missing:
+                go_left = self._decide_with_missing(x, current)
+            else:
+                go_left = x <= self.threshold[current]
+            nodes[:count] = self.children[2 * current + go_left]
+
+        leaf = self.leaf_value[nodes][self._unsort]
+        return leaf.reshape(-1, self.n_classes, n_rows).sum(axis=0).T
+
+    def _decide_with_missing(self, x: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        # Mirrors LightGBM's NumericalDecision: NaN becomes 0.0 unless missing_type is
+        # NaN; missing values (NaN, or zero for missing_type Zero) follow default_left.
+        mt = self.missing_type[nodes]
+        nan = np.isnan(x)
+        x = np.where(nan & (mt != _MISSING_TYPES["NaN"]), 0.0, x)
+        missing = (nan & (mt == _MISSING_TYPES["NaN"])) | (
+            (mt == _MISSING_TYPES["Zero"]) & (np.abs(x) <= _ZERO_THRESHOLD))
+        return np.where(missing, self.default_left[nodes], x <= self.threshold[nodes])
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        scores = self.raw_scores(X)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes[self.predict_proba(X).argmax(axis=1)]
+
+
+def _check(model, flat: FlatBooster, csv_path: str) -> None:
+    import warnings
+
+    import pandas as pd
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    X = pd.read_csv(csv_path)[list(model.booster_.feature_name())].to_numpy(dtype=np.float64)
+
+    expected = model.predict_proba(X)
+    got = flat.predict_proba(X)
+    print(f"rows={len(X)} trees={len(flat.roots)} nodes={len(flat.feature)} max_depth={len(flat.level_counts)}")
+    print(f"max |proba difference|: {np.max(np.abs(expected - got)):.3e}")
+    print(f"label mismatches: {int(np.sum(expected.argmax(axis=1) != got.argmax(axis=1)))}")
+
+    backends = (
+        ("LGBMClassifier.predict_proba", model.predict_proba),
+        ("Booster.predict", model.booster_.predict),
+        ("FlatBooster.predict_proba", flat.predict_proba),
+    )
+    for name, fn in backends:
+        fn(X[:1])
+        start = time.perf_counter()
+        for row in X[:500]:
+            fn(row.reshape(1, -1))
+        single = (time.perf_counter() - start) / 500 * 1e6
+        start = time.perf_counter()
+        fn(X)
+        full = (time.perf_counter() - start) * 1e3
+        print(f"{name:<30} single row: {single:8.1f} us   all {len(X)} rows: {full:8.1f} ms")
+
+
+if __name__ == "__main__":
+    import joblib
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="Crop_Recommendation.joblib")
+    parser.add_argument("--csv", default="Crop_recommendation.csv")
+    parser.add_argument("--check", action="store_true", help="compare against model.predict_proba on --csv")
+    parser.add_argument("--export", metavar="PATH", help="write the flat arrays to an .npz file")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    flat = FlatBooster.from_lgbm(model)
+    if args.export:
+        flat.save(args.export)
+        print(f"Saved flat booster to {args.export}")
+    if args.check or not args.export:
+        _check(model, flat, args.csv)
@@ -0,0 +1,288 @@
+"""Precomputed class-probability grid for the crop recommender.
+
+The seven inputs live in bounded agronomic ranges, so the model's probabilities
+can be tabulated once on a grid over (N, P, K, temperature, humidity, ph,
+rainfall) and looked up instead of evaluated. The table is a plain ``.npy``
+(memory-mapped by the API, so it costs page cache rather than heap and is shared
+between workers) with a ``.json`` sidecar holding the axes, the SHA-256 of the
+model it was built from, and its measured deviation from that model on the
+dataset rows plus uniformly random points inside the bounds.
+
+Each axis is cut into cells and the model is evaluated once per cell, at the
+cell's midpoint. A boosted tree ensemble is constant between consecutive split
+thresholds, so by default (``--axes threshold``) the cuts are taken from the
+model's own split thresholds on that feature, spread by cumulative split gain:
+at the same table size this agrees with the model far more often than evenly
+spaced cuts (``--axes uniform``). Lookup is either the cell containing the point
+(``cell``, LightGBM's ``x <= threshold`` convention) or multilinear interpolation
+between the 2^7 surrounding cell midpoints (``linear``). Points outside the
+bounds are not answered by the grid.
+
+    python suitability_grid.py --build Crop_Recommendation.grid.npy --resolution 6
+    python suitability_grid.py --build Crop_Recommendation.grid.npy --resolution 6 humidity=10 rainfall=10
+    python suitability_grid.py --check Crop_Recommendation.grid.npy
+"""
+import argparse
+import bisect
+import hashlib
+import itertools
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+FEATURE_NAMES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+MODES = ('cell', 'linear')
+# Rows per vectorized chunk while building and interpolating, bounding temporaries.
+CHUNK_ROWS = 4096
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def uniform_cuts(lower: float, upper: float, cells: int) -> np.ndarray:
+    return np.linspace(lower, upper, cells + 1)[1:-1]
+
+
+def threshold_cuts(model, feature: str, lower: float, upper: float, cells: int) -> np.ndarray:
+    """Up to ``cells - 1`` of the model's split thresholds on ``feature``, at even steps
+    of cumulative split gain, so cells are narrow where the model changes most."""
+    splits = model.booster_.trees_to_dataframe()
+    splits = splits[(splits['split_feature'] == feature) & (splits['threshold'] > lower)
+                    & (splits['threshold'] < upper)]
+    if splits.empty:
+        return uniform_cuts(lower, upper, cells)
+    order = np.argsort(splits['threshold'].to_numpy(), kind='stable')
+    thresholds = splits['threshold'].to_numpy()[order]
+    gain = np.cumsum(splits['split_gain'].to_numpy()[order])
+    picks = np.searchsorted(gain, gain[-1] * np.arange(1, cells) / cells)
+    return np.unique(thresholds[np.minimum(picks, len(thresholds) - 1)])
+
+
+class SuitabilityGrid:
+    def __init__(self, probs, lower, upper, cuts, classes, meta=None):
+        # probs[flat cell index] = class probabilities, cells in C order over FEATURE_NAMES.
+        self.probs = probs
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.cuts = [np.asarray(c, dtype=np.float64) for c in cuts]
+        self.classes = np.asarray(classes)
+        self.meta = meta or {}
+        edges = [np.concatenate([[lo], c, [hi]]) for lo, c, hi in zip(self.lower, self.cuts, self.upper)]
+        self.midpoints = [(e[:-1] + e[1:]) / 2 for e in edges]
+        self.shape = tuple(len(m) for m in self.midpoints)
+        self.strides = np.array([int(np.prod(self.shape[d + 1:])) for d in range(len(self.shape))], dtype=np.int64)
+        self._corners = np.array(list(itertools.product((0, 1), repeat=len(self.shape))), dtype=np.int64)
+        # Plain lists for the single-row path, where bisect beats NumPy call overhead.
+        self._cut_lists = [c.tolist() for c in self.cuts]
+        self._stride_list = self.strides.tolist()
+
+    @property
+    def n_cells(self) -> int:
+        return int(np.prod(self.shape))
+
+    # -- lookup --------------------------------------------------------------
+
+    def contains(self, X: np.ndarray) -> np.ndarray:
+        """Boolean mask of the rows inside the grid bounds (NaN is outside)."""
+        return np.all((X >= self.lower) & (X <= self.upper), axis=1)
+
+    def cell(self, X: np.ndarray) -> np.ndarray:
+        if X.shape[0] == 1:
+            # bisect_left == searchsorted(side='left'): x <= cut falls in the lower cell.
+            flat = sum(bisect.bisect_left(cuts, x) * stride
+                       for cuts, x, stride in zip(self._cut_lists, X[0].tolist(), self._stride_list))
+            return np.asarray(self.probs[flat:flat + 1], dtype=np.float64)
+        flat = np.zeros(X.shape[0], dtype=np.int64)
+        for d, cuts in enumerate(self.cuts):
+            flat += np.searchsorted(cuts, X[:, d], side='left') * self.strides[d]
+        return np.asarray(self.probs[flat], dtype=np.float64)
+
+    def linear(self, X: np.ndarray) -> np.ndarray:
+        out = np.empty((X.shape[0], len(self.classes)))
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            base = np.zeros(chunk.shape, dtype=np.int64)
+            frac = np.zeros(chunk.shape)
+            for d, mids in enumerate(self.midpoints):
+                if len(mids) == 1:
+                    continue
+                i = np.clip(np.searchsorted(mids, chunk[:, d], side='right') - 1, 0, len(mids) - 2)
+                base[:, d] = i
+                frac[:, d] = np.clip((chunk[:, d] - mids[i]) / (mids[i + 1] - mids[i]), 0.0, 1.0)
+            # (rows, corners): weight = prod over axes of frac or 1 - frac.
+            weights = np.prod(np.where(self._corners[None, :, :], frac[:, None, :], 1.0 - frac[:, None, :]), axis=2)
+            corners = np.minimum(base[:, None, :] + self._corners[None, :, :], np.array(self.shape) - 1)
+            cell_probs = np.asarray(self.probs[corners @ self.strides], dtype=np.float64)
+            out[start:start + CHUNK_ROWS] = np.einsum('rk,rkc->rc', weights, cell_probs)
+        return out
+
+    def lookup(self, X: np.ndarray, mode: str = 'cell') -> np.ndarray:
+        """Class probabilities for rows inside the bounds (see ``contains``)."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.shape))
+        return self.cell(X) if mode == 'cell' else self.linear(X)
+
+    # -- build / persist -----------------------------------------------------
+
+    @classmethod
+    def build(cls, model, lower, upper, cuts, path, dtype='float32') -> 'SuitabilityGrid':
+        """Evaluate ``model`` at every cell midpoint, writing the table straight to ``path``."""
+        classes = np.asarray(model.classes_)
+        shape = tuple(len(c) + 1 for c in cuts)
+        probs = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(int(np.prod(shape)), len(classes)))
+        grid = cls(probs, lower, upper, cuts, classes)
+        for start in range(0, grid.n_cells, CHUNK_ROWS * 16):
+            cells = np.arange(start, min(start + CHUNK_ROWS * 16, grid.n_cells))
+            idx = np.unravel_index(cells, grid.shape)
+            points = np.stack([mids[i] for mids, i in zip(grid.midpoints, idx)], axis=1)
+            probs[cells] = model.booster_.predict(points)
+        probs.flush()
+        return grid
+
+    def save_meta(self, path) -> None:
+        meta = dict(self.meta, features=FEATURE_NAMES, lower=self.lower.tolist(), upper=self.upper.tolist(),
+                    cuts=[c.tolist() for c in self.cuts], classes=self.classes.astype(str).tolist(),
+                    dtype=str(self.probs.dtype))
+        with open(Path(path).with_suffix('.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r') -> 'SuitabilityGrid':
+        with open(Path(path).with_suffix('.json')) as f:
+            meta = json.load(f)
+        probs = np.load(path, mmap_mode=mmap_mode)
+        grid = cls(probs, meta['lower'], meta['upper'], meta['cuts'], meta['classes'], meta)
+        if meta.get('features') != FEATURE_NAMES or probs.shape != (grid.n_cells, len(grid.classes)):
+            raise ValueError(f"{path} does not match its metadata")
+        return grid
+
+    def check_model(self, model_path, classes) -> None:
+        """Raise ValueError unless the grid was built from this model file."""
+        if self.meta.get('model_sha256') != file_sha256(model_path):
+            raise ValueError(f"grid was built from a different model than {Path(model_path).name}")
+        if [str(c) for c in classes] != self.classes.astype(str).tolist():
+            raise ValueError("grid classes do not match the model")
+
+    def deviation(self, exact: np.ndarray, X: np.ndarray) -> dict:
+        """Deviation of both lookup modes from the exact probabilities ``exact`` at ``X``."""
+        report = {}
+        for mode in MODES:
+            approx = self.lookup(X, mode)
+            diff = np.abs(approx - exact)
+            report[mode] = {
+                'max_abs_proba_error': float(diff.max()),
+                'mean_abs_proba_error': float(diff.mean()),
+                'max_abs_confidence_error': float(np.abs(approx.max(axis=1) - exact.max(axis=1)).max()),
+                'label_agreement': float(np.mean(approx.argmax(axis=1) == exact.argmax(axis=1))),
+            }
+        return report
+
+
+def _parse_resolution(items):
+    cells = dict.fromkeys(FEATURE_NAMES, int(items[0]))
+    for item in items[1:]:
+        name, _, value = item.partition('=')
+        if name not in cells or not value:
+            raise SystemExit(f"Bad resolution '{item}', expected <feature>=<cells> with a feature in {FEATURE_NAMES}")
+        cells[name] = int(value)
+    return [cells[name] for name in FEATURE_NAMES]
+
+
+def _report(model, grid, csv_path, n_random, seed=0):
+    import pandas as pd
+    X_csv = pd.read_csv(csv_path)[FEATURE_NAMES].to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    points = {
+        'dataset rows': X_csv[grid.contains(X_csv)],
+        'uniform random': grid.lower + rng.random((n_random, len(FEATURE_NAMES))) * (grid.upper - grid.lower),
+    }
+    return {name: dict(grid.deviation(model.booster_.predict(X), X), n_points=len(X)) for name, X in points.items()}
+
+
+def _print_report(report):
+    print(f"{'points':<16} {'mode':<8} {'max |dp|':>9} {'mean |dp|':>10} {'max |dconf|':>12} {'labels agree':>13}")
+    for name, modes in report.items():
+        for mode in MODES:
+            r = modes[mode]
+            print(f"{name:<16} {mode:<8} {r['max_abs_proba_error']:>9.4f} {r['mean_abs_proba_error']:>10.5f} "
+                  f"{r['max_abs_confidence_error']:>12.4f} {r['label_agreement']:>12.2%}")
+
+
+def _latency(model, grid, X):
+    rows = [X[i:i + 1] for i in range(min(500, len(X)))]
+    for name, fn in (('LGBMClassifier.predict_proba', model.predict_proba),
+                     ('Booster.predict', model.booster_.predict),
+                     ('grid cell', lambda r: grid.lookup(r, 'cell')),
+                     ('grid linear', lambda r: grid.lookup(r, 'linear'))):
+        fn(rows[0])
+        start = time.perf_counter()
+        for row in rows:
+            fn(row)
+        print(f"{name:<30} single row: {(time.perf_counter() - start) / len(rows) * 1e6:8.1f} us")
+
+
+if __name__ == '__main__':
+    import warnings
+
+    import joblib
+    import pandas as pd
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='Crop_Recommendation.joblib')
+    parser.add_argument('--csv', default='Crop_recommendation.csv')
+    parser.add_argument('--build', metavar='PATH', help='write the grid to PATH (.npy) and its .json sidecar')
+    parser.add_argument('--check', metavar='PATH', help='report deviation and latency of an existing grid')
+    parser.add_argument('--resolution', nargs='+', default=['6'],
+                        help='cells per axis, then optional per-feature overrides like rainfall=10')
+    parser.add_argument('--axes', choices=('threshold', 'uniform'), default='threshold',
+                        help='place cell boundaries at model split thresholds or evenly')
+    parser.add_argument('--margin', type=float, default=0.0,
+                        help='widen the dataset min/max bounds by this fraction of each range')
+    parser.add_argument('--dtype', choices=('float32', 'float16'), default='float32')
+    parser.add_argument('--random-points', type=int, default=20000, help='uniform points in the deviation report')
+    args = parser.parse_args()
+
+    if bool(args.build) == bool(args.check):
+        parser.error('pass exactly one of --build or --check')
+    model = joblib.load(args.model)
+    if args.build:
+        data = pd.read_csv(args.csv)[FEATURE_NAMES].to_numpy(dtype=np.float64)
+        pad = (data.max(axis=0) - data.min(axis=0)) * args.margin
+        lower, upper = data.min(axis=0) - pad, data.max(axis=0) + pad
+        cuts = [
+            threshold_cuts(model, name, lower[d], upper[d], n) if args.axes == 'threshold'
+            else uniform_cuts(lower[d], upper[d], n)
+            for d, (name, n) in enumerate(zip(FEATURE_NAMES, _parse_resolution(args.resolution)))
+        ]
+        shape = [len(c) + 1 for c in cuts]
+        n_cells = int(np.prod(shape))
+        print(f"Building {' x '.join(map(str, shape))} = {n_cells:,} cells x {len(model.classes_)} classes "
+              f"({n_cells * len(model.classes_) * np.dtype(args.dtype).itemsize / 1e6:.1f} MB)")
+        started = time.perf_counter()
+        grid = SuitabilityGrid.build(model, lower, upper, cuts, args.build, args.dtype)
+        build_seconds = time.perf_counter() - started
+        report = _report(model, grid, args.csv, args.random_points)
+        grid.meta = {
+            'built_at': datetime.utcnow().strftime('%Y%m%dT%H%M%SZ'),
+            'model_file': Path(args.model).name,
+            'model_sha256': file_sha256(args.model),
+            'axes': args.axes,
+            'build_seconds': round(build_seconds, 2),
+            'deviation': report,
+        }
+        grid.save_meta(args.build)
+        print(f"Built in {build_seconds:.1f} s -> {args.build}")
+    else:
+        grid = SuitabilityGrid.load(args.check)
+        grid.check_model(args.model, model.classes_)
+        report = _report(model, grid, args.csv, args.random_points)
+    _print_report(report)
+    _latency(model, grid, pd.read_csv(args.csv)[FEATURE_NAMES].to_numpy(dtype=np.float64))
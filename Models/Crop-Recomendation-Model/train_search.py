@@ -0,0 +1,185 @@
+# train_search.py
+# Headless training with a parallel hyperparameter search for the crop recommender.
+#
+# crop-recommendation.py is the exploratory notebook export: it fits one default
+# LGBMClassifier on a 70/30 split between plotting cells. This script keeps the
+# same split (shuffle, random_state=0) but searches a grid of num_leaves x
+# n_estimators x learning_rate:
+#   1. every candidate is scored with stratified k-fold CV on the training split,
+#      one candidate per process (LightGBM itself single-threaded);
+#   2. each candidate is refit on the whole training split and its single-row
+#      booster latency is measured here, one model at a time, so timings do not
+#      compete with each other for cores;
+#   3. the Pareto front of (CV accuracy, latency) is computed and the fastest front
+#      model within --tolerance of the best CV accuracy is saved, with every
+#      candidate's numbers in search_metrics.json.
+# Smaller/fewer trees usually cost nothing in accuracy on this dataset and serve
+# several times faster. Copy the artifact next to app.py to serve it.
+#
+#   python train_search.py --workers 4 --folds 5 --tolerance 0.005
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+CSV_PATH = 'Crop_recommendation.csv'
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+TARGET = 'label'
+RANDOM_STATE = 0
+
+
+def make_model(params):
+    return lgb.LGBMClassifier(**params, n_jobs=1, random_state=RANDOM_STATE, verbose=-1)
+
+
+def cross_validate(params, X, y, folds):
+    """Mean / std accuracy of one candidate over stratified folds, and its fit time."""
+    started = time.perf_counter()
+    scores = []
+    for train_idx, val_idx in StratifiedKFold(folds, shuffle=True, random_state=RANDOM_STATE).split(X, y):
+        model = make_model(params).fit(X[train_idx], y[train_idx])
+        scores.append(accuracy_score(y[val_idx], model.predict(X[val_idx])))
+    return {
+        'params': params,
+        'cv_accuracy': float(np.mean(scores)),
+        'cv_accuracy_std': float(np.std(scores)),
+        'cv_seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def single_row_latency_us(model, X, n_rows, rounds=5):
+    """Microseconds per single-row prediction: ``latency_us`` for the booster itself
+    (what the tree count and depth decide, and the search objective) and
+    ``predict_proba_us`` through the sklearn wrapper, which adds a fixed overhead.
+    Each is the best of ``rounds`` passes over the same rows."""
+    rows = [X[i:i + 1] for i in range(min(n_rows, len(X)))]
+    timings = {}
+    for name, fn in (('latency_us', model.booster_.predict), ('predict_proba_us', model.predict_proba)):
+        for row in rows[:20]:
+            fn(row)
+        best = float('inf')
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            for row in rows:
+                fn(row)
+            best = min(best, (time.perf_counter() - t0) / len(rows))
+        timings[name] = round(best * 1e6, 1)
+    return timings
+
+
+def pareto_front(results):
+    """Candidates that no other candidate beats on both accuracy and latency."""
+    front = []
+    for r in results:
+        dominated = any(
+            o['cv_accuracy'] >= r['cv_accuracy'] and o['latency_us'] <= r['latency_us']
+            and (o['cv_accuracy'] > r['cv_accuracy'] or o['latency_us'] < r['latency_us'])
+            for o in results
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: r['latency_us'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter search for the crop recommender.')
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--num-leaves', type=int, nargs='+', default=[4, 8, 15, 31])
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[20, 50, 100])
+    parser.add_argument('--learning-rate', type=float, nargs='+', default=[0.05, 0.1, 0.2])
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--test-size', type=float, default=0.3)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tolerance', type=float, default=0.005,
+                        help='CV accuracy the selected model may give up against the best candidate')
+    parser.add_argument('--latency-rows', type=int, default=200, help='single-row predictions timed per model')
+    parser.add_argument('--out-dir', default='outputs_search')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    X = df[FEATURES].to_numpy(dtype=np.float64)
+    y = df[TARGET].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, shuffle=True,
+                                                        random_state=RANDOM_STATE)
+
+    grid = [dict(num_leaves=l, n_estimators=n, learning_rate=lr)
+            for l, n, lr in itertools.product(args.num_leaves, args.n_estimators, args.learning_rate)]
+    print(f"{len(grid)} candidates x {args.folds} folds on {len(X_train)} training rows, {args.workers} workers")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(cross_validate, params, X_train, y_train, args.folds) for params in grid]
+        results = [f.result() for f in futures]
+    search_seconds = time.perf_counter() - started
+
+    models = []
+    for r in results:
+        model = make_model(r['params']).fit(X_train, y_train)
+        r['test_accuracy'] = float(accuracy_score(y_test, model.predict(X_test)))
+        r['trees'] = model.booster_.num_trees()
+        r['leaves'] = int(model.booster_.trees_to_dataframe()['decision_type'].isna().sum())
+        r.update(single_row_latency_us(model, X_test, args.latency_rows))
+        models.append(model)
+
+    front = pareto_front(results)
+    best_accuracy = max(r['cv_accuracy'] for r in results)
+    chosen = min((r for r in front if r['cv_accuracy'] >= best_accuracy - args.tolerance),
+                 key=lambda r: r['latency_us'])
+    model = models[results.index(chosen)]
+    default = make_model({}).fit(X_train, y_train)
+    baseline = {
+        'params': 'LGBMClassifier() defaults',
+        'test_accuracy': float(accuracy_score(y_test, default.predict(X_test))),
+        'trees': default.booster_.num_trees(),
+        **single_row_latency_us(default, X_test, args.latency_rows),
+    }
+
+    print(f"\n{'num_leaves':>10} {'n_est':>6} {'lr':>5} {'cv acc':>8} {'test acc':>9} {'trees':>6} "
+          f"{'us/row':>8} {'sklearn':>8}")
+    for r in sorted(results, key=lambda r: (-r['cv_accuracy'], r['latency_us'])):
+        mark = ' *' if r is chosen else (' p' if r in front else '')
+        p = r['params']
+        print(f"{p['num_leaves']:>10} {p['n_estimators']:>6} {p['learning_rate']:>5} {r['cv_accuracy']:>8.4f} "
+              f"{r['test_accuracy']:>9.4f} {r['trees']:>6} {r['latency_us']:>8.0f} {r['predict_proba_us']:>8.0f}{mark}")
+    print(f"\n* selected, p Pareto front. Search took {search_seconds:.1f} s.")
+    print(f"Default LGBMClassifier: test accuracy {baseline['test_accuracy']:.4f}, "
+          f"{baseline['trees']} trees, {baseline['latency_us']:.0f} us/row "
+          f"({baseline['predict_proba_us']:.0f} via predict_proba)")
+    print(f"Selected: test accuracy {chosen['test_accuracy']:.4f}, {chosen['trees']} trees, "
+          f"{chosen['latency_us']:.0f} us/row ({chosen['predict_proba_us']:.0f} via predict_proba)")
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model_path = out_dir / 'Crop_Recommendation.joblib'
+    joblib.dump(model, model_path)
+    with open(out_dir / 'search_metrics.json', 'w') as f:
+        json.dump({
+            'trained_at': datetime.utcnow().strftime('%Y%m%dT%H%M%SZ'),
+            'csv': args.csv,
+            'folds': args.folds,
+            'test_size': args.test_size,
+            'tolerance': args.tolerance,
+            'search_seconds': round(search_seconds, 2),
+            'selected': chosen,
+            'baseline': baseline,
+            'pareto_front': front,
+            'candidates': results,
+        }, f, indent=2)
+    print("Saved model to:", model_path)
+    print("Saved metrics to:", out_dir / 'search_metrics.json')
+
+
+if __name__ == '__main__':
+    main()
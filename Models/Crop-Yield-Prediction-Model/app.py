@@ -1,22 +1,67 @@
 # app.py
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
-from typing import Optional
-import joblib
+from typing import List, Optional, TYPE_CHECKING
+import asyncio
 import numpy as np
-import pandas as pd
 import json
+import math
+import os
+import sys
+import warnings
 from pathlib import Path
 from fastapi.middleware.cors import CORSMiddleware
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from serving.executor import WorkerPool
+from serving.memo import Memoizer
+from serving.metrics import Metrics
+from serving.readiness import WARMUP, ModelState
 
+# pandas, joblib/sklearn and intervals are imported where they are first needed, so
+# with LAZY_STARTUP=1 the server answers /health before paying for them.
+if TYPE_CHECKING:
+    import pandas as pd
 
-MODEL_PATH = 'crop_yield_pipeline_latest.joblib'  
-RESID_STATS = 'residual_stats.json'                
-META = 'model_metadata.json'
+# Model files are read from MODEL_DIR: the working directory when the app is run on
+# its own, or the service directory that server.py sets before importing this module.
+MODEL_DIR = globals().get('MODEL_DIR') or os.getcwd()
+# Absolute so that a background load does not depend on the working directory.
+MODEL_PATH = os.path.join(MODEL_DIR, 'crop_yield_pipeline_latest.joblib')
+RESID_STATS = os.path.join(MODEL_DIR, 'residual_stats.json')
+META = os.path.join(MODEL_DIR, 'model_metadata.json')
+INTERVALS_PATH = os.path.join(MODEL_DIR, 'crop_yield_intervals_latest.joblib')
+# Uncompressed artifacts (main.py with YIELD_ARTIFACT_FORMAT=mmap) are memory-mapped
+# so gunicorn workers share one page-cache copy; set MODEL_MMAP_MODE= to disable.
+MODEL_MMAP_MODE = os.environ.get('MODEL_MMAP_MODE', 'r') or None
+# Request rows are preprocessed by a CompiledPreprocessor (no DataFrame, same output
+# bits as the fitted preprocessor) when it compiles and passes its startup check;
+# YIELD_COMPILED_PREPROCESS=0 keeps the pandas + ColumnTransformer path.
+COMPILED_PREPROCESS = os.environ.get('YIELD_COMPILED_PREPROCESS', '1') != '0'
+# Upper bound on the rows one /predict-scenarios call may evaluate.
+MAX_SCENARIO_POINTS = int(os.environ.get('MAX_SCENARIO_POINTS', 20000))
 
 app = FastAPI(title="Crop Yield Prediction API")
 
+# Preprocessing and forest evaluation run on a bounded thread pool (NumPy and the
+# compiled tree code release the GIL); beyond workers + queue requests get a 429.
+# Override with INFERENCE_POOL_{WORKERS,QUEUE}. It has to be threads: the model is
+# loaded by the startup hook in this process only, so process workers would have none.
+INFERENCE_POOL = WorkerPool.from_env("inference", kind="thread")
+if INFERENCE_POOL.kind != "thread":
+    raise ValueError(f"INFERENCE_POOL_KIND={INFERENCE_POOL.kind} is not supported here, the yield model is only loaded in-process.")
+
+# /predict results keyed on the request fields (numbers optionally rounded,
+# YIELD_MEMO_DECIMALS e.g. "2" or "Area=0,Annual_Rainfall=1") and the model version;
+# cleared whenever load_model() runs. YIELD_MEMO_SIZE bounds the LRU; 0 disables it.
+PREDICTION_MEMO = Memoizer.from_env("yield")
+
+# Prometheus-style /metrics: request counts and latency per route, and per-stage
+# histograms (parse, inference_wait / inference_run, preprocess, intervals,
+# serialize; dataframe when the compiled preprocessing is off).
+METRICS = Metrics("yield")
+METRICS.instrument(app)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,15 +69,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
+def load_artifact(path):
+    import joblib
+    with warnings.catch_warnings():
+        # Compressed files cannot be memory-mapped; joblib then loads them normally.
+        warnings.filterwarnings('ignore', message='mmap_mode .* is not compatible with compressed file')
+        return joblib.load(path, mmap_mode=MODEL_MMAP_MODE)
+
+metadata = {}
+preprocess_mode = None
+
 def load_model():
-    global pipeline, resid_stats, metadata, estimator, preproc, estimator_step_name
-    pipeline = joblib.load(MODEL_PATH)
+    global pipeline, resid_stats, metadata, estimator, preproc, estimator_step_name, intervals, compiled_preproc, preprocess_mode
+    from compiled_preprocess import CompiledPreprocessor
+    from intervals import ForestIntervals
+    pipeline = load_artifact(MODEL_PATH)
     resid_stats = {}
     metadata = {}
     estimator = None
     preproc = None
     estimator_step_name = None
+    intervals = None
+    compiled_preproc = None
+    preprocess_mode = 'sklearn'
     if Path(RESID_STATS).exists():
         with open(RESID_STATS, 'r') as f:
             resid_stats = json.load(f)
@@ -48,7 +107,43 @@ def load_model():
         if estimator_step_name is None:
             estimator_step_name = list(pipeline.named_steps.keys())[-1]
     estimator = pipeline.named_steps.get(estimator_step_name, None)
+    if PREDICTION_MEMO is not None:
+        model_stat = os.stat(MODEL_PATH)
+        PREDICTION_MEMO.invalidate((metadata.get('model_file'), model_stat.st_size, model_stat.st_mtime_ns))
     preproc = pipeline.named_steps.get('preprocessor', None)
+    if preproc is not None and COMPILED_PREPROCESS:
+        try:
+            compiled = CompiledPreprocessor.from_fitted(preproc)
+            compiled.check(preproc, compiled.sample_records())
+            compiled_preproc = compiled
+            preprocess_mode = 'compiled'
+        except ValueError as e:
+            preprocess_mode = f'sklearn ({e})'
+    if preproc is not None and estimator is not None and hasattr(estimator, 'estimators_'):
+        if MODEL_MMAP_MODE and Path(INTERVALS_PATH).exists():
+            try:
+                intervals = ForestIntervals.load(INTERVALS_PATH, estimator, mmap_mode=MODEL_MMAP_MODE)
+            except ValueError:
+                intervals = None
+        if intervals is None:
+            intervals = ForestIntervals(estimator)
+
+# load_model() runs in a worker thread at startup; with LAZY_STARTUP=1 startup does
+# not wait for it and /health reports "loading" until it is done.
+MODEL_STATE = ModelState("crop-yield")
+METRICS.track_model(MODEL_STATE)
+
+async def _load_model_async():
+    await asyncio.to_thread(load_model)
+
+async def warmup_model():
+    row = {'Crop': 'Rice', 'Crop_Year': 2000, 'Season': 'Kharif', 'State': 'Assam', 'Area': 1.0,
+           'Annual_Rainfall': 1000.0, 'Fertilizer': 1.0, 'Pesticide': 1.0}
+    await INFERENCE_POOL.run(predict_records, [row])
+
+@app.on_event("startup")
+async def start_model():
+    await MODEL_STATE.start(_load_model_async, warmup_model if WARMUP else None)
 
 class PredictRequest(BaseModel):
     Crop: str
@@ -66,31 +161,182 @@ class PredictResponse(BaseModel):
     upper_95: float
     model: Optional[str] = None
 
-@app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
-    row = pd.DataFrame([req.dict()])
-    pred = float(pipeline.predict(row)[0])
+SCENARIO_FIELDS = ('Crop_Year', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide')
 
+class ScenarioAxis(BaseModel):
+    # Exactly one of `values` or an evenly spaced range `start`..`stop` with `num` points
+    field: str
+    values: Optional[List[float]] = Field(default=None, max_length=MAX_SCENARIO_POINTS)
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    num: int = Field(default=11, ge=1, le=MAX_SCENARIO_POINTS)
+
+class ScenarioRequest(BaseModel):
+    base: PredictRequest
+    axes: List[ScenarioAxis]
+    # "grid": every combination of the axes (a yield surface shaped like the axes).
+    # "sweep": each axis on its own with the other fields at `base` (one curve per axis).
+    mode: str = "grid"
+
+def predict_with_intervals(rows: 'pd.DataFrame'):
+    """Return (prediction, lower_95, upper_95) arrays for a frame of raw feature rows."""
+    if intervals is not None:
+        try:
+            # Preprocess once and walk every tree once; the forest mean is the prediction.
+            with METRICS.stage("preprocess"):
+                X_trans = preproc.transform(rows)
+            with METRICS.stage("intervals"):
+                return intervals.predict(X_trans)
+        except Exception:
+            pass
+
+    with METRICS.stage("pipeline_predict"):
+        pred = np.asarray(pipeline.predict(rows), dtype=float)
     if resid_stats and 'resid_std' in resid_stats:
         resid_std = resid_stats['resid_std']
-        lower = pred - 1.96 * resid_std
-        upper = pred + 1.96 * resid_std
+        return pred, pred - 1.96 * resid_std, pred + 1.96 * resid_std
+    return pred, pred, pred
+
+def predict_records(records):
+    """predict_with_intervals for a list of request dicts, skipping pandas when the
+    preprocessor compiled."""
+    if compiled_preproc is not None and intervals is not None:
+        try:
+            with METRICS.stage("preprocess"):
+                X_trans = compiled_preproc.transform(records)
+            with METRICS.stage("intervals"):
+                return intervals.predict(X_trans)
+        except Exception:
+            pass
+
+    import pandas as pd
+    with METRICS.stage("dataframe"):
+        rows = pd.DataFrame(records)
+    return predict_with_intervals(rows)
+
+def axis_size(axis: ScenarioAxis) -> int:
+    """Validate an axis and return its number of points, without building it."""
+    if axis.field not in SCENARIO_FIELDS:
+        raise HTTPException(status_code=422, detail=f"Cannot vary '{axis.field}', expected one of {list(SCENARIO_FIELDS)}.")
+    if (axis.values is None) == (axis.start is None or axis.stop is None):
+        raise HTTPException(status_code=422, detail=f"Axis '{axis.field}': provide exactly one of 'values' or 'start'/'stop'.")
+    size = len(axis.values) if axis.values is not None else axis.num
+    if size == 0:
+        raise HTTPException(status_code=422, detail=f"Axis '{axis.field}' has no values.")
+    return size
+
+def axis_values(axis: ScenarioAxis) -> np.ndarray:
+    if axis.values is not None:
+        return np.asarray(axis.values, dtype=np.float64)
+    return np.linspace(axis.start, axis.stop, axis.num)
+
+def scenario_columns(req: ScenarioRequest):
+    """Return (per-axis values, {field: column}) for the rows of the scenario matrix."""
+    if req.mode not in ('grid', 'sweep'):
+        raise HTTPException(status_code=422, detail="mode must be 'grid' or 'sweep'.")
+    fields = [axis.field for axis in req.axes]
+    if not fields or len(set(fields)) != len(fields):
+        raise HTTPException(status_code=422, detail="Provide one or more axes, each field at most once.")
+    # Counted before any array is built; Python ints, so huge grids cannot overflow.
+    sizes = [axis_size(axis) for axis in req.axes]
+    n_points = math.prod(sizes) if req.mode == 'grid' else sum(sizes)
+    if n_points > MAX_SCENARIO_POINTS:
+        raise HTTPException(status_code=413, detail=f"{n_points} scenarios exceed the limit of {MAX_SCENARIO_POINTS}.")
+    values = [axis_values(axis) for axis in req.axes]
+
+    if req.mode == 'grid':
+        mesh = np.meshgrid(*values, indexing='ij')
+        return values, {field: m.ravel() for field, m in zip(fields, mesh)}
+    # Sweep: axis k varies over its block of rows, every other field keeps its base value.
+    base = req.base.dict()
+    columns = {}
+    for field in fields:
+        default = np.nan if base[field] is None else float(base[field])
+        columns[field] = np.concatenate([v if f == field else np.full(v.size, default) for f, v in zip(fields, values)])
+    return values, columns
+
+def predict_scenarios_core(base, columns):
+    """predict_with_intervals for `base` with the given numeric columns varied: one
+    matrix, one preprocessing pass, one walk of the forest."""
+    if compiled_preproc is not None and intervals is not None:
+        try:
+            with METRICS.stage("preprocess"):
+                X_trans = compiled_preproc.transform_grid(base, columns)
+            with METRICS.stage("intervals"):
+                return intervals.predict(X_trans)
+        except Exception:
+            pass
+
+    import pandas as pd
+    with METRICS.stage("dataframe"):
+        n_rows = len(next(iter(columns.values())))
+        rows = pd.DataFrame([base] * n_rows)
+        for field, column in columns.items():
+            rows[field] = column
+    return predict_with_intervals(rows)
+
+@app.post("/predict", response_model=PredictResponse)
+@METRICS.handler
+async def predict(req: PredictRequest):
+    MODEL_STATE.require()
+    values = req.dict()
+    if PREDICTION_MEMO is not None:
+        values = PREDICTION_MEMO.canonical(values)
+        cached = PREDICTION_MEMO.get(values)
+        if cached is not None:
+            return cached
+
+    pred, lower, upper = await INFERENCE_POOL.run(predict_records, [values])
+
+    response = PredictResponse(prediction=float(pred[0]), lower_95=float(lower[0]), upper_95=float(upper[0]), model=metadata.get('model_file'))
+    if PREDICTION_MEMO is not None:
+        PREDICTION_MEMO.put(values, response)
+    return response
+
+@app.post("/predict-scenarios")
+@METRICS.handler
+async def predict_scenarios(req: ScenarioRequest):
+    MODEL_STATE.require()
+    values, columns = scenario_columns(req)
+    pred, lower, upper = await INFERENCE_POOL.run(predict_scenarios_core, req.base.dict(), columns)
+
+    result = {"mode": req.mode, "n_points": int(pred.size), "model": metadata.get('model_file')}
+    if req.mode == 'grid':
+        shape = [v.size for v in values]
+        result["axes"] = [{"field": a.field, "values": v.tolist()} for a, v in zip(req.axes, values)]
+        result["shape"] = shape
+        for name, out in (("prediction", pred), ("lower_95", lower), ("upper_95", upper)):
+            result[name] = np.asarray(out, dtype=float).reshape(shape).tolist()
     else:
-        lower, upper = pred, pred
-    try:
-        if estimator is not None and hasattr(estimator, 'estimators_'):
-            if preproc is not None:
-                X_trans = preproc.transform(row)
-                tree_preds = np.array([t.predict(X_trans) for t in estimator.estimators_])
-                mean_pred = float(np.mean(tree_preds))
-                lower = float(np.percentile(tree_preds, 2.5))
-                upper = float(np.percentile(tree_preds, 97.5))
-                pred = mean_pred
-    except Exception:
-        pass
-
-    return PredictResponse(prediction=float(pred), lower_95=float(lower), upper_95=float(upper), model=metadata.get('model_file'))
+        bounds = np.cumsum([0] + [v.size for v in values])
+        result["curves"] = [
+            {"field": a.field, "values": v.tolist(), "prediction": pred[s:e].tolist(),
+             "lower_95": lower[s:e].tolist(), "upper_95": upper[s:e].tolist()}
+            for a, v, s, e in zip(req.axes, values, bounds[:-1], bounds[1:])
+        ]
+    return result
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "model": metadata.get('model_file')}
+    return {
+        "status": "ok",
+        "state": MODEL_STATE.state,
+        "readiness": MODEL_STATE.status(),
+        "model": metadata.get('model_file'),
+        "preprocessing": preprocess_mode,
+        "pools": {INFERENCE_POOL.name: INFERENCE_POOL.stats()},
+    }
+
+@app.get("/ready")
+def ready():
+    MODEL_STATE.require()
+    return {"state": MODEL_STATE.state}
+
+@app.get("/cache-stats")
+def cache_stats():
+    return {"prediction_memo": PREDICTION_MEMO.stats() if PREDICTION_MEMO is not None else None}
+
+@app.on_event("shutdown")
+def shutdown_pools():
+    if not INFERENCE_POOL.shared:
+        INFERENCE_POOL.shutdown()
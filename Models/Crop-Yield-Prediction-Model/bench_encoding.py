@@ -0,0 +1,124 @@
+# bench_encoding.py
+# Compares the categorical encodings supported by main.py (YIELD_ENCODING):
+# dense one-hot (original), CSR one-hot and ordinal codes. For each one it fits
+# the same RandomForest pipeline and reports artifact size on disk, load time,
+# feature-matrix width/bytes, latency per request row (preprocess + ForestIntervals,
+# as app.py serves it) and per 1000 rows, plus CV and hold-out RMSE/R2.
+#
+#   python bench_encoding.py --cv-folds 5 --rows 200
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import KFold, cross_validate, train_test_split
+from sklearn.pipeline import Pipeline
+
+from encoders import ENCODINGS, make_preprocessor
+from intervals import ForestIntervals
+
+CSV_PATH = 'crop_yield.csv'
+TARGET = 'Yield'
+RANDOM_STATE = 42
+FEATURES = ['Crop', 'Crop_Year', 'Season', 'State', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1000.0
+
+
+def matrix_bytes(X):
+    if sp.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--encodings', nargs='+', choices=ENCODINGS, default=list(ENCODINGS))
+    parser.add_argument('--n-estimators', type=int, default=200)
+    parser.add_argument('--cv-folds', type=int, default=5, help='0 skips cross-validation')
+    parser.add_argument('--rows', type=int, default=200, help='single request rows to time')
+    parser.add_argument('--loads', type=int, default=3, help='joblib.load repetitions')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    if TARGET not in df.columns:
+        df[TARGET] = df['Production'] / df['Area']
+    df = df.dropna(subset=[TARGET]).reset_index(drop=True)
+    X = df[[c for c in FEATURES if c in df.columns]]
+    y = df[TARGET].values
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE)
+    numeric = X.select_dtypes(include=[np.number]).columns.tolist()
+    categorical = X.select_dtypes(include=['object', 'category']).columns.tolist()
+    requests = X_test.sample(n=args.rows, random_state=0, replace=True)
+    batch = X_test.sample(n=1000, random_state=1, replace=True)
+
+    results = []
+    tmp = Path(tempfile.mkdtemp(prefix='bench_encoding_'))
+    for encoding in args.encodings:
+        print(f"[{encoding}] fitting...")
+        pipeline = Pipeline(steps=[
+            ('preprocessor', make_preprocessor(numeric, categorical, encoding)),
+            ('model', RandomForestRegressor(n_estimators=args.n_estimators, random_state=RANDOM_STATE, n_jobs=-1)),
+        ])
+        cv_rmse = cv_r2 = float('nan')
+        if args.cv_folds > 1:
+            cv = KFold(n_splits=args.cv_folds, shuffle=True, random_state=RANDOM_STATE)
+            cv_res = cross_validate(pipeline, X_train, y_train, cv=cv,
+                                    scoring={'rmse': 'neg_root_mean_squared_error', 'r2': 'r2'})
+            cv_rmse, cv_r2 = -cv_res['test_rmse'].mean(), cv_res['test_r2'].mean()
+        pipeline.fit(X_train, y_train)
+        preds = pipeline.predict(X_test)
+
+        path = tmp / f'pipeline_{encoding}.joblib'
+        joblib.dump(pipeline, path, compress=3)
+        load_ms = median_ms(lambda: joblib.load(path), args.loads)
+
+        preproc = pipeline.named_steps['preprocessor']
+        forest = pipeline.named_steps['model']
+        forest.set_params(n_jobs=1)
+        engine = ForestIntervals(forest)
+        X_batch = preproc.transform(batch)
+        row_frames = [requests.iloc[[i]] for i in range(len(requests))]
+        row_iter = iter(row_frames * 2)
+        per_row_ms = median_ms(lambda: engine.predict(preproc.transform(next(row_iter))), len(row_frames))
+        per_1000_ms = median_ms(lambda: engine.predict(preproc.transform(batch)), 5)
+
+        results.append({
+            'encoding': encoding,
+            'width': X_batch.shape[1],
+            'kb_per_1000': matrix_bytes(X_batch) / 1024,
+            'size_mb': path.stat().st_size / 2**20,
+            'load_ms': load_ms,
+            'row_ms': per_row_ms,
+            'k_ms': per_1000_ms,
+            'nodes': sum(t.tree_.node_count for t in forest.estimators_),
+            'cv_rmse': cv_rmse,
+            'cv_r2': cv_r2,
+            'rmse': mean_squared_error(y_test, preds, squared=False),
+            'r2': r2_score(y_test, preds),
+        })
+
+    print(f"\n{'encoding':<9} {'width':>5} {'KB/1000':>8} {'disk MB':>8} {'load ms':>8} {'row ms':>7} "
+          f"{'1000 ms':>8} {'nodes':>9} {'CV RMSE':>8} {'CV R2':>6} {'RMSE':>8} {'R2':>6}")
+    for r in results:
+        print(f"{r['encoding']:<9} {r['width']:>5} {r['kb_per_1000']:>8.1f} {r['size_mb']:>8.1f} {r['load_ms']:>8.0f} "
+              f"{r['row_ms']:>7.2f} {r['k_ms']:>8.1f} {r['nodes']:>9} {r['cv_rmse']:>8.2f} {r['cv_r2']:>6.3f} "
+              f"{r['rmse']:>8.2f} {r['r2']:>6.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# bench_intervals.py
+# Compares the original per-tree interval loop with ForestIntervals and checks
+# that both give the same prediction / 95% interval on rows from crop_yield.csv.
+#
+#   python bench_intervals.py --rows 200 --batch 1000
+import argparse
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from intervals import ForestIntervals
+
+MODEL_PATH = 'crop_yield_pipeline_latest.joblib'
+CSV_PATH = 'crop_yield.csv'
+FEATURES = ['Crop', 'Crop_Year', 'Season', 'State', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+
+
+def original_path(pipeline, preproc, estimator, row):
+    pipeline.predict(row)
+    X_trans = preproc.transform(row)
+    tree_preds = np.array([t.predict(X_trans) for t in estimator.estimators_])
+    return np.mean(tree_preds, axis=0), np.percentile(tree_preds, 2.5, axis=0), np.percentile(tree_preds, 97.5, axis=0)
+
+
+def vectorized_path(preproc, engine, row):
+    return engine.predict(preproc.transform(row))
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--rows', type=int, default=200, help='single rows to time and check for parity')
+    parser.add_argument('--batch', type=int, default=1000, help='rows in the batch timing')
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model)
+    preproc = pipeline.named_steps['preprocessor']
+    estimator = pipeline.steps[-1][1]
+    estimator.set_params(n_jobs=1)
+    engine = ForestIntervals(estimator)
+
+    df = pd.read_csv(args.csv)
+    X = df[[c for c in FEATURES if c in df.columns]].sample(n=max(args.rows, args.batch), random_state=0, replace=True)
+
+    max_diff = 0.0
+    t_orig, t_vec = [], []
+    for i in range(args.rows):
+        row = X.iloc[[i]]
+        t0 = time.perf_counter()
+        expected = original_path(pipeline, preproc, estimator, row)
+        t1 = time.perf_counter()
+        got = vectorized_path(preproc, engine, row)
+        t2 = time.perf_counter()
+        t_orig.append(t1 - t0)
+        t_vec.append(t2 - t1)
+        max_diff = max(max_diff, max(float(np.max(np.abs(e - g))) for e, g in zip(expected, got)))
+
+    batch = X.iloc[:args.batch]
+    b_orig = timed(lambda: original_path(pipeline, preproc, estimator, batch), 3)
+    b_vec = timed(lambda: vectorized_path(preproc, engine, batch), 3)
+
+    X_one = preproc.transform(X.iloc[[0]])
+    s_orig = timed(lambda: [t.predict(X_one) for t in estimator.estimators_], 20)
+    s_vec = timed(lambda: engine.tree_predictions(X_one), 20)
+
+    print(f"trees={engine.n_trees} nodes={engine.value.size}")
+    print(f"tree stage  original: {s_orig:8.2f} ms   vectorized: {s_vec:8.2f} ms   speedup x{s_orig / s_vec:.1f}")
+    print(f"single row  original: {np.median(t_orig) * 1000:8.2f} ms   vectorized: {np.median(t_vec) * 1000:8.2f} ms   "
+          f"speedup x{np.median(t_orig) / np.median(t_vec):.1f}")
+    print(f"{args.batch} rows  original: {b_orig:8.2f} ms   vectorized: {b_vec:8.2f} ms   speedup x{b_orig / b_vec:.1f}")
+    print(f"max |difference| over {args.rows} rows (mean, lower, upper): {max_diff:.3e}")
+
+
+if __name__ == '__main__':
+    main()
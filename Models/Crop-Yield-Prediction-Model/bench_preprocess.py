@@ -0,0 +1,135 @@
+# bench_preprocess.py
+# Parity check and latency benchmark for CompiledPreprocessor, the pandas-free
+# request preprocessing app.py uses when the fitted preprocessor compiles.
+#
+# Parity is bit-for-bit against preprocessor.transform on:
+#   - every row of crop_yield.csv, in batches,
+#   - the same rows with optional fields omitted and categories replaced by unseen
+#     values at random (--drop-rate), in batches,
+#   - --rows of those rows one at a time, built the way /predict builds them
+#     (pd.DataFrame([values]), where omitted fields are None).
+# Exits with status 1 on any mismatch.
+#
+#   python bench_preprocess.py --rows 2000 --batch 1000
+import argparse
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from compiled_preprocess import CompiledPreprocessor
+from intervals import ForestIntervals
+
+MODEL_PATH = 'crop_yield_pipeline_latest.joblib'
+CSV_PATH = 'crop_yield.csv'
+FEATURES = ['Crop', 'Crop_Year', 'Season', 'State', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+OPTIONAL = ['Crop_Year', 'Season', 'State', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+CATEGORICAL = ['Crop', 'Season', 'State']
+
+
+def dense(X):
+    return X.toarray() if sp.issparse(X) else X
+
+
+def identical(a, b):
+    return a.dtype == b.dtype and a.shape == b.shape and a.tobytes() == b.tobytes()
+
+
+def perturb(records, rate, rng):
+    out = []
+    for record in records:
+        record = dict(record)
+        for c in OPTIONAL:
+            if rng.random() < rate:
+                record[c] = None
+        for c in CATEGORICAL:
+            if record[c] is not None and rng.random() < rate:
+                record[c] = record[c].strip() + ' (unseen)'
+        out.append(record)
+    return out
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--rows', type=int, default=2000, help='rows checked and timed one request at a time')
+    parser.add_argument('--batch', type=int, default=1000, help='rows in the batch timing')
+    parser.add_argument('--drop-rate', type=float, default=0.2,
+                        help='chance of omitting each optional field / using an unseen category')
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model)
+    preproc = pipeline.named_steps['preprocessor']
+    estimator = pipeline.steps[-1][1]
+    engine = ForestIntervals(estimator) if hasattr(estimator, 'estimators_') else None
+    t0 = time.perf_counter()
+    plan = CompiledPreprocessor.from_fitted(preproc)
+    compile_ms = (time.perf_counter() - t0) * 1000.0
+
+    df = pd.read_csv(args.csv)
+    records = df[FEATURES].to_dict('records')
+    rng = np.random.default_rng(0)
+    perturbed = perturb(records, args.drop_rate, rng)
+
+    failures = 0
+    for name, rows in (('csv rows', records), ('perturbed rows', perturbed)):
+        bad = 0
+        for start in range(0, len(rows), 5000):
+            chunk = rows[start:start + 5000]
+            if not identical(dense(preproc.transform(pd.DataFrame(chunk))), plan.transform(chunk)):
+                bad += len(chunk)
+        print(f"{name:<16} {len(rows):>7} rows in batches   {'identical' if not bad else f'MISMATCH ({bad} rows)'}")
+        failures += bad
+
+    sample = [perturbed[i] for i in rng.choice(len(perturbed), size=min(args.rows, len(perturbed)), replace=False)]
+    t_frame, t_plan, bad = [], [], 0
+    for values in sample:
+        t1 = time.perf_counter()
+        expected = dense(preproc.transform(pd.DataFrame([values])))
+        t2 = time.perf_counter()
+        got = plan.transform([values])
+        t3 = time.perf_counter()
+        t_frame.append(t2 - t1)
+        t_plan.append(t3 - t2)
+        bad += not identical(expected, got)
+    print(f"{'single requests':<16} {len(sample):>7} rows one by one  {'identical' if not bad else f'MISMATCH ({bad} rows)'}")
+    failures += bad
+
+    out = np.zeros((1, plan.n_features_out))
+    one = sample[0]
+    s_out = timed(lambda: plan.transform([one], out=out), 200)
+    batch = perturbed[:args.batch]
+    b_frame = timed(lambda: preproc.transform(pd.DataFrame(batch)), 5)
+    b_plan = timed(lambda: plan.transform(batch), 5)
+
+    print(f"\ncompiled in {compile_ms:.1f} ms, {len(plan.features)} inputs -> {plan.n_features_out} features")
+    print(f"single row  DataFrame + transform: {np.median(t_frame) * 1000:8.3f} ms   compiled: "
+          f"{np.median(t_plan) * 1000:8.3f} ms ({s_out:.3f} ms into a preallocated row)   "
+          f"speedup x{np.median(t_frame) / np.median(t_plan):.0f}")
+    print(f"{len(batch)} rows   DataFrame + transform: {b_frame:8.2f} ms   compiled: {b_plan:8.2f} ms   "
+          f"speedup x{b_frame / b_plan:.1f}")
+    if engine is not None:
+        e_frame = timed(lambda: engine.predict(preproc.transform(pd.DataFrame([one]))), 50)
+        e_plan = timed(lambda: engine.predict(plan.transform([one])), 50)
+        print(f"with ForestIntervals, one request: {e_frame:8.3f} ms -> {e_plan:8.3f} ms")
+
+    if failures:
+        print(f"\nFAILED: {failures} rows differ from the fitted preprocessor")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
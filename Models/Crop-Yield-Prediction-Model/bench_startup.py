@@ -0,0 +1,110 @@
+# bench_startup.py
+# Startup cost of the yield API workers for a compressed vs. a memory-mapped
+# artifact. Writes both formats of --model to --out-dir, then for each one starts
+# --workers processes that load the pipeline and interval engine the way
+# app.py's load_model() does and, while all of them are alive, reports load time,
+# RSS and PSS (shared pages split between the processes that map them).
+# "cold" evicts the artifact files from the page cache first (posix_fadvise).
+#
+#   python bench_startup.py --model crop_yield_pipeline_latest.joblib --workers 4
+import argparse
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from intervals import ForestIntervals
+
+
+def evict(paths):
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def memory_kb():
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields
+
+
+def worker(model_path, intervals_path, mmap_mode, barrier, results):
+    t0 = time.perf_counter()
+    pipeline = joblib.load(model_path, mmap_mode=mmap_mode)
+    estimator = pipeline.steps[-1][1]
+    if intervals_path:
+        engine = ForestIntervals.load(intervals_path, estimator, mmap_mode=mmap_mode)
+    else:
+        engine = ForestIntervals(estimator)
+    # Touch every node array once, as steady-state traffic eventually does.
+    checksum = sum(float(np.asarray(getattr(engine, name)[::4096], dtype=float).sum()) for name in engine._arrays)
+    load_s = time.perf_counter() - t0
+    barrier.wait()
+    mem = memory_kb()
+    results.put({'load_s': load_s, 'rss_mb': mem['Rss'] / 1024, 'pss_mb': mem['Pss'] / 1024, 'checksum': checksum})
+    barrier.wait()
+
+
+def run_round(ctx, n_workers, model_path, intervals_path, mmap_mode):
+    barrier, results = ctx.Barrier(n_workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(model_path, intervals_path, mmap_mode, barrier, results))
+             for _ in range(n_workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='crop_yield_pipeline_latest.joblib')
+    parser.add_argument('--out-dir', default='outputs_startup_bench')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pipeline = joblib.load(args.model)
+    compressed = out_dir / 'pipeline_compressed.joblib'
+    mmapped = out_dir / 'pipeline_mmap.joblib'
+    mmapped_intervals = out_dir / 'intervals_mmap.joblib'
+    joblib.dump(pipeline, compressed, compress=3)
+    joblib.dump(pipeline, mmapped, compress=0)
+    ForestIntervals(pipeline.steps[-1][1]).save(mmapped_intervals)
+    del pipeline
+
+    formats = (
+        ('compressed', [compressed], None, None),
+        ('mmap', [mmapped, mmapped_intervals], mmapped_intervals, 'r'),
+    )
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{'artifact':<11} {'disk MB':>8} {'cache':>5} {'load s':>7} {'RSS MB/worker':>14} {'PSS MB/worker':>14} "
+          f"{'PSS MB total':>13}")
+    for name, files, intervals_path, mmap_mode in formats:
+        disk_mb = sum(f.stat().st_size for f in files) / 2**20
+        for cache in ('cold', 'warm'):
+            if cache == 'cold':
+                evict(files)
+            rows = run_round(ctx, args.workers, str(files[0]), intervals_path and str(intervals_path), mmap_mode)
+            load_s = np.mean([r['load_s'] for r in rows])
+            rss = np.mean([r['rss_mb'] for r in rows])
+            pss = [r['pss_mb'] for r in rows]
+            print(f"{name:<11} {disk_mb:>8.1f} {cache:>5} {load_s:>7.2f} {rss:>14.1f} {np.mean(pss):>14.1f} "
+                  f"{np.sum(pss):>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
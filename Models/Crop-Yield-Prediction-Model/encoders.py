@@ -0,0 +1,142 @@
+# encoders.py
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+
+MISSING = 'missing'
+ENCODINGS = ('onehot', 'sparse', 'ordinal')
+
+
+def make_preprocessor(numeric_features, categorical_features, encoding='onehot'):
+    """ColumnTransformer used by main.py for the given categorical encoding.
+
+    'onehot'  - dense one-hot block (the original setup)
+    'sparse'  - the same one-hot columns kept as CSR end-to-end
+    'ordinal' - one integer code per categorical column (-1 for unknown), so
+                the forest sees 8 features instead of ~100
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}")
+    numeric_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler())
+    ])
+    if encoding == 'ordinal':
+        encoder = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1, dtype=np.float32)
+    else:
+        encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=encoding == 'sparse')
+    categorical_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='constant', fill_value=MISSING)),
+        ('ordinal' if encoding == 'ordinal' else 'onehot', encoder)
+    ])
+    return ColumnTransformer(transformers=[
+        ('num', numeric_transformer, numeric_features),
+        ('cat', categorical_transformer, categorical_features)
+    ], remainder='drop', sparse_threshold=1.0 if encoding == 'sparse' else 0.0)
+
+
+class StreamingPreprocessor(BaseEstimator, TransformerMixin):
+    """Yield-feature preprocessor that can be fitted one chunk at a time.
+
+    Mirrors the ColumnTransformer in main.py (median imputation + standard scaling
+    for numeric columns, 'missing'-filled categories for categorical ones) but keeps
+    only running statistics: category vocabularies, sums for mean/std and a bounded
+    random sample per numeric column for the median. Call ``partial_fit`` on each
+    chunk, then ``finalize``; ``fit`` does both for an in-memory frame.
+
+    ``output='sparse'`` gives scaled numerics followed by a one-hot block as CSR
+    (unknown categories are all-zero, like ``handle_unknown='ignore'``).
+    ``output='ordinal'`` gives a compact float32 matrix with one integer code per
+    categorical column (NaN for unknown), for learners with native categorical
+    support such as HistGradientBoostingRegressor.
+    """
+
+    def __init__(self, numeric_features, categorical_features, output='sparse', median_sample_size=100_000,
+                 random_state=0):
+        self.numeric_features = numeric_features
+        self.categorical_features = categorical_features
+        self.output = output
+        self.median_sample_size = median_sample_size
+        self.random_state = random_state
+
+    def _init_stats(self):
+        self._rng = np.random.default_rng(self.random_state)
+        self._vocab = {c: set() for c in self.categorical_features}
+        self._count = np.zeros(len(self.numeric_features))
+        self._sum = np.zeros(len(self.numeric_features))
+        self._sumsq = np.zeros(len(self.numeric_features))
+        self._sample = [np.empty(0) for _ in self.numeric_features]
+        self._sample_keys = [np.empty(0) for _ in self.numeric_features]
+
+    def partial_fit(self, X: pd.DataFrame, y=None):
+        if not hasattr(self, '_vocab'):
+            self._init_stats()
+        for c in self.categorical_features:
+            self._vocab[c].update(X[c].astype(object).fillna(MISSING).unique().tolist())
+        for j, c in enumerate(self.numeric_features):
+            values = X[c].to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            self._count[j] += values.size
+            self._sum[j] += values.sum()
+            self._sumsq[j] += np.square(values).sum()
+            # Bottom-k sampling: keeping the k smallest random keys seen so far is a
+            # uniform sample of every value streamed through, in O(k) memory.
+            keys = np.concatenate([self._sample_keys[j], self._rng.random(values.size)])
+            sample = np.concatenate([self._sample[j], values])
+            if keys.size > self.median_sample_size:
+                keep = np.argpartition(keys, self.median_sample_size)[:self.median_sample_size]
+                keys, sample = keys[keep], sample[keep]
+            self._sample_keys[j], self._sample[j] = keys, sample
+        return self
+
+    def finalize(self):
+        count = np.maximum(self._count, 1)
+        self.medians_ = np.array([np.median(s) if s.size else 0.0 for s in self._sample])
+        self.mean_ = self._sum / count
+        var = np.maximum(self._sumsq / count - np.square(self.mean_), 0.0)
+        self.scale_ = np.where(var > 0, np.sqrt(var), 1.0)
+        self.categories_ = [sorted(self._vocab[c], key=str) for c in self.categorical_features]
+        self.category_index_ = [{v: i for i, v in enumerate(cats)} for cats in self.categories_]
+        for name in ('_rng', '_vocab', '_count', '_sum', '_sumsq', '_sample', '_sample_keys'):
+            delattr(self, name)
+        return self
+
+    def fit(self, X: pd.DataFrame, y=None):
+        self._init_stats()
+        return self.partial_fit(X).finalize()
+
+    def _numeric(self, X: pd.DataFrame) -> np.ndarray:
+        num = X[self.numeric_features].to_numpy(dtype=np.float64)
+        num = np.where(np.isnan(num), self.medians_, num)
+        return (num - self.mean_) / self.scale_
+
+    def _codes(self, X: pd.DataFrame) -> np.ndarray:
+        codes = np.empty((len(X), len(self.categorical_features)))
+        for j, c in enumerate(self.categorical_features):
+            mapped = X[c].astype(object).fillna(MISSING).map(self.category_index_[j])
+            codes[:, j] = mapped.to_numpy(dtype=np.float64, na_value=np.nan)
+        return codes
+
+    def transform(self, X: pd.DataFrame):
+        num = self._numeric(X)
+        codes = self._codes(X)
+        if self.output == 'ordinal':
+            return np.hstack([num, codes]).astype(np.float32)
+
+        n_rows = len(X)
+        offsets = np.cumsum([0] + [len(cats) for cats in self.categories_[:-1]])
+        known = ~np.isnan(codes)
+        rows = np.nonzero(known)[0]
+        cols = (codes + offsets)[known].astype(np.int64)
+        onehot = sp.csr_matrix((np.ones(rows.size), (rows, cols)),
+                               shape=(n_rows, sum(len(cats) for cats in self.categories_)))
+        return sp.hstack([sp.csr_matrix(num), onehot], format='csr')
+
+    def categorical_mask(self) -> np.ndarray:
+        """Boolean mask of the categorical columns in ``output='ordinal'`` matrices."""
+        return np.array([False] * len(self.numeric_features) + [True] * len(self.categorical_features))
@@ -0,0 +1,108 @@
+# intervals.py
+import joblib
+import numpy as np
+import scipy.sparse as sp
+
+
+class ForestIntervals:
+    """Per-tree predictions for a fitted RandomForestRegressor in one vectorized pass.
+
+    Small batches (the per-request case) walk all trees at once: the forest is
+    flattened into a single set of node arrays (global node ids) and every
+    (tree, row) pair descends simultaneously with NumPy. Larger batches call the
+    compiled ``Tree.predict`` of each tree directly on one shared float32 matrix,
+    skipping the per-estimator input validation of ``DecisionTreeRegressor.predict``.
+    """
+
+    # Above this many rows the per-tree compiled loop beats the flattened walk.
+    flat_walk_max_rows = 16
+    _arrays = ('roots', 'feature', 'threshold', 'is_leaf', 'left', 'right', 'value')
+
+    def __init__(self, estimator):
+        trees = [t.tree_ for t in estimator.estimators_]
+        self.trees = trees
+        offsets = np.cumsum([0] + [t.node_count for t in trees[:-1]])
+
+        self.n_trees = len(trees)
+        self.roots = offsets.astype(np.intp)
+        self.feature = np.concatenate([t.feature for t in trees]).astype(np.intp)
+        self.threshold = np.concatenate([t.threshold for t in trees])
+        self.is_leaf = np.concatenate([t.children_left == -1 for t in trees])
+        # Leaves get themselves as children so a finished walk is a fixed point.
+        self.left = np.concatenate([
+            np.where(t.children_left == -1, np.arange(t.node_count), t.children_left) + off
+            for t, off in zip(trees, offsets)
+        ]).astype(np.intp)
+        self.right = np.concatenate([
+            np.where(t.children_right == -1, np.arange(t.node_count), t.children_right) + off
+            for t, off in zip(trees, offsets)
+        ]).astype(np.intp)
+        self.value = np.concatenate([t.value[:, 0, 0] for t in trees])
+        # Leaf features are -2 in sklearn; point them at column 0 so gathers stay in bounds.
+        self.feature[self.is_leaf] = 0
+
+    def save(self, path) -> None:
+        """Store the flattened node arrays uncompressed so ``load`` can memory-map them."""
+        joblib.dump({name: getattr(self, name) for name in self._arrays}, path, compress=0)
+
+    @classmethod
+    def load(cls, path, estimator, mmap_mode='r') -> 'ForestIntervals':
+        """Attach arrays written by ``save`` to the fitted ``estimator`` they came from.
+
+        With ``mmap_mode='r'`` the arrays are read-only views of the file, so every
+        worker process on the host shares the same page-cache copy.
+        """
+        arrays = joblib.load(path, mmap_mode=mmap_mode)
+        trees = [t.tree_ for t in estimator.estimators_]
+        if (len(arrays['roots']) != len(trees) or len(arrays['value']) != sum(t.node_count for t in trees)
+                or not np.array_equal(arrays['threshold'][:trees[0].node_count], trees[0].threshold)):
+            raise ValueError(f"{path} does not match the loaded forest")
+        self = cls.__new__(cls)
+        self.trees = trees
+        self.n_trees = len(trees)
+        for name in cls._arrays:
+            setattr(self, name, arrays[name])
+        return self
+
+    def tree_predictions(self, X_trans) -> np.ndarray:
+        """Return a (n_trees, n_rows) matrix of per-tree predictions for preprocessed rows."""
+        n_rows = X_trans.shape[0]
+        if sp.issparse(X_trans):
+            if n_rows > self.flat_walk_max_rows:
+                # Large sparse batches stay CSR: the compiled trees walk it directly.
+                X = sp.csr_matrix(X_trans, dtype=np.float32)
+                X.sort_indices()
+                return self._per_tree(X)
+            X_trans = X_trans.toarray()
+        # sklearn trees compare float32 features against float64 thresholds.
+        X = np.ascontiguousarray(X_trans, dtype=np.float32)
+
+        if n_rows > self.flat_walk_max_rows:
+            return self._per_tree(X)
+
+        nodes = np.repeat(self.roots, n_rows)
+        rows = np.tile(np.arange(n_rows, dtype=np.intp), self.n_trees)
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            nd = nodes[active]
+            go_left = X[rows[active], self.feature[nd]] <= self.threshold[nd]
+            nxt = np.where(go_left, self.left[nd], self.right[nd])
+            nodes[active] = nxt
+            active = active[~self.is_leaf[nxt]]
+
+        return self.value[nodes].reshape(self.n_trees, n_rows)
+
+    def _per_tree(self, X) -> np.ndarray:
+        out = np.empty((self.n_trees, X.shape[0]))
+        for i, tree in enumerate(self.trees):
+            out[i] = tree.predict(X).ravel()
+        return out
+
+    def predict(self, X_trans, lower_q: float = 2.5, upper_q: float = 97.5):
+        """Return (mean, lower, upper) arrays, one entry per row."""
+        tree_preds = self.tree_predictions(X_trans)
+        # Reduced per row over contiguous memory, so a row's mean does not depend on
+        # the batch it came in (a single /predict and a scenario grid agree exactly).
+        mean = np.ascontiguousarray(tree_preds.T).mean(axis=1)
+        lower, upper = np.percentile(tree_preds, [lower_q, upper_q], axis=0)
+        return mean, lower, upper
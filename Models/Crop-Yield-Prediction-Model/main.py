@@ -3,15 +3,15 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.impute import SimpleImputer
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split, cross_validate, KFold
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from pathlib import Path
 import joblib
 
+from encoders import ENCODINGS, make_preprocessor
+from intervals import ForestIntervals
+
 CSV_PATH = 'crop_yield.csv'
 TARGET = 'Yield'   
 
@@ -20,6 +20,23 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 RANDOM_STATE = 42
 
+# 'onehot' (dense, default), 'sparse' (CSR one-hot) or 'ordinal'; see bench_encoding.py
+ENCODING = os.environ.get('YIELD_ENCODING', 'onehot')
+if ENCODING not in ENCODINGS:
+    raise SystemExit(f"YIELD_ENCODING must be one of {ENCODINGS}, got '{ENCODING}'")
+
+# 'compressed' (compress=3, smallest file) or 'mmap' (uncompressed, so app.py can
+# joblib.load(mmap_mode='r') it; also writes the flattened interval arrays)
+ARTIFACT_FORMAT = os.environ.get('YIELD_ARTIFACT_FORMAT', 'compressed')
+if ARTIFACT_FORMAT not in ('compressed', 'mmap'):
+    raise SystemExit(f"YIELD_ARTIFACT_FORMAT must be 'compressed' or 'mmap', got '{ARTIFACT_FORMAT}'")
+COMPRESS = 3 if ARTIFACT_FORMAT == 'compressed' else 0
+
+# Forest size; pick values with tune_forest.py sweep (defaults: 200 fully grown trees)
+N_ESTIMATORS = int(os.environ.get('YIELD_N_ESTIMATORS', 200))
+MAX_DEPTH = int(os.environ['YIELD_MAX_DEPTH']) if os.environ.get('YIELD_MAX_DEPTH') else None
+MIN_SAMPLES_LEAF = int(os.environ.get('YIELD_MIN_SAMPLES_LEAF', 1))
+
 print("Loading:", CSV_PATH)
 df = pd.read_csv(CSV_PATH)
 print("shape:", df.shape)
@@ -44,21 +61,10 @@ X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_
 numeric_features = X.select_dtypes(include=[np.number]).columns.tolist()
 categorical_features = X.select_dtypes(include=['object', 'category']).columns.tolist()
 
-numeric_transformer = Pipeline(steps=[
-    ('imputer', SimpleImputer(strategy='median')),
-    ('scaler', StandardScaler())
-])
-categorical_transformer = Pipeline(steps=[
-    ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
-    ('onehot', OneHotEncoder(handle_unknown='ignore', sparse=False))
-])
-preprocessor = ColumnTransformer(transformers=[
-    ('num', numeric_transformer, numeric_features),
-    ('cat', categorical_transformer, categorical_features)
-], remainder='drop')
-
+preprocessor = make_preprocessor(numeric_features, categorical_features, ENCODING)
 
-model = RandomForestRegressor(n_estimators=200, random_state=RANDOM_STATE, n_jobs=-1)
+model = RandomForestRegressor(n_estimators=N_ESTIMATORS, max_depth=MAX_DEPTH, min_samples_leaf=MIN_SAMPLES_LEAF,
+                              random_state=RANDOM_STATE, n_jobs=-1)
 
 pipeline = Pipeline(steps=[('preprocessor', preprocessor), ('model', model)])
 
@@ -90,7 +96,7 @@ out_dir.mkdir(parents=True, exist_ok=True)
 ts = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
 pipeline_filename = out_dir / f'crop_yield_pipeline_{ts}.joblib'
 
-joblib.dump(pipeline, pipeline_filename, compress=3)
+joblib.dump(pipeline, pipeline_filename, compress=COMPRESS)
 print("Saved pipeline to:", pipeline_filename)
 
 estimator_name = None
@@ -114,7 +120,12 @@ metadata = {
     'model_type': type(estimator_obj).__name__,
     'estimator_step_name': estimator_name,
     'features': feature_list,
-    'target': 'Yield'
+    'target': 'Yield',
+    'encoding': ENCODING,
+    'artifact_format': ARTIFACT_FORMAT,
+    'n_estimators': N_ESTIMATORS,
+    'max_depth': MAX_DEPTH,
+    'min_samples_leaf': MIN_SAMPLES_LEAF
 }
 with open(out_dir / 'model_metadata.json', 'w') as f:
     json.dump(metadata, f, indent=2)
@@ -130,5 +141,10 @@ with open(out_dir / 'residual_stats.json', 'w') as f:
 print("Saved residual_stats.json (used for prediction intervals)")
 
 latest_path = out_dir / 'crop_yield_pipeline_latest.joblib'
-joblib.dump(pipeline, latest_path, compress=3)
+joblib.dump(pipeline, latest_path, compress=COMPRESS)
 print("Also saved 'latest' pipeline to:", latest_path)
+
+if ARTIFACT_FORMAT == 'mmap' and hasattr(estimator_obj, 'estimators_'):
+    intervals_path = out_dir / 'crop_yield_intervals_latest.joblib'
+    ForestIntervals(estimator_obj).save(intervals_path)
+    print("Saved memory-mappable interval arrays to:", intervals_path)
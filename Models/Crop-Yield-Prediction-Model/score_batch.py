@@ -0,0 +1,149 @@
+# score_batch.py
+# Offline bulk scoring for the crop yield model.
+#
+# Streams a CSV file of PredictRequest-shaped rows in chunks, scores
+# each chunk in a pool of worker processes with the same code path as /predict
+# (app.load_model() + predict_with_intervals: one preprocessing pass and one walk
+# of every tree per chunk), and appends prediction / lower_95 / upper_95 to the
+# output CSV in input order as chunks finish; input columns are written back as
+# they were read (only the model's copy is cast to numbers). At most --max-pending chunks are
+# in flight, so memory stays bounded by roughly
+#   workers x chunksize x n_trees x 8 bytes  (the per-tree prediction matrix)
+# whatever the size of the input. Progress and the final rate are in rows/sec.
+#
+# Run from this directory so the workers find the model artifacts.
+#
+#   python score_batch.py districts_2025.csv --output yield_2025.csv --workers 4
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL = ['Crop', 'Season', 'State']
+NUMERIC = ['Crop_Year', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+FEATURES = ['Crop', 'Crop_Year', 'Season', 'State', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+REQUIRED = ['Crop', 'Area']
+OUTPUT_COLUMNS = ['prediction', 'lower_95', 'upper_95']
+
+_app = None
+
+
+def init_worker():
+    # The serving loader and predict path, so batch scores match /predict; with the
+    # mmap artifact format the workers share the forest's pages.
+    global _app
+    import app
+    app.load_model()
+    _app = app
+
+
+def score_chunk(chunk: pd.DataFrame) -> np.ndarray:
+    pred, lower, upper = _app.predict_with_intervals(chunk)
+    return np.column_stack([pred, lower, upper])
+
+
+def read_chunks(path, chunksize):
+    # Every column as text, so the output repeats the input values as written
+    # (1997 stays 1997); categories are plain strings, exactly as the API receives them.
+    yield from pd.read_csv(path, dtype=str, chunksize=chunksize)
+
+
+def prepare(chunk: pd.DataFrame) -> pd.DataFrame:
+    missing = [c for c in REQUIRED if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Input is missing required column(s) {missing}.")
+    features = chunk.reindex(columns=FEATURES)
+    # The model gets numbers; `features` is a copy, so the chunk written out keeps its text.
+    for c in NUMERIC:
+        features[c] = features[c].astype('float64')
+    # Optional fields that are absent behave like an omitted field in /predict.
+    for c in CATEGORICAL:
+        features[c] = features[c].astype(object).where(features[c].notna(), None)
+    return features
+
+
+class Writer:
+    """Appends scored chunks to a CSV file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._first = True
+
+    def write(self, frame: pd.DataFrame) -> None:
+        frame.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV file with the crop yield model.')
+    parser.add_argument('input')
+    parser.add_argument('--output', help='CSV path (default: <input>_scored.csv)')
+    parser.add_argument('--chunksize', type=int, default=20_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='scoring processes; 0 scores in this process')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='chunks read ahead of the writer (default: 2 x workers)')
+    parser.add_argument('--features-only', action='store_true',
+                        help='write only the model features and the outputs, not every input column')
+    args = parser.parse_args()
+
+    output = args.output or str(Path(args.input).with_name(Path(args.input).stem + '_scored.csv'))
+    if Path(args.input).suffix.lower() == '.parquet' or Path(output).suffix.lower() == '.parquet':
+        parser.error('only CSV input and output are supported')
+    max_pending = args.max_pending or max(2 * args.workers, 1)
+
+    if args.workers > 0:
+        pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=init_worker)
+        submit = lambda features: pool.submit(score_chunk, features)
+    else:
+        pool = None
+        init_worker()
+        submit = lambda features: score_chunk(features)
+
+    writer = Writer(output)
+    pending = deque()
+    rows = 0
+    started = time.perf_counter()
+    last_report = started
+
+    def flush_one():
+        nonlocal rows, last_report
+        chunk, future = pending.popleft()
+        scores = future.result() if pool is not None else future
+        out = chunk.reset_index(drop=True)
+        for i, name in enumerate(OUTPUT_COLUMNS):
+            out[name] = scores[:, i]
+        writer.write(out)
+        rows += len(out)
+        now = time.perf_counter()
+        if now - last_report >= 5:
+            print(f"{rows:>12,} rows  {rows / (now - started):>10,.0f} rows/s")
+            last_report = now
+
+    try:
+        for chunk in read_chunks(args.input, args.chunksize):
+            features = prepare(chunk)
+            pending.append((features if args.features_only else chunk, submit(features)))
+            while len(pending) >= max_pending:
+                flush_one()
+        while pending:
+            flush_one()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    seconds = time.perf_counter() - started
+    print(f"Scored {rows:,} rows in {seconds:.1f} s ({rows / max(seconds, 1e-9):,.0f} rows/s) -> {output}")
+    print(f"Max RSS (this process): {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
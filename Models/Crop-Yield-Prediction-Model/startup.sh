@@ -1 +1 @@
-gunicorn -k uvicorn.workers.UvicornWorker main:app --bind=0.0.0.0:8000
+gunicorn -k uvicorn.workers.UvicornWorker app:app --bind=0.0.0.0:8000
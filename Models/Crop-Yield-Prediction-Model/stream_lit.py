@@ -32,6 +32,35 @@ def load_dataset_unique_values(csv_path: str):
         st.warning(f"Could not load dataset options: {e}")
         return {'Crop': [], 'Season': [], 'State': [], 'Crop_Year': []}
 
+SENSITIVITY_FIELDS = ['Fertilizer', 'Pesticide', 'Annual_Rainfall']
+
+@st.cache_data
+def load_dataset_ranges(csv_path: str):
+    # 5th-95th percentile of each swept field, so curves cover typical values
+    if not Path(csv_path).exists():
+        return {}
+    try:
+        df = pd.read_csv(csv_path)
+        return {
+            f: (float(df[f].quantile(0.05)), float(df[f].quantile(0.95)))
+            for f in SENSITIVITY_FIELDS if f in df.columns
+        }
+    except Exception:
+        return {}
+
+def call_api_scenarios(api_base: str, payload: dict):
+    scenarios_url = f"{api_base}/predict-scenarios"
+    try:
+        response = requests.post(scenarios_url, json=payload, timeout=60)
+        if response.status_code == 200:
+            return response.json(), None
+        else:
+            return None, f"API error {response.status_code}: {response.text}"
+    except requests.exceptions.ConnectionError:
+        return None, f"Could not connect to API at {api_base}"
+    except Exception as e:
+        return None, f"Request failed: {str(e)}"
+
 def call_api_predict(api_base: str, payload: dict):
     predict_url = f"{api_base}/predict"
     try:
@@ -224,6 +253,32 @@ if submitted:
         ax.grid(True, alpha=0.3)
         
         st.pyplot(fig)
+
+        ranges = load_dataset_ranges(CSV_PATH)
+        if ranges:
+            st.markdown('#### 📉 Sensitivity')
+            st.caption('Predicted yield as each input varies on its own, other inputs as entered')
+            # One call sweeps every field: the API evaluates all points in one pass
+            scenario_payload = {
+                'base': payload,
+                'axes': [{'field': f, 'start': lo, 'stop': hi, 'num': 25} for f, (lo, hi) in ranges.items()],
+                'mode': 'sweep',
+            }
+            with st.spinner('🔄 Computing sensitivity curves...'):
+                scenarios, scenario_error = call_api_scenarios(st.session_state.api_base, scenario_payload)
+            if scenarios:
+                curves = scenarios.get('curves', [])
+                fig, axes = plt.subplots(1, len(curves), figsize=(4 * len(curves), 3), squeeze=False)
+                for ax, curve in zip(axes[0], curves):
+                    ax.fill_between(curve['values'], curve['lower_95'], curve['upper_95'], alpha=0.3, color='lightblue')
+                    ax.plot(curve['values'], curve['prediction'], color='tab:blue')
+                    ax.set_xlabel(curve['field'])
+                    ax.grid(True, alpha=0.3)
+                axes[0][0].set_ylabel('Yield (kg/ha)')
+                fig.tight_layout()
+                st.pyplot(fig)
+            else:
+                st.warning(f'Sensitivity curves unavailable: {scenario_error}')
         
         with st.expander('📋 Request Details', expanded=False):
             st.markdown('**Payload sent to API:**')
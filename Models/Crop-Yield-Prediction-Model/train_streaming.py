@@ -0,0 +1,187 @@
+# train_streaming.py
+# Out-of-core training mode for the crop yield model.
+#
+# main.py loads the whole CSV, densifies the one-hot output and fits a 200-tree
+# forest in memory. This script streams the CSV in chunks with explicit dtypes:
+#   pass 1 - fit StreamingPreprocessor statistics on the training rows
+#   pass 2 - fit the learner:
+#       sgd: SGDRegressor.partial_fit on sparse one-hot chunks; peak memory is
+#            bounded by --chunksize regardless of file size
+#       hgb: HistGradientBoostingRegressor on a compact float32 ordinal matrix
+#            (native categorical splits); memory ~ rows x 8 features x 4 bytes
+#   pass 3 - streaming evaluation on the held-out rows
+# and ends with a memory-profile report. The artifacts match main.py's (pipeline
+# joblib, model_metadata.json, residual_stats.json) so app.py can serve them.
+#
+#   python train_streaming.py --csv crop_yield.csv --chunksize 100000 --learner sgd
+import argparse
+import json
+import resource
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import SGDRegressor
+from sklearn.pipeline import Pipeline
+
+from encoders import StreamingPreprocessor
+
+CSV_PATH = 'crop_yield.csv'
+TARGET = 'Yield'
+RANDOM_STATE = 42
+
+CATEGORICAL = ['Crop', 'Season', 'State']
+NUMERIC = ['Crop_Year', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+FEATURES = ['Crop', 'Crop_Year', 'Season', 'State', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+DTYPES = {**{c: 'category' for c in CATEGORICAL}, **{c: 'float32' for c in NUMERIC},
+          'Production': 'float32', TARGET: 'float64'}
+
+
+def read_chunks(csv_path, chunksize, test_fraction, want_test):
+    """Yield (X, y) chunks of training rows (want_test=False) or held-out rows (True).
+
+    The split is drawn per chunk from a seeded generator, so every pass over the
+    file sees the same rows on the same side.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    derive_yield = TARGET not in header and 'Production' in header and 'Area' in header
+    usecols = [c for c in FEATURES if c in header] + (['Production'] if derive_yield else [TARGET])
+    reader = pd.read_csv(csv_path, usecols=usecols, dtype={c: DTYPES[c] for c in usecols}, chunksize=chunksize)
+    for i, chunk in enumerate(reader):
+        if derive_yield:
+            chunk[TARGET] = chunk['Production'] / chunk['Area']
+        chunk = chunk[chunk[TARGET].notna()]
+        is_test = np.random.default_rng([RANDOM_STATE, i]).random(len(chunk)) < test_fraction
+        part = chunk[is_test if want_test else ~is_test]
+        if len(part):
+            yield part, part[TARGET].to_numpy(dtype=np.float64)
+
+
+class MemoryReport:
+    def __init__(self):
+        self.phases = []
+        tracemalloc.start()
+
+    def phase(self, name, started, rows):
+        _, peak = tracemalloc.get_traced_memory()
+        self.phases.append({
+            'phase': name,
+            'seconds': round(time.perf_counter() - started, 2),
+            'rows': int(rows),
+            'peak_traced_mb': round(peak / 2**20, 1),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+        tracemalloc.reset_peak()
+
+    def print(self):
+        print(f"\n{'phase':<12} {'rows':>10} {'seconds':>8} {'peak traced MB':>15} {'max RSS MB':>11}")
+        for p in self.phases:
+            print(f"{p['phase']:<12} {p['rows']:>10} {p['seconds']:>8} {p['peak_traced_mb']:>15} {p['max_rss_mb']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--learner', choices=['sgd', 'hgb'], default='sgd')
+    parser.add_argument('--epochs', type=int, default=5, help='passes over the data for the sgd learner')
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--out-dir', default='outputs_streaming')
+    args = parser.parse_args()
+
+    report = MemoryReport()
+    chunks = lambda want_test=False: read_chunks(args.csv, args.chunksize, args.test_fraction, want_test)
+
+    # Pass 1: preprocessing statistics
+    t0 = time.perf_counter()
+    preprocessor = StreamingPreprocessor(NUMERIC, CATEGORICAL, output='sparse' if args.learner == 'sgd' else 'ordinal',
+                                         random_state=RANDOM_STATE)
+    n_train = 0
+    for X, _ in chunks():
+        preprocessor.partial_fit(X)
+        n_train += len(X)
+    preprocessor.finalize()
+    report.phase('statistics', t0, n_train)
+    print("Training rows:", n_train)
+
+    # Pass 2: fit
+    t0 = time.perf_counter()
+    if args.learner == 'sgd':
+        model = SGDRegressor(penalty='l2', alpha=1e-4, learning_rate='invscaling', eta0=0.01,
+                             random_state=RANDOM_STATE)
+        for epoch in range(args.epochs):
+            for X, y in chunks():
+                model.partial_fit(preprocessor.transform(X), y)
+            print(f"epoch {epoch + 1}/{args.epochs} done")
+    else:
+        blocks, targets = [], []
+        for X, y in chunks():
+            blocks.append(preprocessor.transform(X))
+            targets.append(y.astype(np.float32))
+        X_all, y_all = np.concatenate(blocks), np.concatenate(targets)
+        del blocks, targets
+        model = HistGradientBoostingRegressor(categorical_features=preprocessor.categorical_mask(),
+                                              random_state=RANDOM_STATE)
+        model.fit(X_all, y_all)
+        del X_all, y_all
+    report.phase('fit', t0, n_train * (args.epochs if args.learner == 'sgd' else 1))
+
+    # Pass 3: streaming evaluation on held-out rows
+    t0 = time.perf_counter()
+    n = sse = sae = sum_y = sum_y2 = sum_r = 0.0
+    for X, y in chunks(want_test=True):
+        resid = y - model.predict(preprocessor.transform(X))
+        n += y.size
+        sse += np.square(resid).sum()
+        sae += np.abs(resid).sum()
+        sum_y += y.sum()
+        sum_y2 += np.square(y).sum()
+        sum_r += resid.sum()
+    report.phase('evaluate', t0, n)
+
+    rmse = float(np.sqrt(sse / n))
+    mae = float(sae / n)
+    r2 = float(1 - sse / (sum_y2 - sum_y ** 2 / n))
+    resid_std = float(np.sqrt(max(sse / n - (sum_r / n) ** 2, 0.0)))
+    print("TEST  RMSE:", rmse)
+    print("TEST  MAE: ", mae)
+    print("TEST  R2:  ", r2)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ts = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    pipeline = Pipeline(steps=[('preprocessor', preprocessor), ('model', model)])
+    pipeline_filename = out_dir / f'crop_yield_pipeline_{ts}.joblib'
+    joblib.dump(pipeline, pipeline_filename, compress=3)
+    joblib.dump(pipeline, out_dir / 'crop_yield_pipeline_latest.joblib', compress=3)
+    print("Saved pipeline to:", pipeline_filename)
+
+    metadata = {
+        'created_at': ts,
+        'model_file': pipeline_filename.name,
+        'model_type': type(model).__name__,
+        'estimator_step_name': 'model',
+        'features': FEATURES,
+        'target': TARGET,
+        'training_mode': f'streaming-{args.learner}',
+        'chunksize': args.chunksize,
+    }
+    with open(out_dir / 'model_metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    # Residual spread from held-out rows (main.py uses training residuals).
+    with open(out_dir / 'residual_stats.json', 'w') as f:
+        json.dump({'resid_std': resid_std}, f, indent=2)
+    with open(out_dir / 'training_report.json', 'w') as f:
+        json.dump({'test_rmse': rmse, 'test_mae': mae, 'test_r2': r2, 'test_rows': int(n),
+                   'train_rows': n_train, 'memory': report.phases}, f, indent=2)
+
+    report.print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+# tune_forest.py
+# Tree-count / accuracy / latency trade-off for the yield RandomForest.
+#
+# sweep - for every max_depth x min_samples_leaf, fits one forest of the largest
+#         --n-estimators per CV fold and scores each requested tree count on its
+#         first k trees. With a fixed random_state the first k trees of a forest
+#         are exactly the forest RandomForestRegressor(n_estimators=k) would fit,
+#         so this costs one fit per fold instead of one per tree count. Each
+#         configuration is then refit on main.py's training split and reports
+#         CV and test RMSE, artifact size, joblib load time, and single-row /
+#         batch latency of app.py's predict path (preprocess + ForestIntervals).
+#         Writes forest_sweep.json / .csv to --out-dir and suggests the smallest
+#         forest within --tolerance of the best CV RMSE; train it with main.py
+#         via YIELD_N_ESTIMATORS / YIELD_MAX_DEPTH / YIELD_MIN_SAMPLES_LEAF.
+# prune - cuts an existing pipeline artifact to its first k trees, reports test
+#         RMSE before and after (main.py's split) and how far the predictions
+#         move, and saves the pruned pipeline (plus interval arrays if mmap).
+#
+#   python tune_forest.py sweep --n-estimators 25 50 100 200 --max-depth 0 12 20
+#   python tune_forest.py prune --model crop_yield_pipeline_latest.joblib --trees 50
+import argparse
+import copy
+import itertools
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import KFold, train_test_split
+from sklearn.pipeline import Pipeline
+
+from encoders import make_preprocessor
+from intervals import ForestIntervals
+
+CSV_PATH = 'crop_yield.csv'
+TARGET = 'Yield'
+RANDOM_STATE = 42
+FEATURES = ['Crop', 'Crop_Year', 'Season', 'State', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+
+
+def load_split(csv_path):
+    """main.py's data preparation and 80/20 split."""
+    df = pd.read_csv(csv_path)
+    if 'Production' in df.columns and 'Area' in df.columns and TARGET not in df.columns:
+        df[TARGET] = df['Production'] / df['Area']
+    df = df.dropna(subset=[TARGET]).reset_index(drop=True)
+    X = df[[c for c in FEATURES if c in df.columns]].copy()
+    y = df[TARGET].values
+    return train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE)
+
+
+def first_k_trees(forest, k):
+    """Shallow copy of a fitted forest that uses only its first k trees."""
+    pruned = copy.copy(forest)
+    pruned.estimators_ = forest.estimators_[:k]
+    pruned.n_estimators = k
+    return pruned
+
+
+def rmse(y_true, y_pred):
+    return float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
+
+
+def prefix_predictions(forest, X_trans, counts):
+    """{k: mean prediction of the first k trees} for every k in counts, from one pass over the trees."""
+    # Convert once, as RandomForestRegressor.predict does, instead of in every tree.
+    X = sp.csr_matrix(X_trans, dtype=np.float32) if sp.issparse(X_trans) else np.asarray(X_trans, dtype=np.float32)
+    total = np.zeros(X.shape[0])
+    out = {}
+    for i, tree in enumerate(forest.estimators_, start=1):
+        total += tree.predict(X, check_input=False)
+        if i in counts:
+            out[i] = total / i
+    return out
+
+
+def artifact_stats(pipeline, compress):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'pipeline.joblib'
+        joblib.dump(pipeline, path, compress=compress)
+        size = path.stat().st_size
+        load = []
+        for _ in range(3):
+            t0 = time.perf_counter()
+            joblib.load(path)
+            load.append(time.perf_counter() - t0)
+    return {'artifact_mb': round(size / 2**20, 2), 'load_s': round(min(load), 3)}
+
+
+def latency_stats(pipeline, X, batch_rows, repeat):
+    """app.py's interval path: ms for one row (median) and per batch of batch_rows."""
+    preproc = pipeline.named_steps['preprocessor']
+    intervals = ForestIntervals(pipeline.named_steps['model'])
+    rows = [X.iloc[[i]] for i in range(min(repeat, len(X)))]
+    single = []
+    for row in rows:
+        t0 = time.perf_counter()
+        intervals.predict(preproc.transform(row))
+        single.append(time.perf_counter() - t0)
+    batch = X.iloc[:batch_rows]
+    t0 = time.perf_counter()
+    intervals.predict(preproc.transform(batch))
+    batch_s = time.perf_counter() - t0
+    return {'single_row_ms': round(float(np.median(single)) * 1e3, 3), 'batch_ms': round(batch_s * 1e3, 1)}
+
+
+def sweep(args):
+    X_train, X_test, y_train, y_test = load_split(args.csv)
+    numeric = X_train.select_dtypes(include=[np.number]).columns.tolist()
+    categorical = X_train.select_dtypes(include=['object', 'category']).columns.tolist()
+    counts = sorted(set(args.n_estimators))
+    compress = 3 if args.artifact_format == 'compressed' else 0
+    folds = list(KFold(n_splits=args.folds, shuffle=True, random_state=RANDOM_STATE).split(X_train))
+
+    results = []
+    for depth, leaf in itertools.product(args.max_depth, args.min_samples_leaf):
+        depth = depth or None
+        started = time.perf_counter()
+        forest = RandomForestRegressor(n_estimators=counts[-1], max_depth=depth, min_samples_leaf=leaf,
+                                       random_state=RANDOM_STATE, n_jobs=-1)
+        pipeline = Pipeline([('preprocessor', make_preprocessor(numeric, categorical, args.encoding)),
+                             ('model', forest)])
+        fold_rmse = {k: [] for k in counts}
+        for train_idx, val_idx in folds:
+            fold = clone(pipeline).fit(X_train.iloc[train_idx], y_train[train_idx])
+            X_val = fold.named_steps['preprocessor'].transform(X_train.iloc[val_idx])
+            for k, pred in prefix_predictions(fold.named_steps['model'], X_val, counts).items():
+                fold_rmse[k].append(rmse(y_train[val_idx], pred))
+
+        pipeline.fit(X_train, y_train)
+        X_test_trans = pipeline.named_steps['preprocessor'].transform(X_test)
+        test_pred = prefix_predictions(pipeline.named_steps['model'], X_test_trans, counts)
+        for k in counts:
+            pruned = Pipeline([('preprocessor', pipeline.named_steps['preprocessor']),
+                               ('model', first_k_trees(pipeline.named_steps['model'], k))])
+            r = {
+                'n_estimators': k, 'max_depth': depth, 'min_samples_leaf': leaf,
+                'cv_rmse': round(float(np.mean(fold_rmse[k])), 4),
+                'cv_rmse_std': round(float(np.std(fold_rmse[k])), 4),
+                'test_rmse': round(rmse(y_test, test_pred[k]), 4),
+                'nodes': int(sum(t.tree_.node_count for t in pruned.named_steps['model'].estimators_)),
+            }
+            r.update(artifact_stats(pruned, compress))
+            r.update(latency_stats(pruned, X_test, args.batch_rows, args.latency_rows))
+            results.append(r)
+            print(f"depth={depth} leaf={leaf} trees={k}: cv_rmse={r['cv_rmse']} "
+                  f"{r['artifact_mb']} MB {r['single_row_ms']} ms/row", flush=True)
+        print(f"  ({time.perf_counter() - started:.1f} s)")
+
+    best = min(r['cv_rmse'] for r in results)
+    within = [r for r in results if r['cv_rmse'] <= best * (1 + args.tolerance)]
+    suggested = min(within, key=lambda r: (r['nodes'], r['cv_rmse']))
+
+    print(f"\n{'trees':>5} {'depth':>5} {'leaf':>4} {'cv rmse':>9} {'test rmse':>9} {'nodes':>9} "
+          f"{'MB':>7} {'load s':>7} {'ms/row':>7} {f'ms/{args.batch_rows}':>8}")
+    for r in sorted(results, key=lambda r: r['cv_rmse']):
+        mark = ' *' if r is suggested else ''
+        print(f"{r['n_estimators']:>5} {str(r['max_depth']):>5} {r['min_samples_leaf']:>4} {r['cv_rmse']:>9.2f} "
+              f"{r['test_rmse']:>9.2f} {r['nodes']:>9} {r['artifact_mb']:>7.2f} {r['load_s']:>7.3f} "
+              f"{r['single_row_ms']:>7.2f} {r['batch_ms']:>8.1f}{mark}")
+    print(f"\n* smallest forest within {args.tolerance:.1%} of the best CV RMSE ({best:.2f}). Train it with:")
+    print(f"  YIELD_N_ESTIMATORS={suggested['n_estimators']} "
+          f"YIELD_MAX_DEPTH={suggested['max_depth'] or ''} "
+          f"YIELD_MIN_SAMPLES_LEAF={suggested['min_samples_leaf']} python main.py")
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / 'forest_sweep.json', 'w') as f:
+        json.dump({'encoding': args.encoding, 'artifact_format': args.artifact_format, 'folds': args.folds,
+                   'tolerance': args.tolerance, 'suggested': suggested, 'results': results}, f, indent=2)
+    pd.DataFrame(results).to_csv(out_dir / 'forest_sweep.csv', index=False)
+    print("Saved report to:", out_dir / 'forest_sweep.json')
+
+
+def prune(args):
+    pipeline = joblib.load(args.model)
+    forest = pipeline.steps[-1][1]
+    if not 0 < args.trees <= len(forest.estimators_):
+        raise SystemExit(f"--trees must be between 1 and {len(forest.estimators_)}")
+    pruned = copy.copy(pipeline)
+    pruned.steps = [(name, first_k_trees(step, args.trees) if step is forest else step)
+                    for name, step in pipeline.steps]
+
+    _, X_test, _, y_test = load_split(args.csv)
+    full_pred = pipeline.predict(X_test)
+    pruned_pred = pruned.predict(X_test)
+    full_rmse, pruned_rmse = rmse(y_test, full_pred), rmse(y_test, pruned_pred)
+    shift = np.abs(pruned_pred - full_pred)
+    print(f"trees: {len(forest.estimators_)} -> {args.trees}")
+    print(f"TEST RMSE: {full_rmse:.4f} -> {pruned_rmse:.4f} ({(pruned_rmse - full_rmse) / full_rmse:+.2%})")
+    print(f"|prediction change|: median {np.median(shift):.4f}, p99 {np.percentile(shift, 99):.4f}, "
+          f"max {shift.max():.4f}")
+
+    compress = 3 if args.artifact_format == 'compressed' else 0
+    out = Path(args.out or Path(args.model).with_name(Path(args.model).stem + f'_k{args.trees}.joblib'))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(pruned, out, compress=compress)
+    print("Saved pruned pipeline to:", out, f"({out.stat().st_size / 2**20:.2f} MB, "
+          f"was {Path(args.model).stat().st_size / 2**20:.2f} MB)")
+    if args.artifact_format == 'mmap':
+        intervals_path = out.with_name(out.stem.replace('pipeline', 'intervals') + '.joblib')
+        ForestIntervals(pruned.steps[-1][1]).save(intervals_path)
+        print("Saved memory-mappable interval arrays to:", intervals_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tree-count / latency trade-off for the yield RandomForest.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('sweep', help='sweep forest size and report accuracy, size and latency')
+    p.add_argument('--csv', default=CSV_PATH)
+    p.add_argument('--n-estimators', type=int, nargs='+', default=[25, 50, 100, 200])
+    p.add_argument('--max-depth', type=int, nargs='+', default=[0, 20, 12], help='0 = unbounded')
+    p.add_argument('--min-samples-leaf', type=int, nargs='+', default=[1, 3])
+    p.add_argument('--folds', type=int, default=5)
+    p.add_argument('--tolerance', type=float, default=0.01, help='relative CV RMSE allowed over the best')
+    p.add_argument('--encoding', default=os.environ.get('YIELD_ENCODING', 'onehot'))
+    p.add_argument('--artifact-format', choices=['compressed', 'mmap'],
+                   default=os.environ.get('YIELD_ARTIFACT_FORMAT', 'compressed'))
+    p.add_argument('--batch-rows', type=int, default=1000)
+    p.add_argument('--latency-rows', type=int, default=200)
+    p.add_argument('--out-dir', default='outputs')
+    p.set_defaults(func=sweep)
+
+    p = sub.add_parser('prune', help="keep only the first k trees of an existing artifact")
+    p.add_argument('--model', default='crop_yield_pipeline_latest.joblib')
+    p.add_argument('--trees', type=int, required=True)
+    p.add_argument('--csv', default=CSV_PATH)
+    p.add_argument('--out', help='default: <model>_k<trees>.joblib next to the input')
+    p.add_argument('--artifact-format', choices=['compressed', 'mmap'],
+                   default=os.environ.get('YIELD_ARTIFACT_FORMAT', 'compressed'))
+    p.set_defaults(func=prune)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
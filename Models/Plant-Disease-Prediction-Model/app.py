@@ -1,102 +1,190 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
+import asyncio
+import os
+import sys
+from pathlib import Path
 import io
-import torch
-import torch.nn as nn
-import torchvision.transforms as transforms
-from typing import Dict, Any
-
-CLASSES = [
-    'Apple___Apple_scab', 'Apple___Black_rot', 'Apple___Cedar_apple_rust', 'Apple___healthy',
-    'Blueberry___healthy', 'Cherry_(including_sour)___Powdery_mildew', 'Cherry_(including_sour)___healthy',
-    'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot', 'Corn_(maize)___Common_rust_',
-    'Corn_(maize)___Northern_Leaf_Blight', 'Corn_(maize)___healthy', 'Grape___Black_rot',
-    'Grape___Esca_(Black_Measles)', 'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)', 'Grape___healthy',
-    'Orange___Haunglongbing_(Citrus_greening)', 'Peach___Bacterial_spot', 'Peach___healthy',
-    'Pepper,_bell___Bacterial_spot', 'Pepper,_bell___healthy', 'Potato___Early_blight',
-    'Potato___Late_blight', 'Potato___healthy', 'Raspberry___healthy', 'Soybean___healthy',
-    'Squash___Powdery_mildew', 'Strawberry___Leaf_scorch', 'Strawberry___healthy', 'Tomato___Bacterial_spot',
-    'Tomato___Early_blight', 'Tomato___Late_blight', 'Tomato___Leaf_Mold', 'Tomato___Septoria_leaf_spot',
-    'Tomato___Spider_mites Two-spotted_spider_mite', 'Tomato___Target_Spot',
-    'Tomato___Tomato_Yellow_Leaf_Curl_Virus', 'Tomato___Tomato_mosaic_virus', 'Tomato___healthy'
-]
-NUM_CLASSES = len(CLASSES)
-
-def ConvBlock(in_channels: int, out_channels: int, pool: bool = False) -> nn.Sequential:
-    layers = [
-        nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1),
-        nn.BatchNorm2d(out_channels),
-        nn.ReLU(inplace=True),
-    ]
-    if pool:
-        layers.append(nn.MaxPool2d(4))
-    return nn.Sequential(*layers)
-
-
-class ResNet9(nn.Module):
-    def __init__(self, in_channels: int, num_diseases: int):
-        super().__init__()
-        self.conv1 = ConvBlock(in_channels, 64)
-        self.conv2 = ConvBlock(64, 128, pool=True)
-        self.res1 = nn.Sequential(ConvBlock(128, 128), ConvBlock(128, 128))
-        self.conv3 = ConvBlock(128, 256, pool=True)
-        self.conv4 = ConvBlock(256, 512, pool=True)
-        self.res2 = nn.Sequential(ConvBlock(512, 512), ConvBlock(512, 512))
-        self.classifier = nn.Sequential(
-            nn.MaxPool2d(4),
-            nn.Flatten(),
-            nn.Linear(512, num_diseases),
-        )
-
-    def forward(self, xb: torch.Tensor) -> torch.Tensor:
-        out = self.conv1(xb)
-        out = self.conv2(out)
-        out = self.res1(out) + out
-        out = self.conv3(out)
-        out = self.conv4(out)
-        out = self.res2(out) + out
-        out = self.classifier(out)
-        return out
-
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-WEIGHTS_PATH = "plant-disease-model.pth"  # state_dict .pth in repo
-
-
-def _strip_module_prefix(state_dict: Dict[str, Any]) -> Dict[str, Any]:
-    if not any(k.startswith("module.") for k in state_dict.keys()):
-        return state_dict
-    return {k.replace("module.", "", 1): v for k, v in state_dict.items()}
-
-
-def load_model(weights_path: str, device: torch.device) -> nn.Module:
-    model = ResNet9(in_channels=3, num_diseases=NUM_CLASSES).to(device)
-
-    obj = torch.load(weights_path, map_location=device)
-    if isinstance(obj, nn.Module):
-        model = obj.to(device)
-        model.eval()
-        return model
-
-    if isinstance(obj, dict) and "state_dict" in obj:
-        state_dict = obj["state_dict"]
-    elif isinstance(obj, dict):
-        state_dict = obj
-    else:
-        raise RuntimeError("Unsupported checkpoint format. Expected state_dict or nn.Module.")
-
-    state_dict = _strip_module_prefix(state_dict)
+from concurrent.futures import BrokenExecutor
+from typing import List, Tuple
+import hashlib
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from serving.cache import cache_from_env
+from serving.executor import WorkerPool
+from serving.metrics import Metrics
+from serving.readiness import LAZY_STARTUP, WARMUP, ModelState
+
+from classes import CLASSES, NUM_CLASSES
+from ingest import (Upload, UploadRejected, expand_archives, read_upload, read_uploads,
+                    sniff_image_or_zip)
+from preprocessing import DECODE_BACKEND, DECODE_DRAFT, decode_image, decode_images, to_batch_tensor, to_tensor
+
+
+DEVICE = None
+# Model files are read from MODEL_DIR: the working directory when the app is run on
+# its own, or the service directory that server.py sets before importing this module.
+MODEL_DIR = globals().get("MODEL_DIR") or os.getcwd()
+WEIGHTS_PATH = os.path.join(MODEL_DIR, "plant-disease-model.pth")  # state_dict .pth in repo
+
+# Optional inference variant built at startup, e.g. MODEL_OPTIMIZE=fold_bn,channels_last,jit
+# or MODEL_OPTIMIZE=int8 with MODEL_CALIBRATION_DIR; see optimize.py / bench_optimize.py.
+MODEL_OPTIMIZE = ()
+MODEL = None
+BATCHER = None
+CACHE_NAMESPACE = None
+
+# Image decoding runs in a process pool and the forward pass in a single-thread pool
+# (torch already parallelises each batch across intra-op threads). Both are bounded;
+# requests beyond workers + queue are rejected with 429. Override with
+# DECODE_POOL_{KIND,WORKERS,QUEUE} / INFERENCE_POOL_{KIND,WORKERS,QUEUE}.
+DECODE_POOL = WorkerPool.from_env("decode", kind="process")
+INFERENCE_POOL = WorkerPool.from_env("inference", kind="thread", max_workers=1, max_queue=4)
+
+# Concurrent /predict calls are coalesced into one forward pass of up to
+# BATCH_MAX_SIZE images, waiting at most BATCH_MAX_WAIT_MS for a batch to fill.
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 10))
+
+# Results keyed by a hash of the uploaded bytes, so re-uploads of the same photo skip
+# decoding and the forward pass. RESULT_CACHE_SIZE (0 disables), RESULT_CACHE_TTL
+# (seconds) and RESULT_CACHE_PATH (SQLite file shared by all gunicorn workers).
+RESULT_CACHE = cache_from_env("result", max_entries=1024, ttl=3600)
+
+# Uploads are parsed as they stream in (ingest.py): bodies over MAX_UPLOAD_BYTES
+# are rejected with 413 and non-image files with 415 without reading them in full.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+# /predict-batch takes up to MAX_BATCH_FILES images (as files or inside zips),
+# each within MAX_UPLOAD_BYTES, in a body of at most MAX_BATCH_BYTES.
+MAX_BATCH_FILES = int(os.environ.get("MAX_BATCH_FILES", 32))
+MAX_BATCH_BYTES = int(os.environ.get("MAX_BATCH_BYTES", 64 * 1024 * 1024))
+
+# Prometheus-style /metrics: request counts and latency per route, per-stage
+# histograms (parse, read, decode_wait / decode_run, tensor, batch = queueing plus
+# the batched forward, forward, serialize), the batch-size histogram and accepted /
+# rejected upload counts and bytes.
+METRICS = Metrics("disease")
+UPLOAD_STATS = {"accepted": 0, "accepted_bytes": 0, "rejected": 0, "rejected_bytes": 0, "rejected_by_reason": {}}
+
+# Documents the multipart body that read_upload() parses by hand.
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    },
+}
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"files": {
+                "type": "array",
+                "items": {"type": "string", "format": "binary"},
+                "description": "Images of one plant, and/or zip archives of images.",
+            }},
+            "required": ["files"],
+        }}},
+    },
+}
 
+
+def load_service():
+    global DEVICE, MODEL_OPTIMIZE, MODEL, BATCHER, CACHE_NAMESPACE
+    # torch and everything built on it are imported here, so with LAZY_STARTUP=1
+    # the app serves /health while they load.
+    import torch
+    from batching import MicroBatcher
+    from model import load_model
+    from optimize import load_calibration, optimize_model, parse_optimizations
+
+    DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    MODEL_OPTIMIZE = parse_optimizations(os.environ.get("MODEL_OPTIMIZE", ""))
+    MODEL = load_model(WEIGHTS_PATH, DEVICE, NUM_CLASSES)
+    if MODEL_OPTIMIZE:
+        calibration = load_calibration(os.environ.get("MODEL_CALIBRATION_DIR")) if "int8" in MODEL_OPTIMIZE else None
+        MODEL = optimize_model(MODEL, MODEL_OPTIMIZE, calibration, device=DEVICE)
+
+    BATCHER = MicroBatcher(MODEL, DEVICE, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                           pool=INFERENCE_POOL, on_batch=METRICS.observe_batch)
+
+    # Anything that changes predictions goes into the key, so a shared cache never serves
+    # results from different weights or preprocessing.
+    weights_stat = os.stat(WEIGHTS_PATH)
+    CACHE_NAMESPACE = hashlib.blake2b(repr((
+        WEIGHTS_PATH, weights_stat.st_size, weights_stat.st_mtime_ns,
+        MODEL_OPTIMIZE, DECODE_BACKEND, DECODE_DRAFT,
+    )).encode(), digest_size=8).hexdigest()
+
+
+# Loaded at import as before; with LAZY_STARTUP=1 in the background after startup,
+# alongside the decode pool warm-up, /health reporting "loading" until then.
+# Spawned decode workers re-run this file as __mp_main__ under `python app.py`, and
+# that script's own __main__ copy only starts uvicorn, which imports app.py again:
+# neither loads the model, so decode workers stay free of torch.
+MODEL_STATE = ModelState("plant-disease")
+METRICS.track_model(MODEL_STATE)
+if not LAZY_STARTUP and __name__ not in ("__main__", "__mp_main__"):
+    load_service()
+
+
+def record_upload(outcome: str, bytes_read: int, reason: str = "") -> None:
+    UPLOAD_STATS[outcome] += 1
+    UPLOAD_STATS[f"{outcome}_bytes"] += bytes_read
+    if reason:
+        UPLOAD_STATS["rejected_by_reason"][reason] = UPLOAD_STATS["rejected_by_reason"].get(reason, 0) + 1
+    labels = {"outcome": outcome, "reason": reason} if reason else {"outcome": outcome}
+    METRICS.inc("model_uploads_total", **labels)
+    METRICS.inc("model_upload_bytes_total", bytes_read, outcome=outcome)
+
+
+# ingest() / ingest_batch() record rejections; an upload counts as accepted once the
+# handler has used it (answered from the cache or decoded).
+async def ingest(request: Request) -> Upload:
     try:
-        model.load_state_dict(state_dict, strict=True)
-    except Exception:
-        model.load_state_dict(state_dict, strict=False)
+        return await read_upload(request, "file", MAX_UPLOAD_BYTES)
+    except UploadRejected as e:
+        record_upload("rejected", e.bytes_read, e.reason)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
 
-    model.eval()
-    return model
+async def ingest_batch(request: Request) -> Tuple[List[Upload], int]:
+    bytes_read = 0
+    try:
+        # Images are capped at MAX_UPLOAD_BYTES as they stream in; zips only by the body limit.
+        uploads = await read_uploads(request, "files", MAX_UPLOAD_BYTES, MAX_BATCH_FILES, MAX_BATCH_BYTES,
+                                     sniff=sniff_image_or_zip, format_limits={"zip": MAX_BATCH_BYTES})
+        bytes_read = sum(u.bytes_read for u in uploads)
+        if any(upload.format == "zip" for upload in uploads):
+            # Decompression blocks, so it runs off the event loop; the request's images,
+            # plain and unpacked together, are held to MAX_BATCH_BYTES in total.
+            uploads = await asyncio.to_thread(expand_archives, uploads, MAX_BATCH_FILES, MAX_UPLOAD_BYTES,
+                                              4 * MAX_BATCH_FILES, MAX_BATCH_BYTES)
+    except UploadRejected as e:
+        record_upload("rejected", e.bytes_read or bytes_read, e.reason)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return uploads, bytes_read
 
 
-MODEL = load_model(WEIGHTS_PATH, DEVICE)
+async def decode_all(images: List[bytes]) -> list:
+    # One pool call per decode worker, each decoding a contiguous slice, so the images
+    # decode in parallel without taking more than max_workers slots of the bounded pool.
+    slices = min(DECODE_POOL.max_workers, len(images))
+    step = -(-len(images) // slices)
+    parts = await asyncio.gather(*(
+        DECODE_POOL.run(decode_images, images[i:i + step]) for i in range(0, len(images), step)))
+    return [image for part in parts for image in part]
+
+
+def _blank_image() -> bytes:
+    blank = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(blank, format="PNG")
+    return blank.getvalue()
 
 
 app = FastAPI(title="Plant Disease Classification API", version="1.0.0")
@@ -107,36 +195,149 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+METRICS.instrument(app)
+
+
+async def _start_service():
+    loading = [asyncio.to_thread(load_service)] if LAZY_STARTUP else []
+    await asyncio.gather(DECODE_POOL.warm_up(decode_image, _blank_image()), *loading)
+    await BATCHER.start()
+
+
+async def warmup_model():
+    await BATCHER.submit(to_tensor(decode_image(_blank_image())))
+
 
+@app.on_event("startup")
+async def start_batcher():
+    await MODEL_STATE.start(_start_service, warmup_model if WARMUP else None)
 
-TRANSFORM = transforms.Compose([
-    transforms.Resize((256, 256)),
-    transforms.ToTensor(),
-])
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    if BATCHER is not None:
+        await BATCHER.stop()
+    DECODE_POOL.shutdown()
+    if not INFERENCE_POOL.shared:
+        INFERENCE_POOL.shutdown()
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "device": str(DEVICE), "classes": NUM_CLASSES}
+    return {
+        "status": "ok",
+        "state": MODEL_STATE.state,
+        "readiness": MODEL_STATE.status(),
+        "device": str(DEVICE),
+        "classes": NUM_CLASSES,
+        "optimizations": list(MODEL_OPTIMIZE),
+        "batching": BATCHER.stats() if BATCHER is not None else None,
+        "pools": {pool.name: pool.stats() for pool in (DECODE_POOL, INFERENCE_POOL)},
+        "cache": RESULT_CACHE.stats() if RESULT_CACHE is not None else None,
+        "uploads": dict(UPLOAD_STATS, max_bytes=MAX_UPLOAD_BYTES),
+    }
 
 
-@app.post("/predict")
-async def predict(file: UploadFile = File(...)):
-    image_bytes = await file.read()
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    tensor = TRANSFORM(img).unsqueeze(0).to(DEVICE)
+@app.get("/ready")
+async def ready():
+    MODEL_STATE.require()
+    return {"state": MODEL_STATE.state}
 
-    with torch.no_grad():
-        logits = MODEL(tensor)
-        probs = torch.softmax(logits, dim=1)
-        conf, pred_idx = torch.max(probs, dim=1)
+
+@app.post("/predict", openapi_extra=UPLOAD_OPENAPI)
+@METRICS.handler
+async def predict(request: Request):
+    MODEL_STATE.require()
+    with METRICS.stage("read"):
+        upload = await ingest(request)
+    image_bytes = upload.data
+    key = CACHE_NAMESPACE + upload.digest if RESULT_CACHE is not None else None
+    if key is not None:
+        cached = await RESULT_CACHE.aget(key)
+        if cached is not None:
+            record_upload("accepted", upload.bytes_read)
+            return cached
+
+    try:
+        image = await DECODE_POOL.run(decode_image, image_bytes)
+    except (HTTPException, BrokenExecutor):
+        raise
+    except Exception:
+        # Passed the signature sniff but is truncated or corrupt.
+        record_upload("rejected", upload.bytes_read, "undecodable")
+        raise HTTPException(status_code=422, detail="Uploaded image could not be decoded.")
+    record_upload("accepted", upload.bytes_read)
+    with METRICS.stage("tensor"):
+        tensor = to_tensor(image)
+
+    with METRICS.stage("batch"):
+        probs = await BATCHER.submit(tensor)
+    conf, pred_idx = probs.max(dim=0)
 
     pred_class = CLASSES[pred_idx.item()]
-    return {
+    result = {
         "class": pred_class,
         "confidence": float(conf.item()),
         "index": int(pred_idx.item()),
     }
+    if key is not None:
+        await RESULT_CACHE.aput(key, result)
+    return result
+
+
+
+@app.post("/predict-batch", openapi_extra=BATCH_UPLOAD_OPENAPI)
+@METRICS.handler
+async def predict_batch(request: Request, top_k: int = Query(3, ge=1, le=NUM_CLASSES)):
+    """Several photos of one plant: a result per image plus a diagnosis from their
+    mean class probabilities, with all images in one batched forward pass."""
+    MODEL_STATE.require()
+    with METRICS.stage("read"):
+        uploads, bytes_read = await ingest_batch(request)
+
+    decoded = await decode_all([upload.data for upload in uploads])
+    ok = [i for i, image in enumerate(decoded) if not isinstance(image, str)]
+    if not ok:
+        record_upload("rejected", bytes_read, "undecodable")
+        raise HTTPException(status_code=422, detail="None of the uploaded images could be decoded.")
+    record_upload("accepted", bytes_read)
+    with METRICS.stage("tensor"):
+        batch = to_batch_tensor([decoded[i] for i in ok])
+
+    with METRICS.stage("batch"):
+        probs = await BATCHER.run_batch(batch)
+    conf, pred_idx = probs.max(dim=1)
+
+    # Files that failed to decode keep their error and are left out of the diagnosis.
+    row_of = {i: row for row, i in enumerate(ok)}
+    images = []
+    for i, upload in enumerate(uploads):
+        if i not in row_of:
+            images.append({"filename": upload.filename, "error": decoded[i]})
+            continue
+        row = row_of[i]
+        images.append({
+            "filename": upload.filename,
+            "class": CLASSES[pred_idx[row].item()],
+            "confidence": float(conf[row].item()),
+            "index": int(pred_idx[row].item()),
+        })
+
+    mean = probs.mean(dim=0)
+    top_p, top_idx = mean.topk(top_k)
+    diagnosis_idx = int(top_idx[0].item())
+    return {
+        "diagnosis": {
+            "class": CLASSES[diagnosis_idx],
+            "confidence": float(top_p[0].item()),
+            "index": diagnosis_idx,
+            "agreement": float((pred_idx == diagnosis_idx).float().mean().item()),
+            "top": [{"class": CLASSES[int(i)], "probability": float(p)}
+                    for p, i in zip(top_p.tolist(), top_idx.tolist())],
+        },
+        "images_used": len(ok),
+        "images": images,
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,148 @@
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+from serving.executor import WorkerPool
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-image requests into one batched forward pass.
+
+    Requests are queued as decoded CHW tensors; a background task collects up to
+    ``max_batch_size`` of them (or whatever arrived within ``max_wait_ms`` of the
+    first one), runs a single ``torch.no_grad()`` forward and resolves each
+    caller's future with its row of softmax probabilities. The forward runs on
+    ``pool`` when given, otherwise on the loop's default executor. ``on_batch``
+    is called with the size and forward seconds of every batch.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        device: torch.device,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        pool: Optional[WorkerPool] = None,
+        on_batch: Optional[Callable[[int, float], None]] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.model = model
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+        self.pool = pool
+        self.on_batch = on_batch
+        self.batches_run = 0
+        self.images_run = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("Batcher stopped before the request was processed."))
+
+    async def submit(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Queue one CHW image tensor and wait for its probability vector."""
+        if self._worker is None:
+            await self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((tensor, fut))
+        return await fut
+
+    async def run_batch(self, batch: torch.Tensor) -> torch.Tensor:
+        """Softmax probabilities for an NCHW batch that arrived together (one request
+        with several images), bypassing the queue: one forward per ``max_batch_size``
+        images, on the same pool as the coalesced batches."""
+        loop = asyncio.get_running_loop()
+        out = []
+        for chunk in batch.split(self.max_batch_size):
+            started = time.perf_counter()
+            if self.pool is not None:
+                probs = await self.pool.run(self._forward, chunk)
+            else:
+                probs = await loop.run_in_executor(None, self._forward, chunk)
+            self.batches_run += 1
+            self.images_run += len(chunk)
+            if self.on_batch is not None:
+                self.on_batch(len(chunk), time.perf_counter() - started)
+            out.append(probs)
+        return torch.cat(out)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches_run,
+            "images": self.images_run,
+            "mean_batch_size": (self.images_run / self.batches_run) if self.batches_run else 0.0,
+        }
+
+    async def _collect(self) -> List[Tuple[torch.Tensor, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _forward(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            logits = self.model(batch.to(self.device))
+            return torch.softmax(logits, dim=1).cpu()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Drop requests whose caller already went away (client disconnect / timeout).
+            batch = [(t, f) for t, f in batch if not f.done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                stacked = torch.stack([t for t, _ in batch])
+                if self.pool is not None:
+                    probs = await self.pool.run(self._forward, stacked)
+                else:
+                    probs = await loop.run_in_executor(None, self._forward, stacked)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batches_run += 1
+            self.images_run += len(batch)
+            if self.on_batch is not None:
+                self.on_batch(len(batch), time.perf_counter() - started)
+            for (_, fut), row in zip(batch, probs):
+                if not fut.done():
+                    fut.set_result(row)
@@ -0,0 +1,79 @@
+"""Benchmark: per-request forward passes vs. the MicroBatcher used by /predict.
+
+Run from this directory (it imports app.py, which loads plant-disease-model.pth):
+
+    python bench_batching.py --clients 1 8 64 --requests 256
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+import numpy as np
+import torch
+
+from app import DEVICE, MODEL
+from batching import MicroBatcher
+
+
+def _percentiles(latencies: List[float]) -> dict:
+    arr = np.asarray(latencies) * 1000.0
+    return {"p50_ms": float(np.percentile(arr, 50)), "p99_ms": float(np.percentile(arr, 99))}
+
+
+async def _per_request(tensor: torch.Tensor) -> torch.Tensor:
+    # Mirrors the original handler: one image, inline forward on the event loop.
+    with torch.no_grad():
+        logits = MODEL(tensor.unsqueeze(0).to(DEVICE))
+        return torch.softmax(logits, dim=1)[0]
+
+
+async def _run(clients: int, total: int, predict) -> dict:
+    per_client = max(total // clients, 1)
+    latencies: List[float] = []
+
+    async def client():
+        tensor = torch.rand(3, 256, 256)
+        for _ in range(per_client):
+            t0 = time.perf_counter()
+            await predict(tensor)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    return {"images_per_sec": len(latencies) / elapsed, **_percentiles(latencies)}
+
+
+async def main(args) -> None:
+    torch.set_num_threads(args.threads or torch.get_num_threads())
+    print(f"device={DEVICE} threads={torch.get_num_threads()} "
+          f"max_batch_size={args.max_batch_size} max_wait_ms={args.max_wait_ms}")
+    print(f"{'clients':>7} {'mode':>10} {'img/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+
+    with torch.no_grad():
+        MODEL(torch.rand(1, 3, 256, 256, device=DEVICE))  # warm-up
+
+    for clients in args.clients:
+        res = await _run(clients, args.requests, _per_request)
+        print(f"{clients:>7} {'single':>10} {res['images_per_sec']:>9.1f} {res['p50_ms']:>9.1f} {res['p99_ms']:>9.1f}")
+
+        batcher = MicroBatcher(MODEL, DEVICE, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+        await batcher.start()
+        try:
+            res = await _run(clients, args.requests, batcher.submit)
+        finally:
+            await batcher.stop()
+        stats = batcher.stats()
+        print(f"{clients:>7} {'batched':>10} {res['images_per_sec']:>9.1f} {res['p50_ms']:>9.1f} {res['p99_ms']:>9.1f}"
+              f"   (mean batch {stats['mean_batch_size']:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--requests", type=int, default=256, help="total requests per run")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    asyncio.run(main(parser.parse_args()))
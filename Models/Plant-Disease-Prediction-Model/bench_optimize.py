@@ -0,0 +1,111 @@
+"""Benchmark: top-1 agreement, throughput and memory of the MODEL_OPTIMIZE variants.
+
+Each variant from optimize.py is built from the float model, INT8 ones calibrated
+on the first --calibration images; agreement with the float model is measured on
+the remaining (held-out) images.
+
+Run from this directory (it imports app.py, which loads plant-disease-model.pth).
+Point --images at real leaf photos; without it synthetic images are used, which
+only exercises the code paths:
+
+    python bench_optimize.py --images 'holdout/**/*.jpg' --batch-sizes 1 16
+"""
+import argparse
+import glob
+import io
+import os
+import time
+
+import torch
+
+from app import DEVICE, NUM_CLASSES, WEIGHTS_PATH
+from bench_preprocessing import synthetic_photo
+from model import load_model
+from optimize import optimize_model, parse_optimizations
+from preprocessing import decode_image, to_tensor
+
+DEFAULT_VARIANTS = ["", "fold_bn", "fold_bn,channels_last", "fold_bn,channels_last,jit", "int8",
+                    "int8,channels_last", "int8,jit"]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def serialized_mb(model) -> str:
+    # Frozen TorchScript modules keep their (possibly prepacked) weights as graph
+    # constants that torch.jit.save does not size meaningfully; see +RSS instead.
+    if isinstance(model, torch.jit.ScriptModule):
+        return "-"
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return f"{buf.tell() / 2**20:.1f}"
+
+
+def predict(model, images: torch.Tensor, batch_size: int = 16) -> torch.Tensor:
+    with torch.no_grad():
+        return torch.cat([torch.softmax(model(images[i:i + batch_size].to(DEVICE)), dim=1).cpu()
+                          for i in range(0, len(images), batch_size)])
+
+
+def throughput(model, batch_size: int, repeat: int) -> float:
+    batch = torch.rand(batch_size, 3, 256, 256, device=DEVICE)
+    with torch.no_grad():
+        model(batch)
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            model(batch)
+    return batch_size * repeat / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="glob of leaf photos (calibration + held-out)")
+    parser.add_argument("--synthetic", type=int, default=48, help="synthetic images when --images is not given")
+    parser.add_argument("--calibration", type=int, default=32, help="images used to calibrate INT8 variants")
+    parser.add_argument("--variants", nargs="+", default=DEFAULT_VARIANTS,
+                        help="MODEL_OPTIMIZE specs; '' is the float model")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.images:
+        paths = sorted(glob.glob(args.images, recursive=True))
+        if len(paths) <= args.calibration:
+            raise SystemExit(f"Need more than --calibration={args.calibration} images, found {len(paths)}")
+        data = []
+        for p in paths:
+            with open(p, "rb") as f:
+                data.append(f.read())
+    else:
+        data = [synthetic_photo(640, 480, seed=i) for i in range(args.synthetic)]
+    images = torch.stack([to_tensor(decode_image(d)) for d in data])
+    calibration = [images[i:i + 8] for i in range(0, args.calibration, 8)]
+    holdout = images[args.calibration:]
+    print(f"{len(calibration) * 8} calibration / {len(holdout)} held-out images, "
+          f"{torch.get_num_threads()} torch threads")
+
+    float_model = load_model(WEIGHTS_PATH, DEVICE, NUM_CLASSES)
+    reference = predict(float_model, holdout)
+    ref_top1 = reference.argmax(dim=1)
+
+    header = " ".join(f"{f'img/s bs={bs}':>11}" for bs in args.batch_sizes)
+    print(f"{'variant':<28} {'top-1 agree':>11} {'max |dp|':>9} {header} {'size MB':>8} {'+RSS MB':>8} {'build s':>8}")
+    for spec in args.variants:
+        rss_before = rss_mb()
+        t0 = time.perf_counter()
+        model = optimize_model(float_model, parse_optimizations(spec), calibration, device=DEVICE)
+        build_s = time.perf_counter() - t0
+        probs = predict(model, holdout)
+        agree = float((probs.argmax(dim=1) == ref_top1).float().mean())
+        max_dp = float((probs - reference).abs().max())
+        rates = " ".join(f"{throughput(model, bs, args.repeat):>11.1f}" for bs in args.batch_sizes)
+        rss_delta = rss_mb() - rss_before
+        print(f"{spec or 'float':<28} {agree:>11.1%} {max_dp:>9.4f} {rates} {serialized_mb(model):>8} "
+              f"{rss_delta:>8.1f} {build_s:>8.1f}")
+        del model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark: decode + resize cost and parity of the /predict preprocessing paths.
+
+Compares the original ``TRANSFORM(Image.open(...).convert("RGB"))`` with the
+decode backends in preprocessing.py (PIL full decode, PIL JPEG draft decode,
+torchvision decode + torch resize) on phone-size JPEGs, reporting per-image time,
+pixel difference from TRANSFORM and top-1 agreement of the loaded model.
+
+Run from this directory (it imports app.py, which loads plant-disease-model.pth).
+Pass real photos with --images, otherwise synthetic 12/8/2 MP JPEGs are generated:
+
+    python bench_preprocessing.py --images 'samples/*.jpg' --repeat 5
+"""
+import argparse
+import glob
+import io
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from app import DEVICE, MODEL
+from preprocessing import IMAGE_SIZE, decode_image_pil, decode_image_torch, to_tensor
+from torchvision import transforms
+
+# The preprocessing /predict originally used.
+TRANSFORM = transforms.Compose([transforms.Resize(IMAGE_SIZE), transforms.ToTensor()])
+
+BACKENDS = {
+    "pil": lambda data: decode_image_pil(data, draft=False),
+    "pil+draft": lambda data: decode_image_pil(data, draft=True),
+    "torch": decode_image_torch,
+}
+
+
+def synthetic_photo(width: int, height: int, seed: int) -> bytes:
+    # Smooth colour field + leaf-vein-like stripes + sensor noise, saved like a phone JPEG.
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    green = 120 + 60 * np.sin(xx / width * 3 + seed) * np.cos(yy / height * 2)
+    veins = 25 * np.sin((xx + yy) / 37.0) * np.sin((xx - yy) / 91.0)
+    rgb = np.stack([green * 0.6 + veins, green + veins, green * 0.4], axis=-1)
+    rgb += rng.normal(0, 6, rgb.shape).astype(np.float32)
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def original(data: bytes) -> torch.Tensor:
+    return TRANSFORM(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+def median_ms(fn, data: bytes, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times)) * 1000.0
+
+
+def top1(batch: torch.Tensor) -> torch.Tensor:
+    with torch.no_grad():
+        return MODEL(batch.to(DEVICE)).argmax(dim=1).cpu()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="glob of sample photos (default: synthetic phone-size JPEGs)")
+    parser.add_argument("--sizes", nargs="+", default=["4032x3024", "3264x2448", "1600x1200"])
+    parser.add_argument("--per-size", type=int, default=4, help="synthetic images per size")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.images:
+        paths = sorted(glob.glob(args.images))
+        if not paths:
+            raise SystemExit(f"No files match {args.images}")
+        images = []
+        for p in paths:
+            with open(p, "rb") as f:
+                images.append(f.read())
+    else:
+        images = [synthetic_photo(*map(int, size.split("x")), seed=i)
+                  for size in args.sizes for i in range(args.per_size)]
+    print(f"{len(images)} images, mean {np.mean([len(d) for d in images]) / 1e6:.2f} MB")
+
+    reference = torch.stack([original(d) for d in images])
+    ref_top1 = top1(reference)
+    baseline = np.mean([median_ms(original, d, args.repeat) for d in images])
+
+    print(f"{'path':<12} {'ms/image':>9} {'speedup':>8} {'mean |diff|':>12} {'max |diff|':>11} {'top-1 agree':>12}")
+    print(f"{'TRANSFORM':<12} {baseline:>9.1f} {1.0:>7.2f}x {0.0:>12.4f} {0.0:>11.4f} {1.0:>12.1%}")
+    for name, fn in BACKENDS.items():
+        ms = np.mean([median_ms(fn, d, args.repeat) for d in images])
+        batch = torch.stack([to_tensor(fn(d)) for d in images])
+        diff = (batch - reference).abs()
+        agree = float((top1(batch) == ref_top1).float().mean())
+        print(f"{name:<12} {ms:>9.1f} {baseline / ms:>7.2f}x {diff.mean().item():>12.4f} "
+              f"{diff.max().item():>11.4f} {agree:>12.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Classify every image in a folder, .zip or uncompressed .tar archive.
+
+Images are read and decoded by DataLoader worker processes with the same
+decode path as /predict (preprocessing.decode_image: PIL, JPEG draft decoding
+with DECODE_DRAFT=1, 256x256 resize), batched, and run through the ResNet9 from model.py, optionally
+with the MODEL_OPTIMIZE variants from optimize.py. One result per image is
+streamed to CSV or JSONL (by output suffix) as batches finish; files that fail to
+decode are reported in the ``error`` column rather than stopping the run.
+
+    python classify_batch.py survey_0612.zip --output survey_0612.csv --workers 4
+    python classify_batch.py /data/drone/ --output drone.jsonl --optimize fold_bn,channels_last --top-k 3
+
+Workers only hold the uint8 image, so batches cross the process boundary at a
+quarter of the float size; conversion to float happens in the main process.
+"""
+import argparse
+import csv
+import json
+import os
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from classes import CLASSES, NUM_CLASSES
+from model import load_model
+from optimize import load_calibration, optimize_model, parse_optimizations
+from preprocessing import IMAGE_SIZE, decode_image
+
+# Not imported from app.py, which would load the model in every spawned worker.
+WEIGHTS_PATH = "plant-disease-model.pth"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+def is_image(name: str) -> bool:
+    return Path(name).suffix.lower() in IMAGE_SUFFIXES and not Path(name).name.startswith(".")
+
+
+class ImageSource(Dataset):
+    """Image files of a directory tree, zip or tar archive, in sorted name order.
+
+    Archive handles are opened lazily in each worker process, so the dataset
+    itself stays picklable for spawned DataLoader workers.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._handle = None
+        self._handle_pid = None
+        if os.path.isdir(self.path):
+            self.kind = "dir"
+            root = Path(self.path)
+            self.names = sorted(str(p.relative_to(root)) for p in root.rglob("*") if p.is_file() and is_image(p.name))
+            self.spans = None
+        elif zipfile.is_zipfile(self.path):
+            self.kind = "zip"
+            with zipfile.ZipFile(self.path) as zf:
+                self.names = sorted(i.filename for i in zf.infolist() if not i.is_dir() and is_image(i.filename))
+            self.spans = None
+        elif tarfile.is_tarfile(self.path):
+            self.kind = "tar"
+            try:
+                tf = tarfile.open(self.path, "r:")
+            except tarfile.ReadError:
+                raise ValueError(f"{self.path} is a compressed tar; random access needs an uncompressed .tar or .zip.")
+            with tf:
+                members = sorted((m for m in tf.getmembers() if m.isfile() and is_image(m.name)), key=lambda m: m.name)
+            self.names = [os.path.normpath(m.name) for m in members]
+            # Uncompressed tars are read by offset, so workers need no shared stream.
+            self.spans = [(m.offset_data, m.size) for m in members]
+        else:
+            raise ValueError(f"{self.path} is not a directory, zip or uncompressed tar archive.")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _open(self):
+        if self._handle is None or self._handle_pid != os.getpid():
+            self._handle = zipfile.ZipFile(self.path) if self.kind == "zip" else open(self.path, "rb")
+            self._handle_pid = os.getpid()
+        return self._handle
+
+    def read(self, index: int) -> bytes:
+        if self.kind == "dir":
+            return (Path(self.path) / self.names[index]).read_bytes()
+        if self.kind == "zip":
+            return self._open().read(self.names[index])
+        offset, size = self.spans[index]
+        handle = self._open()
+        handle.seek(offset)
+        return handle.read(size)
+
+    def __getitem__(self, index: int) -> Tuple[str, torch.Tensor, str]:
+        try:
+            image = torch.from_numpy(decode_image(self.read(index))).permute(2, 0, 1)
+            return self.names[index], image, ""
+        except Exception as e:
+            return self.names[index], torch.zeros(3, *IMAGE_SIZE, dtype=torch.uint8), f"{type(e).__name__}: {e}"
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_handle"] = state["_handle_pid"] = None
+        return state
+
+
+class ResultWriter:
+    """Writes one row per image to CSV or JSONL."""
+
+    def __init__(self, path: str, top_k: int):
+        self.jsonl = Path(path).suffix.lower() in (".jsonl", ".json")
+        self.file = open(path, "w", newline="")
+        self.top_k = top_k
+        if not self.jsonl:
+            self.csv = csv.writer(self.file)
+            header = ["path", "class", "confidence", "index", "error"]
+            for k in range(2, top_k + 1):
+                header += [f"class_{k}", f"confidence_{k}"]
+            self.csv.writerow(header)
+
+    def write(self, name: str, top: Optional[List[Tuple[int, float]]], error: str) -> None:
+        if self.jsonl:
+            record = {"path": name}
+            if top:
+                record.update({"class": CLASSES[top[0][0]], "confidence": top[0][1], "index": top[0][0]})
+                if self.top_k > 1:
+                    record["top_k"] = [{"class": CLASSES[i], "confidence": c} for i, c in top]
+            if error:
+                record["error"] = error
+            self.file.write(json.dumps(record) + "\n")
+            return
+        row = [name, "", "", "", error]
+        if top:
+            row[1:4] = [CLASSES[top[0][0]], f"{top[0][1]:.6f}", top[0][0]]
+            for i, c in top[1:]:
+                row += [CLASSES[i], f"{c:.6f}"]
+        self.csv.writerow(row)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="directory, .zip or uncompressed .tar of images")
+    parser.add_argument("--output", help="results .csv or .jsonl (default: <source>_predictions.csv)")
+    parser.add_argument("--weights", default=WEIGHTS_PATH)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="DataLoader decode processes; 0 decodes in this process")
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--optimize", default=os.environ.get("MODEL_OPTIMIZE", ""),
+                        help="comma-separated optimize.py variants, e.g. fold_bn,channels_last or int8")
+    parser.add_argument("--calibration-dir", default=os.environ.get("MODEL_CALIBRATION_DIR"),
+                        help="images used to calibrate int8")
+    parser.add_argument("--limit", type=int, help="only classify the first N images")
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    optimizations = parse_optimizations(args.optimize)
+    model = load_model(args.weights, device, NUM_CLASSES)
+    if optimizations:
+        calibration = load_calibration(args.calibration_dir) if "int8" in optimizations else None
+        model = optimize_model(model, optimizations, calibration, device=device)
+
+    source = ImageSource(args.source)
+    if args.limit:
+        source.names = source.names[:args.limit]
+    output = args.output or str(Path(args.source.rstrip("/")).with_suffix("")) + "_predictions.csv"
+    # spawn, as for the app's decode pool: forking after torch has started its thread pools can deadlock.
+    loader = DataLoader(source, batch_size=args.batch_size, num_workers=args.workers,
+                        multiprocessing_context="spawn" if args.workers > 0 else None,
+                        prefetch_factor=4 if args.workers > 0 else None, pin_memory=device.type == "cuda")
+
+    print(f"{len(source)} images from {args.source} ({source.kind}), device={device}, "
+          f"optimizations={list(optimizations)}, workers={args.workers}")
+    writer = ResultWriter(output, args.top_k)
+    done = failed = 0
+    started = last_report = time.perf_counter()
+    try:
+        with torch.inference_mode():
+            for names, images, errors in loader:
+                ok = [i for i, error in enumerate(errors) if not error]
+                top = {}
+                if ok:
+                    batch = images[ok].to(device, non_blocking=True).float().div(255)
+                    probs = torch.softmax(model(batch), dim=1)
+                    conf, idx = probs.topk(args.top_k, dim=1)
+                    for row, i in enumerate(ok):
+                        top[i] = list(zip(idx[row].tolist(), conf[row].tolist()))
+                for i, name in enumerate(names):
+                    writer.write(name, top.get(i), errors[i])
+                done += len(names)
+                failed += len(names) - len(ok)
+                now = time.perf_counter()
+                if now - last_report >= 5:
+                    print(f"{done:>9}/{len(source)} images  {done / (now - started):>8.1f} img/s")
+                    last_report = now
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - started
+    print(f"Classified {done} images ({failed} failed to decode) in {seconds:.1f} s "
+          f"({done / max(seconds, 1e-9):.1f} img/s) -> {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Streaming multipart ingestion for image uploads.
+
+FastAPI's ``UploadFile`` parameters are filled by Starlette only after the whole
+request body has been read and spooled, so an oversized or non-image upload costs
+its full size in memory/disk and parse time before the handler can look at it.
+``read_uploads`` (``read_upload`` for a single file) parses the multipart body
+itself as it arrives from the socket:
+
+- a Content-Length above the cap is rejected before reading anything;
+- each file part is counted chunk by chunk and rejected (413) as soon as it
+  passes ``max_bytes``, or as soon as a part beyond ``max_files`` starts;
+- its first bytes are sniffed against the image signatures the decoder handles,
+  and anything else is rejected (415) with the first chunk of the file;
+- accepted data is kept as the received chunks and joined once, hashed on the
+  way in so the result-cache key needs no second pass over the bytes.
+
+``expand_archives`` turns zip uploads (accepted with ``sniff_image_or_zip``) into
+one upload per image member, under the same per-file and file-count limits.
+"""
+import hashlib
+import io
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from starlette.requests import Request
+
+try:
+    from python_multipart import MultipartParser
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Leading bytes of the formats PIL decodes for the model, by name.
+IMAGE_SIGNATURES = {
+    "jpeg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "gif": (b"GIF87a", b"GIF89a"),
+    "bmp": (b"BM",),
+    "tiff": (b"II*\x00", b"MM\x00*"),
+}
+ZIP_SIGNATURES = (b"PK\x03\x04",)
+SNIFF_BYTES = 12
+# Allowance for the multipart framing (boundaries, part headers, other small fields).
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+def sniff_image(head: bytes) -> Optional[str]:
+    """Format name of an image header (at least SNIFF_BYTES long when available), else None."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for name, signatures in IMAGE_SIGNATURES.items():
+        if head.startswith(signatures):
+            return name
+    return None
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str, reason: str, bytes_read: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.reason = reason
+        self.bytes_read = bytes_read
+
+
+@dataclass
+class Upload:
+    data: bytes
+    filename: Optional[str]
+    format: Optional[str]
+    digest: str
+    # Request body bytes read from the client, framing included (for archive
+    # members: their compressed size).
+    bytes_read: int
+
+
+class _PartCollector:
+    """python-multipart callbacks that keep the parts of one named field, checking
+    each as it grows: at most ``max_files`` parts of at most ``max_bytes`` each, or
+    ``format_limits[format]`` once the part has been sniffed as that format."""
+
+    def __init__(self, field: str, max_bytes: int, sniff: Callable[[bytes], Optional[str]], max_files: int = 1,
+                 format_limits: Optional[Dict[str, int]] = None):
+        self.field = field
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.format_limits = format_limits or {}
+        self.sniff = sniff
+        self.bytes_read = 0
+        self.uploads: List[Upload] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._start_part(False)
+
+    def reject(self, status_code: int, detail: str, reason: str):
+        raise UploadRejected(status_code, detail, reason, self.bytes_read)
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _start_part(self, active: bool, filename: Optional[str] = None):
+        self._active = active
+        self.filename = filename
+        self.format = None
+        self.limit = self.max_bytes
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self._hash = hashlib.blake2b(digest_size=16)
+        self._head = b""
+
+    def _part_begin(self):
+        self._headers = {}
+        self._active = False
+
+    def _header_field_data(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("latin-1") != self.field:
+            return
+        if len(self.uploads) >= self.max_files:
+            self.reject(413, f"At most {self.max_files} file(s) per request.", "too_many_files")
+        filename = options.get(b"filename")
+        self._start_part(True, filename.decode("utf-8", "replace") if filename is not None else None)
+
+    def _part_data(self, data, start, end):
+        if not self._active:
+            return
+        piece = data[start:end]
+        self.size += len(piece)
+        if self.format is None:
+            self._head += piece[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_format()
+        if self.size > self.limit:
+            name = f"'{self.filename}'" if self.filename else "Upload"
+            self.reject(413, f"{name} exceeds the limit of {self.limit} bytes.", "too_large")
+        self.chunks.append(piece)
+        self._hash.update(piece)
+
+    def _part_end(self):
+        if not self._active:
+            return
+        if self.size == 0:
+            self.reject(422, "Uploaded file is empty.", "empty")
+        if self.format is None:
+            self._check_format()
+        self.uploads.append(Upload(
+            data=b"".join(self.chunks),
+            filename=self.filename,
+            format=self.format,
+            digest=self._hash.hexdigest(),
+            bytes_read=0,
+        ))
+        self._start_part(False)
+
+    def _check_format(self):
+        self.format = self.sniff(self._head[:SNIFF_BYTES])
+        if self.format is None:
+            name = f" '{self.filename}'" if self.filename else ""
+            self.reject(415, f"Upload{name} is not a supported image (JPEG, PNG, WebP, GIF, BMP or TIFF).", "not_image")
+        self.limit = self.format_limits.get(self.format, self.max_bytes)
+
+
+async def read_uploads(request: Request, field: str = "files", max_bytes: int = 10 * 1024 * 1024,
+                       max_files: int = 32, max_total: Optional[int] = None,
+                       sniff: Callable[[bytes], Optional[str]] = sniff_image,
+                       format_limits: Optional[Dict[str, int]] = None) -> List[Upload]:
+    """Read every ``field`` file of a multipart/form-data request as it streams in; see
+    the module docstring. Each file is capped at ``max_bytes`` (``format_limits`` may
+    set other caps per sniffed format, e.g. for archives) and their sum (with the
+    framing) at ``max_total`` (default: ``max_files * max_bytes``).
+
+    Raises UploadRejected (with an HTTP status) for oversized, non-image, missing or
+    malformed uploads.
+    """
+    collector = _PartCollector(field, max_bytes, sniff, max_files, format_limits)
+    max_total = max_files * max_bytes if max_total is None else max_total
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        collector.reject(415, "Expected a multipart/form-data upload.", "not_multipart")
+    body_limit = max_total + MULTIPART_OVERHEAD
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > body_limit:
+        collector.reject(413, f"Upload exceeds the limit of {max_total} bytes.", "too_large")
+
+    parser = MultipartParser(options[b"boundary"], collector.callbacks())
+    async for chunk in request.stream():
+        collector.bytes_read += len(chunk)
+        if collector.bytes_read > body_limit:
+            collector.reject(413, f"Upload exceeds the limit of {max_total} bytes.", "too_large")
+        try:
+            parser.write(chunk)
+        except UploadRejected:
+            raise
+        except Exception as e:
+            collector.reject(400, f"Malformed multipart body: {e}", "malformed")
+    try:
+        parser.finalize()
+    except UploadRejected:
+        raise
+    except Exception as e:
+        collector.reject(400, f"Malformed multipart body: {e}", "malformed")
+
+    if not collector.uploads:
+        collector.reject(422, f"No '{field}' file in the upload.", "missing")
+    # Request bytes are attributed to the first file, so the sum stays the body size.
+    collector.uploads[0].bytes_read = collector.bytes_read
+    return collector.uploads
+
+
+async def read_upload(request: Request, field: str = "file", max_bytes: int = 10 * 1024 * 1024,
+                      sniff: Callable[[bytes], Optional[str]] = sniff_image) -> Upload:
+    """The single ``field`` file of a multipart/form-data request; see read_uploads."""
+    uploads = await read_uploads(request, field, max_bytes, max_files=1, sniff=sniff)
+    return uploads[0]
+
+
+def sniff_image_or_zip(head: bytes) -> Optional[str]:
+    """sniff_image(), also accepting zip archives (to be expanded with expand_archives)."""
+    if head.startswith(ZIP_SIGNATURES):
+        return "zip"
+    return sniff_image(head)
+
+
+def expand_archives(uploads: List[Upload], max_files: int, max_bytes: int,
+                    max_members: Optional[int] = None, max_total: Optional[int] = None,
+                    sniff: Callable[[bytes], Optional[str]] = sniff_image) -> List[Upload]:
+    """Replace each zip upload by its image members, in name order. Members that are not
+    images (by content) are skipped, as classify_batch.py does for directories; the
+    result is capped at ``max_files`` images of at most ``max_bytes`` (uncompressed) each.
+
+    Only the first SNIFF_BYTES of a member are decompressed before it is skipped or
+    kept. Each archive may hold at most ``max_members`` files (default ``4 * max_files``,
+    skipped ones included). ``max_total`` (default ``max_files * max_bytes``) caps the
+    image bytes of the whole request: plain uploads plus every unpacked member.
+    Blocking: call it off the event loop.
+    """
+    max_members = 4 * max_files if max_members is None else max_members
+    max_total = max_files * max_bytes if max_total is None else max_total
+    out: List[Upload] = []
+    total = sum(len(upload.data) for upload in uploads if upload.format != "zip")
+    if total > max_total:
+        raise UploadRejected(413, f"Uploaded images exceed {max_total} bytes in total.", "too_large", 0)
+    for upload in uploads:
+        if upload.format != "zip":
+            out.append(upload)
+            continue
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(upload.data))
+            members = sorted((i for i in archive.infolist() if not i.is_dir()), key=lambda i: i.filename)
+        except (zipfile.BadZipFile, ValueError) as e:
+            raise UploadRejected(400, f"Unreadable zip archive '{upload.filename}': {e}", "bad_archive", 0)
+        members = [i for i in members
+                   if not i.filename.rsplit("/", 1)[-1].startswith(".") and not i.filename.startswith("__MACOSX/")]
+        if len(members) > max_members:
+            raise UploadRejected(413, f"'{upload.filename}' holds more than {max_members} files.", "too_many_files", 0)
+        with archive:
+            for info in members:
+                try:
+                    with archive.open(info) as member:
+                        head = member.read(SNIFF_BYTES)
+                        fmt = sniff(head)
+                        if fmt is None:
+                            continue
+                        # ZipExtFile stops at the declared size, so checking it bounds the read.
+                        if info.file_size > max_bytes:
+                            raise UploadRejected(413, f"'{info.filename}' exceeds the limit of {max_bytes} bytes.",
+                                                 "too_large", 0)
+                        if len(out) >= max_files:
+                            raise UploadRejected(413, f"At most {max_files} images per request.", "too_many_files", 0)
+                        total += info.file_size
+                        if total > max_total:
+                            raise UploadRejected(
+                                413, f"Uploaded images exceed {max_total} bytes in total once unpacked.", "too_large", 0)
+                        data = head + member.read()
+                except (zipfile.BadZipFile, RuntimeError, NotImplementedError, EOFError) as e:
+                    raise UploadRejected(400, f"Unreadable zip member '{info.filename}': {e}", "bad_archive", 0)
+                out.append(Upload(
+                    data=data,
+                    filename=f"{upload.filename or 'archive.zip'}/{info.filename}",
+                    format=fmt,
+                    digest=hashlib.blake2b(data, digest_size=16).hexdigest(),
+                    bytes_read=info.compress_size,
+                ))
+    if not out:
+        raise UploadRejected(422, "No images found in the upload.", "missing", 0)
+    return out
@@ -0,0 +1,73 @@
+from typing import Any, Dict
+
+import torch
+import torch.nn as nn
+
+
+def ConvBlock(in_channels: int, out_channels: int, pool: bool = False) -> nn.Sequential:
+    layers = [
+        nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1),
+        nn.BatchNorm2d(out_channels),
+        nn.ReLU(inplace=True),
+    ]
+    if pool:
+        layers.append(nn.MaxPool2d(4))
+    return nn.Sequential(*layers)
+
+
+class ResNet9(nn.Module):
+    def __init__(self, in_channels: int, num_diseases: int):
+        super().__init__()
+        self.conv1 = ConvBlock(in_channels, 64)
+        self.conv2 = ConvBlock(64, 128, pool=True)
+        self.res1 = nn.Sequential(ConvBlock(128, 128), ConvBlock(128, 128))
+        self.conv3 = ConvBlock(128, 256, pool=True)
+        self.conv4 = ConvBlock(256, 512, pool=True)
+        self.res2 = nn.Sequential(ConvBlock(512, 512), ConvBlock(512, 512))
+        self.classifier = nn.Sequential(
+            nn.MaxPool2d(4),
+            nn.Flatten(),
+            nn.Linear(512, num_diseases),
+        )
+
+    def forward(self, xb: torch.Tensor) -> torch.Tensor:
+        out = self.conv1(xb)
+        out = self.conv2(out)
+        out = self.res1(out) + out
+        out = self.conv3(out)
+        out = self.conv4(out)
+        out = self.res2(out) + out
+        out = self.classifier(out)
+        return out
+
+def _strip_module_prefix(state_dict: Dict[str, Any]) -> Dict[str, Any]:
+    if not any(k.startswith("module.") for k in state_dict.keys()):
+        return state_dict
+    return {k.replace("module.", "", 1): v for k, v in state_dict.items()}
+
+
+def load_model(weights_path: str, device: torch.device, num_classes: int = 38) -> nn.Module:
+    model = ResNet9(in_channels=3, num_diseases=num_classes).to(device)
+
+    obj = torch.load(weights_path, map_location=device)
+    if isinstance(obj, nn.Module):
+        model = obj.to(device)
+        model.eval()
+        return model
+
+    if isinstance(obj, dict) and "state_dict" in obj:
+        state_dict = obj["state_dict"]
+    elif isinstance(obj, dict):
+        state_dict = obj
+    else:
+        raise RuntimeError("Unsupported checkpoint format. Expected state_dict or nn.Module.")
+
+    state_dict = _strip_module_prefix(state_dict)
+
+    try:
+        model.load_state_dict(state_dict, strict=True)
+    except Exception:
+        model.load_state_dict(state_dict, strict=False)
+
+    model.eval()
+    return model
@@ -0,0 +1,119 @@
+"""CPU inference variants of the ResNet9 model, selected at startup.
+
+``MODEL_OPTIMIZE`` is a comma-separated list of:
+
+- ``fold_bn``: fold each BatchNorm into the preceding convolution (Conv+BN+ReLU fused).
+- ``channels_last``: NHWC weights and inputs, the layout oneDNN/fbgemm convolutions prefer.
+- ``int8``: static post-training INT8 quantization (FX graph mode, BatchNorm folded as
+  part of it), calibrated on the images in ``MODEL_CALIBRATION_DIR``. Dynamic
+  quantization is not offered: it only covers the final Linear layer here.
+- ``jit``: trace and freeze with TorchScript (float variants also get
+  ``optimize_for_inference``).
+- ``compile``: ``torch.compile`` the model, warmed up once at startup.
+
+Check top-1 agreement and throughput before enabling a variant with
+bench_optimize.py.
+"""
+import copy
+import glob
+import os
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+from preprocessing import IMAGE_SIZE, decode_image, to_tensor
+
+OPTIMIZATIONS = ("fold_bn", "channels_last", "int8", "jit", "compile")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def parse_optimizations(spec: str) -> Tuple[str, ...]:
+    names = tuple(name.strip() for name in spec.split(",") if name.strip())
+    unknown = [name for name in names if name not in OPTIMIZATIONS]
+    if unknown:
+        raise ValueError(f"Unknown MODEL_OPTIMIZE option(s) {unknown}, expected any of {OPTIMIZATIONS}.")
+    if "jit" in names and "compile" in names:
+        raise ValueError("MODEL_OPTIMIZE: choose either 'jit' or 'compile', not both.")
+    return names
+
+
+class ChannelsLast(nn.Module):
+    """Converts incoming NCHW batches to channels-last before the wrapped model."""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, xb: torch.Tensor) -> torch.Tensor:
+        return self.model(xb.contiguous(memory_format=torch.channels_last))
+
+
+def fold_batchnorm(model: nn.Module) -> nn.Module:
+    model = copy.deepcopy(model).eval()
+    groups = [
+        [f"{name}.0", f"{name}.1", f"{name}.2"]
+        for name, module in model.named_modules()
+        if isinstance(module, nn.Sequential) and len(module) >= 3
+        and isinstance(module[0], nn.Conv2d) and isinstance(module[1], nn.BatchNorm2d)
+        and isinstance(module[2], nn.ReLU)
+    ]
+    return torch.ao.quantization.fuse_modules(model, groups)
+
+
+def quantize_int8(model: nn.Module, calibration: Iterable[torch.Tensor], backend: str = "x86") -> nn.Module:
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    batches = list(calibration)
+    if not batches:
+        raise ValueError("INT8 quantization needs at least one calibration batch.")
+    torch.backends.quantized.engine = backend
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(backend), (batches[0],))
+    with torch.no_grad():
+        for batch in batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def load_calibration(path: Optional[str], batch_size: int = 8, limit: int = 256) -> List[torch.Tensor]:
+    """Decode up to ``limit`` images from a directory (or glob) into batches."""
+    if not path:
+        raise ValueError("MODEL_OPTIMIZE=int8 needs MODEL_CALIBRATION_DIR pointing at sample leaf images.")
+    pattern = os.path.join(path, "**", "*") if os.path.isdir(path) else path
+    files = sorted(f for f in glob.glob(pattern, recursive=True) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    if not files:
+        raise ValueError(f"No calibration images found in {path}.")
+    tensors = []
+    for f in files:
+        with open(f, "rb") as fh:
+            tensors.append(to_tensor(decode_image(fh.read())))
+    return [torch.stack(tensors[i:i + batch_size]) for i in range(0, len(tensors), batch_size)]
+
+
+def optimize_model(model: nn.Module, optimizations: Sequence[str],
+                   calibration: Optional[Iterable[torch.Tensor]] = None,
+                   device: torch.device = torch.device("cpu")) -> nn.Module:
+    """Return an inference-only variant of ``model``; the original is left untouched."""
+    if not optimizations:
+        return model
+    if "int8" in optimizations and device.type != "cpu":
+        raise ValueError("MODEL_OPTIMIZE=int8 is CPU-only.")
+    example = torch.rand(1, 3, *IMAGE_SIZE, device=device)
+    model = copy.deepcopy(model).eval()
+    if "int8" in optimizations:
+        model = quantize_int8(model, calibration or [])
+    elif "fold_bn" in optimizations:
+        model = fold_batchnorm(model)
+    if "channels_last" in optimizations:
+        model = ChannelsLast(model.to(memory_format=torch.channels_last)).eval()
+
+    with torch.no_grad():
+        if "jit" in optimizations:
+            model = torch.jit.freeze(torch.jit.trace(model, example).eval())
+            if "int8" not in optimizations:
+                model = torch.jit.optimize_for_inference(model)
+        elif "compile" in optimizations:
+            model = torch.compile(model)
+        model(example)
+    return model
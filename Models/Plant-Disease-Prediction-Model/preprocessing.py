@@ -0,0 +1,77 @@
+import io
+import os
+from typing import List, Union
+
+import numpy as np
+from PIL import Image
+
+# torch / torchvision are imported inside the functions that need them, so decode
+# worker processes on the PIL path start without loading either.
+
+IMAGE_SIZE = (256, 256)
+
+
+def RESIZE(img: Image.Image) -> Image.Image:
+    # Same call torchvision's Resize(IMAGE_SIZE) makes for a PIL image.
+    return img.resize(IMAGE_SIZE[::-1], Image.BILINEAR)
+
+# DECODE_BACKEND=pil decodes with PIL; for JPEGs DECODE_DRAFT=1 (opt-in) lets
+# libjpeg decode at 1/2, 1/4 or 1/8 scale as long as the result stays at least
+# IMAGE_SIZE, which skips most of the IDCT work on phone photos before the same
+# RESIZE. It changes the pixels the model sees, so check top-1 agreement with
+# bench_preprocessing.py on the trained checkpoint before enabling it.
+# DECODE_BACKEND=torch decodes with torchvision.io straight to a uint8 tensor and
+# resizes in torch (antialiased). See bench_preprocessing.py.
+DECODE_BACKEND = os.environ.get("DECODE_BACKEND", "pil")
+DECODE_DRAFT = os.environ.get("DECODE_DRAFT", "0") != "0"
+if DECODE_BACKEND not in ("pil", "torch"):
+    raise ValueError(f"Unknown DECODE_BACKEND '{DECODE_BACKEND}', expected 'pil' or 'torch'.")
+
+
+# decode_image() runs in the decode worker pool (possibly a separate process), so it
+# lives here rather than in app.py and returns a compact uint8 HWC array; to_tensor()
+# finishes the job in the serving process exactly like ToTensor() would.
+def decode_image(image_bytes: bytes) -> np.ndarray:
+    if DECODE_BACKEND == "torch":
+        return decode_image_torch(image_bytes)
+    return decode_image_pil(image_bytes, draft=DECODE_DRAFT)
+
+
+def decode_images(images: List[bytes]) -> List[Union[np.ndarray, str]]:
+    """decode_image() over several images in one pool call; a file that fails to
+    decode gives its error message instead of stopping the rest."""
+    out = []
+    for image_bytes in images:
+        try:
+            out.append(decode_image(image_bytes))
+        except Exception as e:
+            out.append(f"Could not decode image ({type(e).__name__}).")
+    return out
+
+
+def decode_image_pil(image_bytes: bytes, draft: bool = True) -> np.ndarray:
+    img = Image.open(io.BytesIO(image_bytes))
+    if draft and img.format == "JPEG":
+        img.draft("RGB", IMAGE_SIZE)
+    return np.array(RESIZE(img.convert("RGB")), dtype=np.uint8)
+
+
+def decode_image_torch(image_bytes: bytes) -> np.ndarray:
+    import torch
+    import torchvision.transforms.functional as F
+    from torchvision.io import ImageReadMode, decode_image as tv_decode_image
+
+    data = torch.frombuffer(bytearray(image_bytes), dtype=torch.uint8)
+    img = tv_decode_image(data, mode=ImageReadMode.RGB)
+    return F.resize(img, list(IMAGE_SIZE), antialias=True).permute(1, 2, 0).numpy()
+
+
+def to_tensor(image: np.ndarray) -> "torch.Tensor":
+    import torch
+    return torch.from_numpy(image).permute(2, 0, 1).float().div(255)
+
+
+def to_batch_tensor(images: List[np.ndarray]) -> "torch.Tensor":
+    """to_tensor() of several same-sized images, stacked into one NCHW batch."""
+    import torch
+    return torch.from_numpy(np.stack(images)).permute(0, 3, 1, 2).float().div(255)
@@ -0,0 +1,134 @@
+"""Benchmark: import-time profile and cold start of the three model APIs.
+
+First, ``python -X importtime`` is run on each service's app.py with eager and
+LAZY_STARTUP=1 loading, and the packages it imports directly with the largest
+cumulative time are listed. Then each service is started under uvicorn per mode:
+
+    eager   model loaded at import, before uvicorn accepts connections
+    lazy    LAZY_STARTUP=1: serves /health at once, loads in the background
+    warm    LAZY_STARTUP=1 WARMUP=1: also runs one dummy prediction after loading
+
+and the time until /health answers and until the first prediction succeeds
+(retrying while the app answers 503) is reported.
+
+Run from this directory; the service directories must contain their model files
+(or point at copies with --crop-dir/--yield-dir/--disease-dir):
+
+    python bench_coldstart.py --image leaf.jpg --top 8
+"""
+import argparse
+import io
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+from collections import defaultdict
+from pathlib import Path
+
+from bench_server import CROP_BODY, MODELS_DIR, YIELD_BODY, post_image, post_json, start, wait_for
+from server import SERVICES
+
+MODES = {
+    "eager": {"LAZY_STARTUP": "0", "WARMUP": "0"},
+    "lazy": {"LAZY_STARTUP": "1", "WARMUP": "0"},
+    "warm": {"LAZY_STARTUP": "1", "WARMUP": "1"},
+}
+
+
+def import_profile(directory, env):
+    """Seconds spent importing app.py, and the cumulative time of each package it imports directly."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=directory, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {directory}/app.py failed:\n{proc.stderr[-2000:]}")
+    packages, total = defaultdict(float), 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Children are listed before their parent, indented two spaces per level.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == "app":
+            total = int(cumulative) / 1e6
+        elif depth == 1:
+            packages[name.strip().split(".")[0]] += int(cumulative) / 1e6
+    return packages, total
+
+
+def first_prediction(name, base, image, timeout=600):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if name == "crop":
+                return post_json(base + "/predict", CROP_BODY)
+            if name == "yield":
+                return post_json(base + "/predict", YIELD_BODY)
+            return post_image(base + "/predict", image)
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+            time.sleep(0.05)
+    raise TimeoutError(f"{name} did not become ready")
+
+
+def cold_start(name, directory, port, env, image):
+    t0 = time.perf_counter()
+    proc = start("app:app", directory, port, env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(base + "/health", proc)
+        health = time.perf_counter() - t0
+        first_prediction(name, base, image)
+        first = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        first_prediction(name, base, image)
+        second = time.perf_counter() - t1
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return health, first, second
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, folder in SERVICES.items():
+        parser.add_argument(f"--{name}-dir", default=str(MODELS_DIR / folder))
+    parser.add_argument("--image", help="leaf photo for the disease model (default: synthetic)")
+    parser.add_argument("--services", default=",".join(SERVICES))
+    parser.add_argument("--top", type=int, default=6, help="imports to list per service")
+    parser.add_argument("--port", type=int, default=8700)
+    args = parser.parse_args()
+
+    if args.image:
+        image = Path(args.image).read_bytes()
+    else:
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new("RGB", (1024, 768), (60, 140, 50)).save(buf, format="JPEG")
+        image = buf.getvalue()
+    names = [n.strip() for n in args.services.split(",") if n.strip()]
+    dirs = {name: str(Path(getattr(args, f"{name}_dir")).absolute()) for name in names}
+
+    for name in names:
+        for mode in ("eager", "lazy"):
+            packages, total = import_profile(dirs[name], dict(os.environ, **MODES[mode]))
+            top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+            print(f"{name} import ({mode}): {total:.2f} s  " + "  ".join(f"{p} {s:.2f}" for p, s in top))
+    print()
+
+    print(f"{'service':<9} {'mode':<6} {'health s':>9} {'first s':>9} {'next s':>9}")
+    for name in names:
+        for mode, overrides in MODES.items():
+            health, first, second = cold_start(name, dirs[name], args.port, dict(os.environ, **overrides), image)
+            print(f"{name:<9} {mode:<6} {health:>9.2f} {first:>9.2f} {second:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Benchmark: three per-model uvicorn processes vs. the unified server.py.
+
+For each layout it starts the process(es), then reports time until /health
+answers, time to the first prediction of every model (for server.py this
+includes the lazy load), and total RSS / PSS of the process tree (decode pool
+workers included) before and after one prediction per model.
+
+Run from this directory; the service directories must contain their model files
+(or point at copies with --crop-dir/--yield-dir/--disease-dir):
+
+    python bench_server.py --image leaf.jpg
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+
+from server import SERVICES
+
+MODELS_DIR = Path(__file__).resolve().parent
+
+CROP_BODY = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+YIELD_BODY = {"Crop": "Rice", "Crop_Year": 2000, "Season": "Kharif     ", "State": "Assam", "Area": 1000.0,
+              "Annual_Rainfall": 2000.0, "Fertilizer": 100000.0, "Pesticide": 300.0}
+
+
+def post_json(url, body):
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        return json.load(resp)
+
+
+def post_image(url, image):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"leaf.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + image + f"\r\n--{boundary}--\r\n".encode()
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        return json.load(resp)
+
+
+def wait_for(url, proc, timeout=600):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"process for {url} exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=5).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    raise TimeoutError(url)
+
+
+def process_tree(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pids.extend(int(c) for c in f.read().split())
+        except FileNotFoundError:
+            pass
+    return pids
+
+
+def memory_mb(root_pids):
+    rss = pss = 0
+    for pid in (p for root in root_pids for p in process_tree(root)):
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    key, value = line.split()[:2]
+                    if key == "Rss:":
+                        rss += int(value)
+                    elif key == "Pss:":
+                        pss += int(value)
+        except (FileNotFoundError, ProcessLookupError, ValueError):
+            pass
+    return rss / 1024, pss / 1024
+
+
+def start(args, cwd, port, env):
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", args, "--port", str(port), "--log-level", "warning"],
+                            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def predict_all(urls, image):
+    times = {}
+    for name, call in (("crop", lambda: post_json(urls["crop"] + "/predict", CROP_BODY)),
+                       ("yield", lambda: post_json(urls["yield"] + "/predict", YIELD_BODY)),
+                       ("disease", lambda: post_image(urls["disease"] + "/predict", image))):
+        t0 = time.perf_counter()
+        call()
+        times[name] = time.perf_counter() - t0
+    return times
+
+
+def run_layout(name, procs, health_urls, urls, image, t0):
+    try:
+        for proc, url in zip(procs, health_urls):
+            wait_for(url, proc)
+        ready = time.perf_counter() - t0
+        idle = memory_mb([p.pid for p in procs])
+        first = predict_all(urls, image)
+        loaded = memory_mb([p.pid for p in procs])
+    finally:
+        for proc in procs:
+            proc.send_signal(signal.SIGINT)
+        for proc in procs:
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    print(f"{name:<10} {ready:>8.1f} {first['crop']:>8.2f} {first['yield']:>8.2f} {first['disease']:>8.2f} "
+          f"{idle[0]:>9.0f} {idle[1]:>9.0f} {loaded[0]:>9.0f} {loaded[1]:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, folder in SERVICES.items():
+        parser.add_argument(f"--{name}-dir", default=str(MODELS_DIR / folder))
+    parser.add_argument("--image", help="leaf photo for the disease model (default: synthetic)")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+
+    if args.image:
+        image = Path(args.image).read_bytes()
+    else:
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new("RGB", (1024, 768), (60, 140, 50)).save(buf, format="JPEG")
+        image = buf.getvalue()
+    dirs = {name: str(Path(getattr(args, f"{name}_dir")).absolute()) for name in SERVICES}
+
+    print(f"{'layout':<10} {'ready s':>8} {'crop s':>8} {'yield s':>8} {'disease s':>8} "
+          f"{'idle RSS':>9} {'idle PSS':>9} {'RSS MB':>9} {'PSS MB':>9}")
+
+    env = dict(os.environ)
+    t0 = time.perf_counter()
+    ports = {name: args.port + i for i, name in enumerate(SERVICES)}
+    procs = [start("app:app", dirs[name], ports[name], env) for name in SERVICES]
+    urls = {name: f"http://127.0.0.1:{ports[name]}" for name in SERVICES}
+    run_layout("separate", procs, [u + "/health" for u in urls.values()], urls, image, t0)
+
+    env.update({f"SERVER_{name.upper()}_DIR": d for name, d in dirs.items()})
+    for label, preload in (("unified", ""), ("preloaded", "all")):
+        env["SERVER_PRELOAD"] = preload
+        t0 = time.perf_counter()
+        proc = start("server:app", str(MODELS_DIR), args.port, env)
+        base = f"http://127.0.0.1:{args.port}"
+        run_layout(label, [proc], [base + "/health"], {name: f"{base}/{name}" for name in SERVICES}, image, t0)
+
+
+if __name__ == "__main__":
+    main()
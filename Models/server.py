@@ -0,0 +1,211 @@
+"""Single-process server for all three model APIs.
+
+Each service's ``app.py`` is mounted unchanged under its own prefix:
+
+    /crop     Crop-Recomendation-Model
+    /yield    Crop-Yield-Prediction-Model
+    /disease  Plant-Disease-Prediction-Model
+
+A service is imported (and its startup handlers run) on the first request to its
+prefix, so unused models cost nothing; SERVER_PRELOAD=crop,yield (or "all") loads
+them at startup instead. Once loaded, its blocking work is moved onto thread pools
+shared by the whole process: crop and yield share the "tabular" pool
+(TABULAR_POOL_{WORKERS,QUEUE}) and the ResNet9 forward runs on the "torch" pool
+(TORCH_POOL_*), with torch limited to TORCH_THREADS intra-op threads. The
+plant-disease decode pool stays its own (DECODE_POOL_*). /metrics exposes the
+metrics of every loaded service in one Prometheus text page.
+
+Service code is always imported from the service directory above. Model files are
+read from that directory too, or from SERVER_<NAME>_DIR (a directory of model
+artifacts only): it is passed to the service as its MODEL_DIR, so the process
+working directory is never changed.
+
+    uvicorn server:app --port 8000
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI
+from starlette.responses import JSONResponse, Response
+
+MODELS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(MODELS_DIR))
+from serving import metrics
+from serving.executor import WorkerPool
+
+SERVICES = {
+    "crop": "Crop-Recomendation-Model",
+    "yield": "Crop-Yield-Prediction-Model",
+    "disease": "Plant-Disease-Prediction-Model",
+}
+
+TABULAR_POOL = WorkerPool.from_env("tabular", kind="thread")
+TORCH_POOL = WorkerPool.from_env("torch", kind="thread", max_workers=1, max_queue=4)
+for _pool in (TABULAR_POOL, TORCH_POOL):
+    # The services' models only exist in this process, so process workers would have none.
+    if _pool.kind != "thread":
+        raise ValueError(f"{_pool.name.upper()}_POOL_KIND={_pool.kind} is not supported, the shared pools run threads.")
+    _pool.shared = True
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", os.cpu_count() or 1))
+
+_LOAD_LOCK = asyncio.Lock()
+
+
+def _import_service(name: str, model_dir: Path):
+    # Every service has an app.py, so each is imported under its own module name;
+    # its code directory goes on sys.path for sibling modules (and pickled classes).
+    code_dir = MODELS_DIR / SERVICES[name]
+    if str(code_dir) not in sys.path:
+        sys.path.insert(1, str(code_dir))
+    spec = importlib.util.spec_from_file_location(f"{name}_service", code_dir / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    module.MODEL_DIR = str(model_dir)
+    sys.modules[spec.name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[spec.name]
+        raise
+    return module
+
+
+def _share_pools(name: str, module) -> None:
+    if name in ("crop", "yield"):
+        module.INFERENCE_POOL = TABULAR_POOL
+    elif name == "disease":
+        module.INFERENCE_POOL = TORCH_POOL
+        # With LAZY_STARTUP=1 the batcher is built later, from INFERENCE_POOL.
+        if module.BATCHER is not None:
+            module.BATCHER.pool = TORCH_POOL
+
+
+class LazyService:
+    """ASGI app that imports and starts a service on its first request."""
+
+    def __init__(self, name: str, model_dir: Path):
+        self.name = name
+        self.model_dir = model_dir
+        self.module = None
+        self.app: Optional[FastAPI] = None
+        self.load_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    async def load(self) -> FastAPI:
+        async with _LOAD_LOCK:
+            if self.app is not None:
+                return self.app
+            started = time.perf_counter()
+            try:
+                if self.name == "disease":
+                    import torch
+                    torch.set_num_threads(TORCH_THREADS)
+                loop = asyncio.get_running_loop()
+                # Importing is blocking (model files, torch); keep the loop serving other prefixes.
+                module = await loop.run_in_executor(None, _import_service, self.name, self.model_dir)
+                _share_pools(self.name, module)
+                for handler in module.app.router.on_startup:
+                    if asyncio.iscoroutinefunction(handler):
+                        await handler()
+                    else:
+                        await loop.run_in_executor(None, handler)
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                raise
+            self.module, self.app, self.error = module, module.app, None
+            self.load_seconds = time.perf_counter() - started
+            return self.app
+
+    async def shutdown(self) -> None:
+        if self.app is None:
+            return
+        for handler in self.app.router.on_shutdown:
+            if asyncio.iscoroutinefunction(handler):
+                await handler()
+            else:
+                handler()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "model_dir": str(self.model_dir),
+            "loaded": self.app is not None,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if self.app is None:
+            try:
+                await self.load()
+            except Exception:
+                response = JSONResponse(
+                    {"detail": f"Model service '{self.name}' failed to load: {self.error}"}, status_code=503)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def _model_dirs() -> Dict[str, Path]:
+    return {
+        name: Path(os.environ.get(f"SERVER_{name.upper()}_DIR", MODELS_DIR / folder)).absolute()
+        for name, folder in SERVICES.items()
+    }
+
+
+def _preload_list() -> List[str]:
+    spec = os.environ.get("SERVER_PRELOAD", "").strip()
+    if spec == "all":
+        return list(SERVICES)
+    names = [n.strip() for n in spec.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SERVICES]
+    if unknown:
+        raise ValueError(f"Unknown SERVER_PRELOAD service(s) {unknown}, expected any of {list(SERVICES)} or 'all'.")
+    return names
+
+
+services = {name: LazyService(name, model_dir) for name, model_dir in _model_dirs().items()}
+PRELOAD = _preload_list()
+
+app = FastAPI(title="KrishiSarthi Model Server")
+
+
+@app.on_event("startup")
+async def preload_services():
+    for name in PRELOAD:
+        await services[name].load()
+
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    for service in services.values():
+        await service.shutdown()
+    TABULAR_POOL.shutdown()
+    TORCH_POOL.shutdown()
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "services": {name: service.status() for name, service in services.items()},
+        "pools": {pool.name: pool.stats() for pool in (TABULAR_POOL, TORCH_POOL)},
+        "torch_threads": TORCH_THREADS,
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def all_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+for _name, _service in services.items():
+    app.mount(f"/{_name}", _service)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8000)))
@@ -0,0 +1 @@
+# Shared serving utilities for the model APIs in this directory.
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class ResultCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL.
+
+    Holds at most ``max_entries`` results; entries older than ``ttl`` seconds
+    count as misses and are dropped (``ttl=None`` keeps them until evicted).
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0):
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] <= now):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # For async handlers: the in-memory cache answers inline, the SQLite one off the loop.
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aput(self, key: str, value: Any) -> None:
+        self.put(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SQLiteResultCache(ResultCache):
+    """ResultCache stored in a SQLite file, so every worker on the host shares hits.
+
+    Values must be JSON-serialisable. Hit/miss counters are per process. Any
+    SQLite error (locked database, full disk, ...) is treated as a miss / skipped
+    write: the cache must never fail a request. Calls can block for up to
+    ``busy_timeout`` on a lock held by another worker, so ``aget`` / ``aput`` run
+    them in a thread.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 100_000, ttl: Optional[float] = 3600.0,
+                 busy_timeout: float = 0.2):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.path = path
+        self.errors = 0
+        self._writes = 0
+        # One connection shared by the pool threads; re-entrant because put() counts rows.
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def get(self, key: str) -> Optional[Any]:
+        # Wall-clock time: expiry stamps are shared with other processes.
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value FROM results WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                    (key, now)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            self.errors += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        expires = now + self.ttl if self.ttl else None
+        try:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                   (key, json.dumps(value), expires, now))
+                # COUNT(*) is a table scan, so the size bound is enforced every 64 writes.
+                self._writes += 1
+                excess = len(self) - self.max_entries if self._writes % 64 == 0 else 0
+                if excess > 0:
+                    # Drop expired rows first, then the least recently used ones.
+                    deleted = self._conn.execute(
+                        "DELETE FROM results WHERE key IN (SELECT key FROM results "
+                        "ORDER BY (expires IS NOT NULL AND expires <= ?) DESC, last_used ASC LIMIT ?)",
+                        (now, excess))
+                    self.evictions += max(deleted.rowcount, 0)
+        except sqlite3.Error:
+            self.errors += 1
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.put, key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            stats = super().stats()
+        except sqlite3.Error:
+            stats = {"backend": self.backend}
+        stats.update(path=self.path, errors=self.errors)
+        return stats
+
+
+def cache_from_env(prefix: str, max_entries: int = 1024, ttl: float = 3600.0) -> Optional[ResultCache]:
+    """Build a cache from ``<PREFIX>_CACHE_SIZE`` (0 disables it), ``<PREFIX>_CACHE_TTL``
+    (seconds, 0 = no expiry) and ``<PREFIX>_CACHE_PATH`` (SQLite file, shared by workers)."""
+    prefix = prefix.upper()
+    max_entries = int(os.environ.get(f"{prefix}_CACHE_SIZE", max_entries))
+    ttl = float(os.environ.get(f"{prefix}_CACHE_TTL", ttl)) or None
+    if max_entries <= 0:
+        return None
+    path = os.environ.get(f"{prefix}_CACHE_PATH")
+    if path:
+        return SQLiteResultCache(path, max_entries=max_entries, ttl=ttl)
+    return ResultCache(max_entries=max_entries, ttl=ttl)
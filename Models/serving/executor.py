@@ -0,0 +1,165 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+
+class PoolSaturated(HTTPException):
+    """Raised when a pool already has max_workers running and max_queue waiting."""
+
+    def __init__(self, pool_name: str, retry_after: int = 1):
+        super().__init__(
+            status_code=429,
+            detail=f"Server busy: '{pool_name}' pool is saturated, retry later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+# Called as fn(pool_name, wait_seconds, run_seconds) after every completed call, in
+# the caller's context (serving.metrics uses it for per-request stage timings).
+RUN_LISTENERS: List[Callable[[str, float, float], None]] = []
+
+
+def _timed_call(fn: Callable, args: tuple):
+    # Runs inside the worker (thread or process); wall-clock stamps so the
+    # caller can split queue wait from run time across process boundaries.
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+class WorkerPool:
+    """Bounded thread/process pool for offloading blocking work from the event loop.
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` more wait
+    for a worker; anything beyond that is rejected immediately with a 429 so a
+    burst of slow requests cannot stall ``/health`` and every other handler.
+
+    Use ``kind="thread"`` for calls that release the GIL (LightGBM, torch, NumPy)
+    and ``kind="process"`` for pure-Python / PIL work. Functions sent to a process
+    pool must be importable module-level callables.
+
+    A pool marked ``shared`` (server.py's pools, handed to several services) is
+    left running by the services' own shutdown hooks; its owner shuts it down.
+    """
+
+    def __init__(self, name: str, kind: str = "thread", max_workers: Optional[int] = None,
+                 max_queue: Optional[int] = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind '{kind}', expected 'thread' or 'process'.")
+        self.name = name
+        self.kind = kind
+        self.shared = False
+        self.max_workers = max(int(max_workers or os.cpu_count() or 1), 1)
+        self.max_queue = max(int(self.max_workers * 2 if max_queue is None else max_queue), 0)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_env(cls, name: str, kind: str = "thread", max_workers: Optional[int] = None,
+                 max_queue: Optional[int] = None) -> "WorkerPool":
+        """Build a pool whose settings can be overridden by ``<NAME>_POOL_KIND``,
+        ``<NAME>_POOL_WORKERS`` and ``<NAME>_POOL_QUEUE`` environment variables."""
+        prefix = name.upper()
+        kind = os.environ.get(f"{prefix}_POOL_KIND", kind)
+        if f"{prefix}_POOL_WORKERS" in os.environ:
+            max_workers = int(os.environ[f"{prefix}_POOL_WORKERS"])
+        if f"{prefix}_POOL_QUEUE" in os.environ:
+            max_queue = int(os.environ[f"{prefix}_POOL_QUEUE"])
+        return cls(name, kind=kind, max_workers=max_workers, max_queue=max_queue)
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "thread":
+                        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+                    else:
+                        # spawn, not fork: forking a process that already runs torch/OpenMP
+                        # thread pools can deadlock the child.
+                        self._executor = ProcessPoolExecutor(
+                            self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def warm_up(self, fn: Callable, *args: Any) -> None:
+        """Call ``fn`` once per worker so process workers are spawned (and their
+        imports done) at startup rather than on the first requests."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, fn, *args) for _ in range(self.max_workers)))
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(self.name)
+            self._in_flight += 1
+            self.submitted += 1
+
+        submitted = time.time()
+        try:
+            future = self.executor.submit(_timed_call, fn, args)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+                self.failed += 1
+            raise
+        # The slot is freed when the call actually ends, not when this coroutine stops
+        # waiting: a cancelled caller (client gone, timeout) leaves a running call behind,
+        # which still counts against the bound until it finishes.
+        future.add_done_callback(functools.partial(self._finished, submitted))
+        result, started, finished = await asyncio.wrap_future(future)
+        for listener in RUN_LISTENERS:
+            listener(self.name, max(started - submitted, 0.0), finished - started)
+        return result
+
+    def _finished(self, submitted: float, future: Future) -> None:
+        # Runs in a worker or executor management thread, or inline if cancelled before starting.
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+                return
+            _, started, finished = future.result()
+            wait = max(started - submitted, 0.0)
+            self.completed += 1
+            self._wait_total += wait
+            self._run_total += finished - started
+            self._wait_max = max(self._wait_max, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(self._in_flight - self.max_workers, 0),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "mean_wait_ms": self._wait_total / done * 1000.0,
+                "max_wait_ms": self._wait_max * 1000.0,
+                "mean_run_ms": self._run_total / done * 1000.0,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
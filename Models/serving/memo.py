@@ -0,0 +1,85 @@
+import os
+from typing import Any, Dict, Hashable, Mapping, Optional, Union
+
+from serving.cache import ResultCache
+
+Decimals = Union[None, int, Dict[str, int]]
+
+
+def parse_decimals(spec: str) -> Decimals:
+    """'' -> exact keys, '2' -> every number rounded to 2 decimals,
+    'ph=1,rainfall=0' -> only those fields rounded."""
+    spec = spec.strip()
+    if not spec:
+        return None
+    if "=" not in spec:
+        return int(spec)
+    decimals = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        decimals[name.strip()] = int(value)
+    return decimals
+
+
+class Memoizer:
+    """Memoizes model outputs for repeated inputs.
+
+    Keys are the canonical feature tuple (numbers optionally rounded to
+    ``decimals``) plus the model version; ``invalidate`` drops everything when a
+    new model is loaded. When rounding is on, callers should predict from
+    ``canonical(features)`` so a cached result never depends on which of the
+    inputs in a rounding bucket arrived first.
+    """
+
+    def __init__(self, name: str, max_entries: int = 4096, decimals: Decimals = None):
+        self.name = name
+        self.decimals = decimals
+        self.cache = ResultCache(max_entries=max_entries, ttl=None)
+        self.version: Optional[Hashable] = None
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls, name: str, max_entries: int = 4096) -> Optional["Memoizer"]:
+        """Build from ``<NAME>_MEMO_SIZE`` (0 disables memoization) and
+        ``<NAME>_MEMO_DECIMALS`` (see ``parse_decimals``)."""
+        prefix = name.upper()
+        max_entries = int(os.environ.get(f"{prefix}_MEMO_SIZE", max_entries))
+        if max_entries <= 0:
+            return None
+        return cls(name, max_entries, parse_decimals(os.environ.get(f"{prefix}_MEMO_DECIMALS", "")))
+
+    def _digits(self, field: str) -> Optional[int]:
+        if isinstance(self.decimals, dict):
+            return self.decimals.get(field)
+        return self.decimals
+
+    def canonical(self, features: Mapping[str, Any]) -> Dict[str, Any]:
+        out = {}
+        for field, value in features.items():
+            digits = self._digits(field)
+            if digits is not None and isinstance(value, (int, float)) and not isinstance(value, bool):
+                # + 0.0 folds -0.0 into 0.0 so both share a key.
+                value = round(float(value), digits) + 0.0
+            out[field] = value
+        return out
+
+    def _key(self, canonical: Mapping[str, Any]) -> tuple:
+        return (self.version,) + tuple(sorted(canonical.items()))
+
+    def get(self, canonical: Mapping[str, Any]) -> Optional[Any]:
+        return self.cache.get(self._key(canonical))
+
+    def put(self, canonical: Mapping[str, Any], value: Any) -> None:
+        self.cache.put(self._key(canonical), value)
+
+    def invalidate(self, version: Hashable) -> None:
+        self.version = version
+        self.cache.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        del stats["ttl_s"]
+        stats.update(name=self.name, model_version=str(self.version), decimals=self.decimals,
+                     invalidations=self.invalidations)
+        return stats
@@ -0,0 +1,238 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import FastAPI
+from starlette.responses import Response
+
+from serving import executor
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Per-request timing of the service handling it, set by the middleware. Holds a
+# dict rather than values so the handler's updates are seen by the middleware
+# whichever context they run in.
+_REQUEST = contextvars.ContextVar("serving_metrics_request", default=None)
+_ALL: List["Metrics"] = []
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+
+
+def _fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metrics:
+    """Prometheus-style request, stage and batch metrics for one model service.
+
+    ``instrument(app)`` adds an ASGI middleware (request count, latency and
+    in-flight per route, plus the ``serialize`` stage: handler return to response
+    start) and a ``/metrics`` endpoint. Handlers wrapped with ``handler`` also get
+    a ``parse`` stage (request arrival to handler entry: body read and
+    validation); anything else is timed with ``stage``. WorkerPool calls made
+    while a request is being handled record ``<pool>_wait`` and ``<pool>_run``.
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._gauge_fns: List[Tuple[str, Labels, Callable[[], Optional[float]]]] = []
+        _ALL.append(self)
+
+    # -- recording -----------------------------------------------------------
+
+    def _labels(self, **labels: str) -> Labels:
+        return (("service", self.service),) + tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, self._labels(**labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def add_gauge(self, name: str, value: float, **labels: str) -> None:
+        key = (name, self._labels(**labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0.0) + value
+
+    def gauge_fn(self, name: str, fn: Callable[[], Optional[float]], **labels: str) -> None:
+        """Export ``fn()`` as a gauge at scrape time (skipped while it returns None)."""
+        self._gauge_fns.append((name, self._labels(**labels), fn))
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: str) -> None:
+        key = (name, self._labels(**labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        self.observe("model_stage_seconds", seconds, stage=stage)
+
+    @contextlib.contextmanager
+    def stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def observe_batch(self, size: int, seconds: float) -> None:
+        """For batched forwards: the batch size and the forward time."""
+        self.observe("model_batch_size", size, buckets=BATCH_BUCKETS)
+        self.observe_stage("forward", seconds)
+
+    # -- wiring --------------------------------------------------------------
+
+    def track_model(self, state) -> None:
+        """Export a serving.readiness.ModelState as model_ready / model_load_seconds."""
+        self.gauge_fn("model_ready", lambda: float(state.ready))
+        self.gauge_fn("model_load_seconds", lambda: state.load_seconds)
+
+    def handler(self, fn: Callable) -> Callable:
+        """Decorate an async endpoint (below the ``@app.post`` line) to time ``parse``."""
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            timing = _REQUEST.get()
+            if timing is not None:
+                self.observe_stage("parse", time.perf_counter() - timing["start"])
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                if timing is not None:
+                    timing["handler_end"] = time.perf_counter()
+        return wrapper
+
+    def instrument(self, app: FastAPI) -> None:
+        app.add_middleware(_MetricsMiddleware, metrics=self)
+
+        @app.get("/metrics", include_in_schema=False)
+        def metrics():
+            return Response(render([self]), media_type=CONTENT_TYPE)
+
+    # -- exposition ----------------------------------------------------------
+
+    def _snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: (h.buckets, list(h.counts), h.total, h.n) for k, h in self._histograms.items()}
+        for name, labels, fn in self._gauge_fns:
+            value = fn()
+            if value is not None:
+                gauges[(name, labels)] = float(value)
+        return counters, gauges, histograms
+
+
+class _MetricsMiddleware:
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        metrics = self.metrics
+        timing = {"start": time.perf_counter(), "handler_end": None, "metrics": metrics}
+        token = _REQUEST.set(timing)
+        status = {"code": 500}
+        metrics.add_gauge("model_requests_in_flight", 1)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if timing["handler_end"] is not None:
+                    metrics.observe_stage("serialize", time.perf_counter() - timing["handler_end"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _REQUEST.reset(token)
+            metrics.add_gauge("model_requests_in_flight", -1)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.inc("model_requests_total", method=scope["method"], route=route, status=str(status["code"]))
+            metrics.observe("model_request_seconds", time.perf_counter() - timing["start"], route=route)
+
+
+def _record_pool_call(pool_name: str, wait: float, run: float) -> None:
+    timing = _REQUEST.get()
+    metrics = timing.get("metrics") if timing is not None else None
+    if metrics is not None:
+        metrics.observe_stage(f"{pool_name}_wait", wait)
+        metrics.observe_stage(f"{pool_name}_run", run)
+
+
+HELP = {
+    "model_requests_total": ("counter", "HTTP requests by route and status."),
+    "model_request_seconds": ("histogram", "End-to-end request latency."),
+    "model_requests_in_flight": ("gauge", "Requests currently being handled."),
+    "model_stage_seconds": ("histogram", "Time spent per request stage."),
+    "model_batch_size": ("histogram", "Images per batched forward pass."),
+    "model_load_seconds": ("gauge", "Seconds from process start until the model was loaded."),
+    "model_ready": ("gauge", "1 once the model is loaded and serving."),
+    "model_uploads_total": ("counter", "Uploads accepted or rejected, by rejection reason."),
+    "model_upload_bytes_total": ("counter", "Request body bytes read for accepted and rejected uploads."),
+}
+
+
+def render(instances: Optional[Iterable[Metrics]] = None) -> str:
+    """Text exposition of the given services (default: every Metrics in the process),
+    one family per metric name across services."""
+    families: Dict[str, List[str]] = {}
+    for m in (_ALL if instances is None else instances):
+        counters, gauges, histograms = m._snapshot()
+        for (name, labels), value in counters.items():
+            families.setdefault(name, []).append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+        for (name, labels), value in gauges.items():
+            families.setdefault(name, []).append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+        for (name, labels), (buckets, counts, total, n) in histograms.items():
+            lines = families.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(buckets, counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', _fmt_value(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {n}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(total)}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {n}")
+    out = []
+    for name in sorted(families):
+        kind, help_text = HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(families[name])
+    return "\n".join(out) + "\n"
+
+
+executor.RUN_LISTENERS.append(_record_pool_call)
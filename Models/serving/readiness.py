@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+# LAZY_STARTUP=1: the app starts serving at once and imports / loads its model in
+# the background; prediction endpoints answer 503 until it is ready.
+# WARMUP=1: run one dummy prediction right after loading.
+LAZY_STARTUP = os.environ.get("LAZY_STARTUP", "0") == "1"
+WARMUP = os.environ.get("WARMUP", "0") == "1"
+
+
+class ModelNotReady(HTTPException):
+    def __init__(self, name: str, state: str, error: Optional[str] = None, retry_after: int = 2):
+        detail = f"Model '{name}' is {state}" + (f": {error}" if error else ", retry shortly.")
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+class ModelState:
+    """Readiness of a model that may load in the background.
+
+    ``state`` is ``loading`` until ``start`` finishes its loader (and optional
+    warm-up), then ``ready``, or ``failed`` if either raised.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "loading"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._created = time.perf_counter()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, load: Callable[[], Awaitable[Any]], warmup: Optional[Callable[[], Awaitable[Any]]] = None,
+                    background: bool = LAZY_STARTUP) -> None:
+        """Run ``load`` then ``warmup``; with ``background`` return immediately."""
+        if background:
+            self._task = asyncio.create_task(self._run(load, warmup, reraise=False))
+        else:
+            await self._run(load, warmup, reraise=True)
+
+    async def _run(self, load, warmup, reraise: bool) -> None:
+        try:
+            await load()
+            # Measured from process start, so lazy mode includes the deferred imports.
+            self.load_seconds = time.perf_counter() - self._created
+            if warmup is not None:
+                started = time.perf_counter()
+                await warmup()
+                self.warmup_seconds = time.perf_counter() - started
+        except Exception as e:
+            self.state, self.error = "failed", f"{type(e).__name__}: {e}"
+            if reraise:
+                raise
+            return
+        self.state = "ready"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def require(self) -> None:
+        """Raise a 503 unless the model is ready."""
+        if self.state != "ready":
+            raise ModelNotReady(self.name, self.state, self.error)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "lazy_startup": LAZY_STARTUP,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }